@@ -0,0 +1,87 @@
+"""
+Regression check and microbenchmark: single-pass code detector vs
+code_fraction_strong().
+
+    python -m benchmarks.bench_code_detect --input data/dedup/dedup.jsonl --max-docs 20000
+
+Without --input a synthetic mix of prose and code is generated. Exits with
+status 1 if any document gets a different fraction or decision.
+"""
+import argparse
+import random
+import time
+from src.utils.io_utils import stream_jsonl
+from src.detectors.code_strong_detect import (
+    code_fraction_strong, is_code_document_strong, code_fraction_fast, is_code_document_fast,
+)
+
+
+def load_texts(path, max_docs):
+    texts = []
+    for row in stream_jsonl(path):
+        text = row.get("text", "") if isinstance(row, dict) else ""
+        texts.append(text if isinstance(text, str) else "")
+        if len(texts) >= max_docs:
+            break
+    return texts
+
+
+def synthetic_texts(n_docs, seed=0):
+    rng = random.Random(seed)
+    prose = ["The committee met on Tuesday to discuss the budget.",
+             "Rivers carry sediment from the mountains to the sea.",
+             "She said it was the best book she had read this year.",
+             "Results are shown in the table below."]
+    code = ["def parse(line):", "    return line.split(',')", "int main() {", "  x = y + 1;",
+            "}", "import numpy as np", "const value = compute();", "#####"]
+    texts = []
+    for _ in range(n_docs):
+        share = rng.random()
+        lines = [rng.choice(code) if rng.random() < share else rng.choice(prose)
+                 for _ in range(rng.randint(1, 400))]
+        texts.append("\n".join(lines))
+    return texts
+
+
+def timed(fn, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = [fn(t) for t in texts]
+        best = min(best, time.perf_counter() - t0)
+    return out, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the code-heavy detector")
+    parser.add_argument("--input", default=None, help="JSONL file with a 'text' field")
+    parser.add_argument("--max-docs", type=int, default=20000)
+    parser.add_argument("--threshold", type=float, default=0.40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = load_texts(args.input, args.max_docs) if args.input else synthetic_texts(args.max_docs)
+    mb = sum(len(t) for t in texts) / 1e6
+    print(f"{len(texts):,} docs, {mb:.1f} MB of text")
+
+    th = args.threshold
+    runs = [
+        ("code_fraction_strong", code_fraction_strong),
+        ("code_fraction_fast", code_fraction_fast),
+        ("is_code_document_strong", lambda t: is_code_document_strong(t, th)),
+        ("is_code_document_fast", lambda t: is_code_document_fast(t, th)),
+    ]
+    results = {}
+    for name, fn in runs:
+        results[name], sec = timed(fn, texts, args.repeat)
+        print(f"{name:24}: {sec:7.3f} s  {len(texts) / sec:10,.0f} docs/s  {mb / sec:7.2f} MB/s")
+
+    frac_diff = sum(a != b for a, b in zip(results["code_fraction_strong"], results["code_fraction_fast"]))
+    doc_diff = sum(a != b for a, b in zip(results["is_code_document_strong"], results["is_code_document_fast"]))
+    print(f"fraction mismatches: {frac_diff}, decision mismatches: {doc_diff}")
+    if frac_diff or doc_diff:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Parity and worst-case timing of html_to_text() vs has_html() + strip_html().
+
+    python -m benchmarks.bench_html_strip --input data/raw/mainpipe_data_v1.jsonl --max-docs 20000
+
+1. parity: every document of --input (if given) plus --fuzz random snippets
+   built from tag/comment/entity fragments must give the same result as
+   (has_html(text), strip_html(text) if has_html(text) else text)
+2. pathological inputs (unclosed <script>, <style>, comments and tags
+   repeated n times): the old functions are timed on small n only, since
+   they grow at least quadratically; html_to_text() must stay linear, i.e.
+   10x the input may cost at most --max-growth times as much
+
+Exits with status 1 if either check fails.
+"""
+import argparse
+import random
+import time
+from src.utils.io_utils import stream_jsonl
+from src.detectors.html_detect import has_html, strip_html, html_to_text
+
+FRAGMENTS = [
+    "<", ">", "/", "!", "-", "--", "<!--", "-->", "<!-", "<script", "</script>", "<SCRIPT",
+    "<style", "</style>", "</STYLE>", "<a", "</a", "<b ", "<p>", "<div class='x'>", "script",
+    "style", "&", ";", "&amp;", "&#39;", "&lt;", "&nbsp;", "=", '"', "a", "x", "1", "é",
+    " ", "\n", "\t", "\xa0",
+]
+
+# fragment -> sizes at which the old functions are timed
+PATHOLOGICAL = {
+    "unclosed script": ("<script>", (100, 200, 400)),
+    "unclosed style": ("<style type='text/css'>", (100, 200, 400)),
+    "unclosed comment": ("<!-- ", (2000, 4000, 8000)),
+    "unclosed tag": ("<a ", (2000, 4000, 8000)),
+}
+
+
+def reference(text):
+    if has_html(text):
+        return True, strip_html(text)
+    return False, text
+
+
+def load_texts(path, max_docs):
+    texts = []
+    for row in stream_jsonl(path):
+        text = row.get("text", "") if isinstance(row, dict) else ""
+        if isinstance(text, str):
+            texts.append(text)
+        if len(texts) >= max_docs:
+            break
+    return texts
+
+
+def fuzz_texts(n, seed=0):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 60)))
+            for _ in range(n)]
+
+
+def timed(fn, text, repeat=1):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the linear-time HTML extractor")
+    parser.add_argument("--input", default=None, help="JSONL file with a 'text' field")
+    parser.add_argument("--max-docs", type=int, default=20000)
+    parser.add_argument("--fuzz", type=int, default=100000, help="Number of random snippets")
+    parser.add_argument("--max-growth", type=float, default=20.0,
+                        help="Allowed time ratio for a 10x larger pathological input")
+    args = parser.parse_args()
+
+    # 1. parity
+    texts = fuzz_texts(args.fuzz)
+    if args.input:
+        real = load_texts(args.input, args.max_docs)
+        texts += real
+        t_old = sum(timed(reference, t) for t in real)
+        t_new = sum(timed(html_to_text, t) for t in real)
+        mb = sum(len(t) for t in real) / 1e6
+        print(f"{len(real):,} docs, {mb:.1f} MB: has_html+strip_html {t_old:.3f} s, "
+              f"html_to_text {t_new:.3f} s")
+
+    mismatches = [t for t in texts if html_to_text(t) != reference(t)]
+    print(f"parity: {len(texts) - len(mismatches):,}/{len(texts):,} identical")
+    for t in mismatches[:5]:
+        print(f"  mismatch: {t[:200]!r}")
+
+    # 2. pathological inputs
+    linear = True
+    for name, (unit, sizes) in PATHOLOGICAL.items():
+        # the leading <p> makes has_html() true, so strip_html() always runs
+        old = [f"n={n:,}: {timed(reference, '<p>' + unit * n):.3f} s" for n in sizes]
+        print(f"{name:17} has_html+strip_html  " + "  ".join(old))
+
+        t_small = timed(html_to_text, "<p>" + unit * 100_000, repeat=3)
+        t_large = timed(html_to_text, "<p>" + unit * 1_000_000, repeat=3)
+        growth = t_large / t_small
+        linear &= growth <= args.max_growth
+        print(f"{name:17} html_to_text         n=100,000: {t_small:.3f} s  "
+              f"n=1,000,000: {t_large:.3f} s  (x{growth:.1f})")
+
+    print(f"linear time: {linear}")
+    if mismatches or not linear:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
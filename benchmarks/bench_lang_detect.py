@@ -0,0 +1,35 @@
+"""
+Agreement and speed of detect_lang_cascade() vs detect_lang().
+
+    python -m benchmarks.bench_lang_detect --input data/dedup/dedup.jsonl --sample-size 5000
+
+Writes the report to reports/lang_agreement.json by default.
+"""
+import argparse
+import json
+import os
+from src.detectors.language_detect import lang_agreement_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cascaded language detection")
+    parser.add_argument("--input", required=True, help="JSONL file with a 'text' field")
+    parser.add_argument("--sample-size", type=int, default=5000)
+    parser.add_argument("--max-chars", type=int, default=2000,
+                        help="Characters sampled by the fast stage")
+    parser.add_argument("--min-confidence", type=float, default=0.9,
+                        help="Fast-stage confidence below which the full detector is used")
+    parser.add_argument("--output", default="reports/lang_agreement.json")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    report = lang_agreement_report(args.input, sample_size=args.sample_size,
+                                   save_json_path=args.output,
+                                   max_chars=args.max_chars,
+                                   min_confidence=args.min_confidence)
+    print(json.dumps(report, indent=2))
+    print(f"[INFO] Saved language agreement report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
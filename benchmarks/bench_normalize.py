@@ -0,0 +1,80 @@
+"""
+Parity and speed of normalize_text() / normalize_texts() vs normalize_text_reference().
+
+    python -m benchmarks.bench_normalize --input data/raw/mainpipe_data_v1.jsonl --max-docs 20000
+
+The regression corpus is --input (if given) plus --fuzz random snippets made
+of whitespace, control and zero-width characters. Outputs must be
+byte-identical; exits with status 1 otherwise.
+"""
+import argparse
+import random
+import time
+from src.utils.io_utils import stream_jsonl
+from src.cleaning.txt_norm_pipe import normalize_text, normalize_texts, normalize_text_reference
+
+FRAGMENTS = [
+    " ", "  ", "\t", "\n", "\n\n\n", "\r", "\x00", "\x0b", "\x0c", "\x1c", "\x1f", "\x7f",
+    "\x85", "\u00A0", "\u200B", "\u200C", "\u200D", "\uFEFF", " ", "\u3000", "a", "é", ".",
+]
+
+
+def load_texts(path, max_docs):
+    texts = []
+    for row in stream_jsonl(path):
+        text = row.get("text", "") if isinstance(row, dict) else ""
+        if isinstance(text, str):
+            texts.append(text)
+        if len(texts) >= max_docs:
+            break
+    return texts
+
+
+def fuzz_texts(n, seed=0):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 40)))
+            for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fused text normalizer")
+    parser.add_argument("--input", default=None, help="JSONL file with a 'text' field")
+    parser.add_argument("--max-docs", type=int, default=20000)
+    parser.add_argument("--fuzz", type=int, default=100000, help="Number of random snippets")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = fuzz_texts(args.fuzz)
+    if args.input:
+        texts += load_texts(args.input, args.max_docs)
+    mb = sum(len(t) for t in texts) / 1e6
+    print(f"{len(texts):,} texts, {mb:.1f} MB")
+
+    runs = [
+        ("reference", lambda: [normalize_text_reference(t) for t in texts]),
+        ("normalize_text", lambda: [normalize_text(t) for t in texts]),
+        ("normalize_texts", lambda: normalize_texts(texts)),
+    ]
+    results = {}
+    for name, fn in runs:
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            best = min(best, time.perf_counter() - t0)
+        results[name] = out
+        print(f"{name:16}: {best:7.3f} s  {mb / best:7.2f} MB/s")
+
+    ref = results["reference"]
+    bad = [t for t, a, b in zip(texts, results["normalize_text"], results["normalize_texts"])
+           if not a == b == normalize_text_reference(t)]
+    same = not bad and results["normalize_text"] == ref
+    print(f"byte-identical output: {same}")
+    for t in bad[:5]:
+        print(f"  mismatch: {t[:200]!r}")
+    if not same:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Throughput of simhash_batch() vs the per-document simhash_text().
+
+    python -m benchmarks.bench_simhash --input data/dedup/dedup.jsonl --max-docs 20000
+
+Without --input a synthetic corpus is generated. The script also checks
+that both functions give identical fingerprints.
+"""
+import argparse
+import random
+import time
+import numpy as np
+from src.utils.io_utils import stream_jsonl
+from src.utils.hash_utils import simhash_text, simhash_batch
+
+
+def load_texts(path, max_docs):
+    texts = []
+    for row in stream_jsonl(path):
+        text = row.get("text", "") if isinstance(row, dict) else ""
+        texts.append(text if isinstance(text, str) else "")
+        if len(texts) >= max_docs:
+            break
+    return texts
+
+
+def synthetic_texts(n_docs, seed=0):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(5000)]
+    return [" ".join(rng.choice(vocab) for _ in range(rng.randint(50, 1500)))
+            for _ in range(n_docs)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch SimHash")
+    parser.add_argument("--input", default=None, help="JSONL file with a 'text' field")
+    parser.add_argument("--max-docs", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = load_texts(args.input, args.max_docs) if args.input else synthetic_texts(args.max_docs)
+    mb = sum(len(t) for t in texts) / 1e6
+    print(f"{len(texts):,} docs, {mb:.1f} MB of text")
+
+    def run_single():
+        return np.array([simhash_text(t) for t in texts], dtype=np.uint64)
+
+    def run_batch():
+        return np.concatenate([simhash_batch(texts[i:i + args.batch_size])
+                               for i in range(0, len(texts), args.batch_size)])
+
+    results = {}
+    for name, fn in [("simhash_text", run_single), ("simhash_batch", run_batch)]:
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            sigs = fn()
+            best = min(best, time.perf_counter() - t0)
+        results[name] = sigs
+        print(f"{name:14}: {best:7.3f} s  {len(texts) / best:10,.0f} docs/s  {mb / best:7.2f} MB/s")
+
+    same = np.array_equal(results["simhash_text"], results["simhash_batch"])
+    print(f"identical fingerprints: {same}")
+    if not same:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Parity and speed of batched / multi-process tokenization vs one text at a time.
+
+    python -m benchmarks.bench_tokenize --input data/clean/clean.jsonl --workers 1 4
+
+Runs tokenize_ext_to_jsonl() once per text (the reference), then with every
+combination of --batch-sizes, --threads and --workers, in --format. Outputs
+must be byte-identical to the reference; exits with status 1 otherwise.
+"""
+import argparse
+import filecmp
+import os
+import tempfile
+import time
+from src.tokenization.tokenizers import enc_ext, tokenize_ext_to_jsonl, default_threads
+
+
+def output_files(path, fmt):
+    return [path + ".bin", path + ".idx"] if fmt == "bin" else [path]
+
+
+def timed_run(input_path, output_path, fmt, **kwargs):
+    t0 = time.perf_counter()
+    tokenize_ext_to_jsonl(input_path, output_path, enc_ext, output_format=fmt, **kwargs)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched tokenization")
+    parser.add_argument("--input", required=True, help="Cleaned JSONL file with a 'text' field")
+    parser.add_argument("--format", choices=["jsonl", "bin"], default="bin")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1024])
+    parser.add_argument("--threads", type=int, nargs="+", default=[default_threads()])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1])
+    args = parser.parse_args()
+
+    mb = os.path.getsize(args.input) / 1e6
+    print(f"{args.input}: {mb:.1f} MB, {os.cpu_count()} CPUs")
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        ext = ".jsonl" if args.format == "jsonl" else ""
+        ref = os.path.join(tmp, "ref" + ext)
+        base = timed_run(args.input, ref, args.format, batch_size=None)
+        print(f"{'one at a time':30}: {base:7.2f} s  {mb / base:6.2f} MB/s")
+
+        for batch_size in args.batch_sizes:
+            for threads in args.threads:
+                for workers in args.workers:
+                    out = os.path.join(tmp, "out" + ext)
+                    t = timed_run(args.input, out, args.format, batch_size=batch_size,
+                                  num_threads=threads, workers=workers)
+                    same = all(filecmp.cmp(a, b, shallow=False)
+                               for a, b in zip(output_files(ref, args.format),
+                                               output_files(out, args.format)))
+                    ok &= same
+                    name = f"batch={batch_size} threads={threads} workers={workers}"
+                    print(f"{name:30}: {t:7.2f} s  {mb / t:6.2f} MB/s  x{base / t:5.2f}  "
+                          f"identical={same}")
+
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,19 +5,33 @@ from datetime import datetime
 import matplotlib.pyplot as plt
 import random
 import json 
+from collections import Counter
 
-from src.reporting.explore_stats_sumry import quick_stats_report, summarize_dataset_exclusive
+from src.reporting.explore_stats_sumry import quick_stats_report, summarize_dataset_exclusive, summarize_features
 from src.reporting.meta_writer import write_meta
 from src.reporting.viz_plots import plot_summary_percentage, plot_cleaning_report
 
-from src.cleaning.deduplication_pipe import dedup_exact
-from src.cleaning.clean_pipe import clean_dataset
+from src.cleaning.boilerplate_pipe import boilerplate_dataset
+from src.cleaning.deduplication_pipe import dedup_exact, iter_dedup_exact, dedup_near, iter_dedup_near, dedup_minhash
+from src.cleaning.clean_pipe import clean_dataset, iter_clean_texts
+from src.cleaning.feature_store import load_features
+from src.cleaning.filter_chain import filter_summary, print_filter_summary
+from src.cleaning.stages import load_pipeline_config
 from src.reporting.quality_reporter import quality_report
 
-from src.tokenization.tokenizers import base_enc, enc_ext, tokenize_ext_to_jsonl, token_length_stats2
+from src.tokenization.tokenizers import base_enc, enc_ext, tokenize_ext_to_jsonl, iter_tokenize_ext
 from src.tokenization.tokenizers import BOS_ID, EOS_ID, PAD_ID, special_tokens
-from src.tokenization.packers import pack_to_fixed_blocks, diagnose_packed_lengths
-from src.tokenization.sharders import shard_packed_dataset
+from src.tokenization.packers import pack_to_fixed_blocks, diagnose_packed_lengths, iter_fixed_blocks
+from src.tokenization.packers import iter_best_fit_blocks, packing_summary, print_packing_summary, pack_concat
+from src.tokenization.packers import pack_length_buckets
+from src.tokenization.sharders import shard_packed_dataset, shard_block_stream
+from src.tokenization.token_bin import tee_token_bin, bin_prefix
+from src.tokenization.length_stats import TokenLengthStats
+from src.tokenization.packing_stats import PackingStats
+from src.utils.io_utils import stream_jsonl, tee_lines
+from src.utils.digest_index import DigestIndex
+from src.utils.dedup_store import DedupStore
+from src.detectors.doc_features import FeatureCache, print_feature_summary
 
 
 def setup_logging():
@@ -37,71 +51,51 @@ def count_blocks(path):
 
 
 
-def run_pipeline(args):
-    logger = setup_logging()
-    start_time = datetime.now()
+def make_digest_index(args):
+    """Compact exact-dedup index if requested on the CLI, else None (Python set)."""
+    if not args.compact_dedup:
+        return None
+    return DigestIndex(n_bytes=args.dedup_digest_bytes,
+                       max_memory_entries=args.dedup_memory_entries,
+                       spill_dir=args.dedup_spill_dir)
 
-    logger.info("=*= Starting MainpipeNS pipeline =*=")
 
-    raw_path   = args.raw
-    dedup_path = "data/dedup/dedup.jsonl"
-    clean_path = "data/clean/clean.jsonl"
-    tok_path   = "data/final/tokenized.jsonl"
-    pack_path = "data/final/packed_blocks.jsonl"
-    shard_dir  = "data/final/sharded_dataset"
-
-    os.makedirs("reports", exist_ok=True)
-    os.makedirs("figures", exist_ok=True)
-
-    # inspection
-    logger.info("Inspecting raw file...")
-    stats = quick_stats_report(raw_path, sample_size=25000, 
-                            save_json_path="reports/raw_doc_stats.json",
-                            save_fig_path="figures/raw_doc_length_hist.pdf")
-    logger.info("Raw quick_stats:")
-    logger.info(json.dumps(stats, indent=2))
-
-    # Exclusive category distribution
-    logger.info("category percentages in raw input file:")
-    summary1, summary_pct1 = summarize_dataset_exclusive(raw_path, sample_size=25000)
-    
-    logger.info(json.dumps(summary_pct1, indent=2))
-    pct_json_path = "reports/raw_category_pct.json"
-    with open(pct_json_path, "w") as f:
-        json.dump(summary_pct1, f, indent=2)
+def make_dedup_store(args):
+    """Persistent cross-run dedup store if --dedup-store is given, else None."""
+    if args.dedup_store is None:
+        return None
+    store = DedupStore(args.dedup_store, n_bytes=args.dedup_digest_bytes,
+                       hamming_threshold=args.hamming_threshold)
+    print(f"[INFO] Dedup store {args.dedup_store}: {store.n_digests:,} digests, "
+          f"{store.n_simhashes:,} SimHash fingerprints from earlier runs")
+    return store
 
-    logger.info(f"Saved raw category percentages to {pct_json_path}")
-    print(f"[INFO] Saved raw category percentages to {pct_json_path}")
 
-    fig = plot_summary_percentage(summary_pct1)
-    fig_path = "figures/raw_category_pct.pdf"
-    fig.savefig(fig_path, format="pdf", dpi=300, bbox_inches="tight")
-    plt.close(fig)
+def make_feature_cache(args):
+    """Run-level cache of per-document features, or None with --feature-cache-docs 0."""
+    if args.feature_cache_docs <= 0:
+        return None
+    return FeatureCache(max_docs=args.feature_cache_docs)
 
-    logger.info(f"Saved raw category percentage plot to {fig_path}")
-    print(f"[INFO] Saved category histogram to {fig_path}")
 
-   
-    # exact dedup
-    logger.info("Deduplication...")
-    dedup_exact(raw_path, dedup_path)
-    logger.info(f"Deduplicated data saved to {dedup_path}")
+def report_features(features_path, logger):
+    """Category percentages of every document entering the cleaning stage, from the feature sidecar."""
+    summary, summary_pct = summarize_features(load_features(features_path))
+    logger.info("Cleaning input category percentages (feature sidecar):")
+    logger.info(json.dumps(summary_pct, indent=2))
 
-    
-    # cleaning
-    logger.info("Cleaning dataset...")
-    counters = clean_dataset(dedup_path, clean_path)
-    logger.info(f"Cleaned data saved to {clean_path}")
-    logger.info(f"Cleaning summary: {dict(counters)}")
+    pct_json_path = "reports/dedup_category_pct.json"
+    with open(pct_json_path, "w") as f:
+        json.dump(summary_pct, f, indent=2)
+    print(f"[INFO] Saved cleaning input category percentages to {pct_json_path}")
 
-    fig=plot_cleaning_report(counters)
-    fig.savefig("figures/clean_data_hist.pdf", format="pdf", dpi=300, bbox_inches="tight")
-    logger.info("Saved cleaning report figure to figures/clean_data_hist.pdf")
 
-    # clean file check
+def report_clean_dataset(clean_path, logger, cache=None):
+    """Category and quality reports on the cleaned file."""
     logger.info("Inspecting cleaned dataset...")
 
-    sumry_clean, sumry_pct_clean = summarize_dataset_exclusive(clean_path, sample_size=25000)
+    sumry_clean, sumry_pct_clean = summarize_dataset_exclusive(clean_path, sample_size=25000,
+                                                               cache=cache)
     logger.info("Clean dataset category percentages:")
     logger.info(json.dumps(sumry_pct_clean, indent=2))
 
@@ -122,7 +116,8 @@ def run_pipeline(args):
     logger.info("Running quality report on cleaned dataset...")
     quality = quality_report(clean_path,
                             sample_size=1500,
-                            save_path="reports/quality_report.json"
+                            save_path="reports/quality_report.json",
+                            cache=cache
             )
     
     logger.info(json.dumps(quality, indent=2))
@@ -134,9 +129,11 @@ def run_pipeline(args):
     logger.info(json.dumps(quality, indent=2))
     print("[INFO] Saved quality report to reports/quality_report.json")
 
-    #token length stats
-    logger.info("Computing token length stats…")
-    _, token_stats = token_length_stats2(clean_path, encoder=enc_ext, max_docs=None)
+
+def report_token_lengths(length_stats, logger):
+    """Token-length statistics collected by the tokenizer (TokenLengthStats)."""
+    token_stats = length_stats.summary()
+    print(token_stats)
 
     stats_path = "reports/token_length_stats.json"
     with open(stats_path, "w") as f:
@@ -146,33 +143,348 @@ def run_pipeline(args):
     print(f"[INFO] Saved token-length stats to {stats_path}")
 
 
-    # tokenization
-    logger.info("Tokenization...")
-    tokenize_ext_to_jsonl(clean_path, tok_path, encoder=enc_ext, max_seq_len=2048)
-    logger.info(f"Tokenized data saved to {tok_path}")
+def iter_blocks(docs, args, packing_stats=None):
+    """2048-token blocks of a document stream with the --packing strategy."""
+    if args.packing == "best_fit":
+        return iter_best_fit_blocks(docs, PAD_ID, block_size=2048,
+                                    window=args.packing_window, stats=packing_stats)
+    return iter_fixed_blocks(docs, PAD_ID, block_size=2048)
+
+
+def run_length_buckets(args, tok_path, pack_path, shard_dir, logger):
+    """
+    Pack the tokenized file once into blocks of every --length-buckets size,
+    then shard each bucket into <shard_dir>_<size>. Returns the meta.json
+    entry of every bucket.
+    """
+    ext = ".jsonl" if args.token_format == "jsonl" else ""
+    sizes = sorted(args.length_buckets)
+    pack_paths = {size: f"{bin_prefix(pack_path)}_{size}{ext}" for size in sizes}
+    stats = {size: PackingStats(block_size=size, pad_id=PAD_ID) for size in sizes}
+
+    logger.info(f"Packing to {sizes}-token blocks ({args.bucket_policy} policy)...")
+    totals = pack_length_buckets(tok_path, pack_paths, encoder=enc_ext,
+                                 pad_token="<|pad|>",
+                                 output_format=args.token_format,
+                                 policy=args.bucket_policy,
+                                 strategy=args.packing,
+                                 window=args.packing_window,
+                                 stats=stats)
+
+    buckets = {}
+    for size in sizes:
+        stats_path = f"reports/packing_stats_{size}.json"
+        with open(stats_path, "w") as f:
+            json.dump(stats[size].summary(), f, indent=2)
+        logger.info(f"Saved {size}-token packing stats to {stats_path}")
+
+        bucket_shard_dir = f"{shard_dir}_{size}"
+        logger.info(f"Train/Val/Test sharding of {size}-token blocks...")
+        shard_packed_dataset(pack_paths[size], bucket_shard_dir,
+                            train_ratio=0.98,
+                            val_ratio=0.01,
+                            test_ratio=0.01,
+                            shard_size=50000,
+                            shuffle=args.shuffle_shards,
+                            seed=args.shuffle_seed,
+                            shuffle_bucket_mb=args.shuffle_bucket_mb
+                            )
+        logger.info(f"Sharded dataset saved to {bucket_shard_dir}")
+
+        buckets[size] = {"total_blocks": totals[size],
+                         "docs": stats[size].n_docs,
+                         "tokens": stats[size].doc_tokens,
+                         "packed_path": pack_paths[size],
+                         "shard_output_dir": bucket_shard_dir}
+    return buckets
+
+
+def run_streaming_stages(args, raw_path, dedup_path, clean_path,
+                         tok_path, pack_path, shard_dir, store=None, cache=None,
+                         filter_stats=None, pipeline_config=None, length_stats=None,
+                         packing_stats=None, block_stats=None):
+    """
+    Run dedup -> cleaning -> tokenization -> packing -> sharding as chained
+    generators over a single read of the raw file. Only the shards are
+    written unless --keep-intermediate is given.
+
+    Returns (dedup_summary, cleaning_counters, total_blocks).
+    """
+    keep = args.keep_intermediate
+    dedup_summary = {"exact": {"kept": 0, "dropped": 0}}
+    counters = Counter()
+
+    index = make_digest_index(args)
+    rows = iter_dedup_exact(stream_jsonl(raw_path), dedup_summary["exact"],
+                            index=index, store=store)
+    if args.near_dedup:
+        dedup_summary["near"] = {"kept": 0, "dropped": 0}
+        rows = iter_dedup_near(rows, dedup_summary["near"],
+                               hamming_threshold=args.hamming_threshold, store=store)
+    rows = tee_lines(rows, dedup_path if keep else None,
+                     lambda row: json.dumps(row) + "\n")
+
+    texts = iter_clean_texts(rows, counters, workers=args.workers,
+                             lang_detector=args.lang_detector, cache=cache,
+                             filter_stats=filter_stats, adaptive_filters=args.adaptive_filters,
+                             pipeline_config=pipeline_config)
+    texts = tee_lines(texts, clean_path if keep else None,
+                      lambda text: json.dumps({"text": text}) + "\n")
+
+    docs = iter_tokenize_ext(texts, enc_ext, max_seq_len=2048,
+                             batch_size=args.tokenize_batch_size, num_threads=args.tokenize_threads,
+                             length_stats=length_stats)
+    if block_stats is not None:
+        docs = block_stats.iter_docs(docs)
+    blocks_fmt = args.token_format
+
+    if blocks_fmt == "bin":
+        docs = tee_token_bin(docs, tok_path if keep else None, enc_ext.n_vocab)
+        blocks = iter_blocks(docs, args, packing_stats)
+        if block_stats is not None:
+            blocks = block_stats.iter_blocks(blocks)
+        blocks = tee_token_bin(blocks, pack_path if keep else None, enc_ext.n_vocab)
+    else:
+        docs = tee_lines(docs, tok_path if keep else None,
+                         lambda ids: json.dumps({"input_ids": ids, "length": len(ids)}) + "\n")
+        blocks = iter_blocks(docs, args, packing_stats)
+        if block_stats is not None:
+            blocks = block_stats.iter_blocks(blocks)
+        blocks = (json.dumps({"input_ids": block, "length": 2048}) + "\n" for block in blocks)
+        blocks = tee_lines(blocks, pack_path if keep else None, lambda line: line)
+
+    total_blocks = shard_block_stream(blocks, shard_dir,
+                                      train_ratio=0.98,
+                                      val_ratio=0.01,
+                                      test_ratio=0.01,
+                                      shard_size=50000,
+                                      fmt=blocks_fmt,
+                                      vocab_size=enc_ext.n_vocab
+                                      )
+
+    if index is not None:
+        dedup_summary["exact"]["collision_probability"] = index.collision_probability()
+        index.close()
+
+    for stage, c in dedup_summary.items():
+        print(f"{stage} deduplication done: kept={c['kept']:,}, dropped={c['dropped']:,}")
+    return dedup_summary, counters, total_blocks
+
+
+def run_pipeline(args):
+    logger = setup_logging()
+    start_time = datetime.now()
+
+    logger.info("=*= Starting MainpipeNS pipeline =*=")
+
+    raw_path   = args.raw
+    dedup_path = "data/dedup/dedup.jsonl"
+    near_path  = "data/dedup/near_dedup.jsonl"
+    minhash_path = "data/dedup/minhash_dedup.jsonl"
+    clean_path = "data/clean/clean.jsonl"
+    boilerplate_path = "data/clean/clean_boilerplate.jsonl"
+    tok_path   = "data/final/tokenized.jsonl"
+    pack_path = "data/final/packed_blocks.jsonl"
+    if args.token_format == "bin":
+        # .bin/.idx prefixes, see src/tokenization/token_bin.py
+        tok_path  = "data/final/tokenized"
+        pack_path = "data/final/packed_blocks"
+    shard_dir  = "data/final/sharded_dataset"
+
+    os.makedirs("reports", exist_ok=True)
+    os.makedirs("figures", exist_ok=True)
+
+    # inspection
+    logger.info("Inspecting raw file...")
+    stats = quick_stats_report(raw_path, sample_size=25000, 
+                            save_json_path="reports/raw_doc_stats.json",
+                            save_fig_path="figures/raw_doc_length_hist.pdf")
+    logger.info("Raw quick_stats:")
+    logger.info(json.dumps(stats, indent=2))
+
+    # Exclusive category distribution
+    logger.info("category percentages in raw input file:")
+    cache = make_feature_cache(args)
+    summary1, summary_pct1 = summarize_dataset_exclusive(raw_path, sample_size=25000, cache=cache)
+    
+    logger.info(json.dumps(summary_pct1, indent=2))
+    pct_json_path = "reports/raw_category_pct.json"
+    with open(pct_json_path, "w") as f:
+        json.dump(summary_pct1, f, indent=2)
+
+    logger.info(f"Saved raw category percentages to {pct_json_path}")
+    print(f"[INFO] Saved raw category percentages to {pct_json_path}")
+
+    fig = plot_summary_percentage(summary_pct1)
+    fig_path = "figures/raw_category_pct.pdf"
+    fig.savefig(fig_path, format="pdf", dpi=300, bbox_inches="tight")
+    plt.close(fig)
+
+    logger.info(f"Saved raw category percentage plot to {fig_path}")
+    print(f"[INFO] Saved category histogram to {fig_path}")
+
+   
+    store = make_dedup_store(args)
+    filter_stats = Counter()
+    length_stats = TokenLengthStats()
+    packing_stats = Counter()
+    block_stats = PackingStats(block_size=2048, pad_id=PAD_ID)
+    length_buckets = None
+    boilerplate_summary = None
+    pipeline_config = None
+    if args.pipeline_config:
+        pipeline_config = load_pipeline_config(args.pipeline_config)
+        logger.info(f"Cleaning stages from {args.pipeline_config}: {pipeline_config}")
+
+    if args.stream:
+        logger.info("Streaming dedup -> clean -> tokenize -> pack -> shard...")
+        dedup_summary, counters, total_blocks = run_streaming_stages(args, raw_path,
+                                                         dedup_path, clean_path,
+                                                         tok_path, pack_path, shard_dir,
+                                                         store=store, cache=cache,
+                                                         filter_stats=filter_stats,
+                                                         pipeline_config=pipeline_config,
+                                                         length_stats=length_stats,
+                                                         packing_stats=packing_stats,
+                                                         block_stats=block_stats)
+        logger.info(f"Cleaning summary: {dict(counters)}")
+        print_filter_summary(filter_stats)
+        with open("reports/packing_stats.json", "w") as f:
+            json.dump(block_stats.summary(), f, indent=2)
+        logger.info("Saved packing stats to reports/packing_stats.json")
+        logger.info(f"Sharded dataset saved to {shard_dir}")
+    else:
+        # exact dedup
+        logger.info("Deduplication...")
+        index = make_digest_index(args)
+        dedup_summary = {"exact": dedup_exact(raw_path, dedup_path, index=index, store=store)}
+        if index is not None:
+            index.close()
+        logger.info(f"Deduplicated data saved to {dedup_path}")
+
+        # optional near dedup (SimHash)
+        if args.near_dedup:
+            logger.info("Near-deduplication...")
+            dedup_summary["near"] = dedup_near(dedup_path, near_path,
+                                               hamming_threshold=args.hamming_threshold,
+                                               store=store)
+            dedup_path = near_path
+            logger.info(f"Near-deduplicated data saved to {near_path}")
+
+        # optional MinHash-LSH dedup (Jaccard)
+        if args.minhash_dedup:
+            logger.info("MinHash-LSH deduplication...")
+            dedup_summary["minhash"] = dedup_minhash(dedup_path, minhash_path,
+                                                     bands=args.minhash_bands,
+                                                     rows=args.minhash_rows,
+                                                     ngram=args.minhash_ngram)
+            dedup_path = minhash_path
+            logger.info(f"MinHash-deduplicated data saved to {minhash_path}")
+        logger.info(f"Dedup summary: {dedup_summary}")
+
     
-    # packing blocks
-    logger.info("Packing to 2048-token blocks...")
-    total_blocks= pack_to_fixed_blocks(tok_path, pack_path,
-                                        encoder=enc_ext,
-                                        block_size=2048,
-                                        pad_token="<|pad|>"
-                                        )   
-    logger.info(f"Packed blocks saved to {pack_path}")
-
-    logger.info("Diagnosing packed block lengths...")
-    diagnose_packed_lengths(tok_path, pack_path, block_size=2048)
-
-    # sharding
-    logger.info("Train/Val/Test sharding...")
-    shard_packed_dataset(pack_path, shard_dir,
-                        train_ratio=0.98,
-                        val_ratio=0.01,
-                        test_ratio=0.01,
-                        shard_size=50000
-                        )
-    logger.info(f"Sharded dataset saved to {shard_dir}")
+        # cleaning
+        logger.info("Cleaning dataset...")
+        counters = clean_dataset(dedup_path, clean_path, workers=args.workers,
+                                 lang_detector=args.lang_detector, cache=cache,
+                                 features_path=args.features_out,
+                                 filter_stats=filter_stats,
+                                 adaptive_filters=args.adaptive_filters,
+                                 pipeline_config=pipeline_config)
+        logger.info(f"Cleaned data saved to {clean_path}")
+        if args.features_out:
+            logger.info(f"Per-document features saved to {args.features_out}")
+            report_features(args.features_out, logger)
+
+        # optional line/paragraph boilerplate removal (two passes)
+        if args.boilerplate:
+            logger.info("Removing boilerplate...")
+            bp_counters = boilerplate_dataset(clean_path, boilerplate_path,
+                                              min_count=args.boilerplate_min_count,
+                                              unit=args.boilerplate_unit,
+                                              log2_width=args.boilerplate_sketch_log2_width,
+                                              workers=args.workers)
+            # only dropped documents are a cleaning status; lines/edited docs go to "boilerplate"
+            boilerplate_summary = dict(bp_counters)
+            if bp_counters["BOILERPLATE_SHORT"]:
+                counters["BOILERPLATE_SHORT"] = bp_counters["BOILERPLATE_SHORT"]
+                counters["KEPT"] -= bp_counters["BOILERPLATE_SHORT"]
+            clean_path = boilerplate_path
+            logger.info(f"Boilerplate-free data saved to {clean_path}")
+            logger.info(f"Boilerplate: {boilerplate_summary}")
+        logger.info(f"Cleaning summary: {dict(counters)}")
+
+    logger.info(f"Cleaning filters: {filter_summary(filter_stats)}")
+
+    fig=plot_cleaning_report(counters)
+    fig.savefig("figures/clean_data_hist.pdf", format="pdf", dpi=300, bbox_inches="tight")
+    logger.info("Saved cleaning report figure to figures/clean_data_hist.pdf")
 
+    # clean file check
+    if args.stream and not args.keep_intermediate:
+        logger.info("Streaming mode without intermediate files: skipping clean-file reports")
+    else:
+        report_clean_dataset(clean_path, logger, cache=cache)
+
+    if not args.stream:
+        # tokenization
+        logger.info("Tokenization...")
+        max_seq_len = max(args.length_buckets) if args.length_buckets else 2048
+        length_stats = tokenize_ext_to_jsonl(clean_path, tok_path, encoder=enc_ext, max_seq_len=max_seq_len,
+                                             output_format=args.token_format,
+                                             batch_size=args.tokenize_batch_size,
+                                             num_threads=args.tokenize_threads,
+                                             workers=args.tokenize_workers)
+        logger.info(f"Tokenized data saved to {tok_path}")
+    
+        if args.length_buckets:
+            length_buckets = run_length_buckets(args, tok_path, pack_path, shard_dir, logger)
+            total_blocks = sum(b["total_blocks"] for b in length_buckets.values())
+        else:
+            # packing blocks
+            logger.info("Packing to 2048-token blocks...")
+            if args.packing == "concat":
+                total_blocks = pack_concat(tok_path, pack_path,
+                                           encoder=enc_ext,
+                                           block_size=2048,
+                                           pad_token="<|pad|>",
+                                           output_format=args.token_format)
+            else:
+                total_blocks= pack_to_fixed_blocks(tok_path, pack_path,
+                                                    encoder=enc_ext,
+                                                    block_size=2048,
+                                                    pad_token="<|pad|>",
+                                                    output_format=args.token_format,
+                                                    strategy=args.packing,
+                                                    window=args.packing_window,
+                                                    stats=packing_stats
+                                                    )   
+            logger.info(f"Packed blocks saved to {pack_path}")
+
+            logger.info("Diagnosing packed block lengths...")
+            diagnose_packed_lengths(tok_path, pack_path, block_size=2048, pad_id=PAD_ID,
+                                    save_path="reports/packing_stats.json")
+            logger.info("Saved packing stats to reports/packing_stats.json")
+
+            # sharding
+            logger.info("Train/Val/Test sharding...")
+            shard_packed_dataset(pack_path, shard_dir,
+                                train_ratio=0.98,
+                                val_ratio=0.01,
+                                test_ratio=0.01,
+                                shard_size=50000,
+                                shuffle=args.shuffle_shards,
+                                seed=args.shuffle_seed,
+                                shuffle_bucket_mb=args.shuffle_bucket_mb
+                                )
+            logger.info(f"Sharded dataset saved to {shard_dir}")
+
+    # token length stats, collected during tokenization
+    report_token_lengths(length_stats, logger)
+
+    if args.packing == "best_fit" and not args.length_buckets:
+        print_packing_summary(packing_stats, block_size=2048)
+        logger.info(f"Packing: {packing_summary(packing_stats, block_size=2048)}")
 
     # metadata
     logger.info("Writing meta.json...")
@@ -183,14 +495,29 @@ def run_pipeline(args):
                 block_size=2048,
                 total_blocks=total_blocks,
                 cleaning_summary=dict(counters),
+                cleaning_filters=filter_summary(filter_stats),
+                length_buckets=length_buckets,
+                dedup_summary=dedup_summary,
+                boilerplate=boilerplate_summary,
                 shard_info={"train_ratio": 0.98,
                             "val_ratio": 0.01,
                             "test_ratio": 0.01,
-                            "shard_output_dir": shard_dir
+                            "shard_output_dir": shard_dir,
+                            "shuffled": args.shuffle_shards,
+                            "shuffle_seed": args.shuffle_seed if args.shuffle_shards else None
                             }, 
                 cli_args=vars(args)   
             )
 
+    # only record this run in the dedup store once everything has been written
+    if store is not None:
+        store.commit()
+        logger.info(f"Dedup store updated: {store.summary()}")
+
+    if cache is not None:
+        print_feature_summary(cache)
+        logger.info(f"Feature cache: {cache.summary()}")
+
     logger.info("=*= Pipeline completed successfully =*=")
     print("[INFO] Pipeline completed successfully")
 
@@ -201,6 +528,87 @@ def run_pipeline(args):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="MainpipeNS Data Pipeline")
     parser.add_argument("--raw", required=True, help="Path to raw JSONL file")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes for the cleaning stage (default: 1)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Run dedup/clean/tokenize/pack/shard as one streaming pass")
+    parser.add_argument("--keep-intermediate", action="store_true",
+                        help="With --stream, also write the dedup/clean/tokenized/packed files")
+    parser.add_argument("--compact-dedup", action="store_true",
+                        help="Exact dedup with truncated binary digests in sorted arrays that spill to disk")
+    parser.add_argument("--dedup-digest-bytes", type=int, default=16,
+                        help="Digest width for --compact-dedup (default: 16)")
+    parser.add_argument("--dedup-memory-entries", type=int, default=50_000_000,
+                        help="Digests kept in RAM before spilling a sorted run (default: 50M)")
+    parser.add_argument("--dedup-spill-dir", default=None,
+                        help="Directory for spilled digest runs (default: temporary directory)")
+    parser.add_argument("--dedup-store", default=None,
+                        help="Directory of a persistent dedup store: drop docs seen in earlier runs and add this run's")
+    parser.add_argument("--near-dedup", action="store_true",
+                        help="Run SimHash near-dedup after exact dedup")
+    parser.add_argument("--hamming-threshold", type=int, default=3,
+                        help="Max SimHash Hamming distance treated as a near duplicate (default: 3)")
+    parser.add_argument("--minhash-dedup", action="store_true",
+                        help="Run MinHash-LSH (Jaccard) near-dedup after exact dedup (not with --stream)")
+    parser.add_argument("--minhash-bands", type=int, default=16,
+                        help="Number of LSH bands (default: 16)")
+    parser.add_argument("--minhash-rows", type=int, default=8,
+                        help="Signature rows per band; num_perm = bands * rows (default: 8)")
+    parser.add_argument("--minhash-ngram", type=int, default=5,
+                        help="Word n-gram size for MinHash shingles (default: 5)")
+    parser.add_argument("--lang-detector", choices=["full", "cascade"], default="full",
+                        help="Language filter: full lingua detector or the cheaper cascade (default: full)")
+    parser.add_argument("--pipeline-config", default=None,
+                        help="JSON/YAML file with the cleaning stages (default: built-in stages, see README 4.1)")
+    parser.add_argument("--adaptive-filters", action="store_true",
+                        help="Reorder the cleaning filters by observed time per rejected document")
+    parser.add_argument("--feature-cache-docs", type=int, default=100_000,
+                        help="Documents whose detector results are shared across report/cleaning stages (0 = off, default: 100k)")
+    parser.add_argument("--features-out", default=None,
+                        help="Write per-document cleaning features (.npz) for reports and re-filtering (not with --stream)")
+    parser.add_argument("--boilerplate", action="store_true",
+                        help="Remove lines/paragraphs repeated across many documents after cleaning (not with --stream)")
+    parser.add_argument("--boilerplate-min-count", type=int, default=100,
+                        help="Drop units found in at least this many documents (default: 100)")
+    parser.add_argument("--boilerplate-unit", choices=["line", "paragraph"], default="line",
+                        help="Unit counted and removed by --boilerplate (default: line)")
+    parser.add_argument("--boilerplate-sketch-log2-width", type=int, default=22,
+                        help="log2 of the count-min sketch width; 4 rows of 2^N uint32 counters (default: 22, 64 MiB)")
+    parser.add_argument("--tokenize-batch-size", type=int, default=1024,
+                        help="Texts per tiktoken encode_batch() call (0 = one at a time, default: 1024)")
+    parser.add_argument("--tokenize-threads", type=int, default=None,
+                        help="tiktoken encoder threads per process (default: number of CPUs, at most 8)")
+    parser.add_argument("--tokenize-workers", type=int, default=1,
+                        help="Tokenization processes over byte ranges of the clean file (not with --stream, default: 1)")
+    parser.add_argument("--token-format", choices=["jsonl", "bin"], default="jsonl",
+                        help="Tokenized/packed/shard format: JSONL lists or .bin/.idx token files")
+    parser.add_argument("--packing", choices=["greedy", "best_fit", "concat"], default="greedy",
+                        help="Block packing: greedy in input order, best-fit decreasing per window, "
+                             "or concat (no padding, documents cross blocks, file mode only)")
+    parser.add_argument("--packing-window", type=int, default=10000,
+                        help="Documents per best-fit packing window (default: 10000)")
+    parser.add_argument("--shuffle-shards", action="store_true",
+                        help="Globally shuffle packed blocks (seeded, bounded memory) before the train/val/test split")
+    parser.add_argument("--shuffle-seed", type=int, default=0,
+                        help="Seed of --shuffle-shards (default: 0)")
+    parser.add_argument("--shuffle-bucket-mb", type=int, default=256,
+                        help="Size of the temporary buckets loaded into memory by --shuffle-shards (default: 256)")
+    parser.add_argument("--length-buckets", type=int, nargs="+", default=None,
+                        help="Pack into several block sizes in one pass, e.g. 512 1024 2048 4096 (file mode only)")
+    parser.add_argument("--bucket-policy", choices=["fit", "all"], default="fit",
+                        help="Length buckets: smallest block that fits each document, or every document in all sizes")
 
     args = parser.parse_args()
+    if args.stream and args.minhash_dedup:
+        parser.error("--minhash-dedup needs two passes over the data and cannot be used with --stream")
+    if args.stream and args.boilerplate:
+        parser.error("--boilerplate needs two passes over the data and cannot be used with --stream")
+    if args.stream and args.features_out:
+        parser.error("--features-out stores byte offsets into the dedup file and cannot be used with --stream")
+    if args.stream and args.shuffle_shards:
+        parser.error("--shuffle-shards needs the packed file and cannot be used with --stream")
+    if args.length_buckets and (args.stream or args.packing == "concat"):
+        parser.error("--length-buckets needs the tokenized file and greedy or best_fit packing (not --stream or concat)")
+    if args.stream and args.packing == "concat":
+        parser.error("--packing concat works on the memory-mapped tokenized file and cannot be used with --stream")
     run_pipeline(args)
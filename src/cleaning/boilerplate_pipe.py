@@ -0,0 +1,168 @@
+import hashlib
+import json
+import re
+from collections import Counter
+from functools import partial
+import numpy as np
+from tqdm import tqdm
+from src.utils.io_utils import iter_line_batches
+from src.utils.count_min import CountMinSketch
+from src.cleaning.clean_pipe import map_batches
+
+# Two-pass removal of lines (or paragraphs) that repeat across many documents:
+# navigation menus, cookie banners, footers, share buttons, ...
+#
+#   pass 1: hash every distinct normalized unit of each document into a
+#           count-min sketch, so the count is the number of documents it
+#           appears in
+#   pass 2: drop units whose estimated document frequency is >= min_count
+#
+# Both passes run over batches of lines with map_batches(), so they can use
+# worker processes; memory is bounded by the sketch size.
+
+SEPARATORS = {"line": "\n", "paragraph": "\n\n"}
+
+_sketch = None      # set in each worker by _init_sketch() for pass 2
+
+
+def split_units(text, unit="line"):
+    return text.split(SEPARATORS[unit])
+
+
+def unit_key(part):
+    """Normalized form of a line/paragraph used for counting (case and spacing ignored)."""
+    return " ".join(part.lower().split())
+
+
+def unit_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def doc_unit_hashes(text, unit="line"):
+    """Hashes of the distinct non-empty units of one document."""
+    keys = {unit_key(p) for p in split_units(text, unit)}
+    keys.discard("")
+    return [unit_hash(k) for k in keys]
+
+
+def _parse_texts(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line).get("text", "")
+        except:
+            continue
+
+
+def hash_lines(lines, unit="line"):
+    """Pass 1 worker: uint64 array of per-document unit hashes for a batch of JSONL lines."""
+    hashes = []
+    for text in _parse_texts(lines):
+        hashes.extend(doc_unit_hashes(text, unit))
+    return np.array(hashes, dtype=np.uint64)
+
+
+def _init_sketch(sketch):
+    global _sketch
+    _sketch = sketch
+
+
+def remove_boilerplate(text, sketch, min_count, unit="line", min_chars=200, counters=None):
+    """
+    Drop units of `text` seen in at least `min_count` documents.
+    Returns the remaining text, or None if fewer than min_chars are left.
+    """
+    parts = split_units(text, unit)
+    keys = [unit_key(p) for p in parts]
+    live = [i for i, k in enumerate(keys) if k]
+    if not live:
+        return text
+
+    est = sketch.estimate(np.array([unit_hash(keys[i]) for i in live], dtype=np.uint64))
+    drop = {i for i, n in zip(live, est) if n >= min_count}
+
+    if counters is not None and drop:
+        counters["BOILERPLATE_DOCS"] += 1
+        counters["BOILERPLATE_LINES"] += len(drop)
+    if not drop:
+        return text
+
+    text = SEPARATORS[unit].join(p for i, p in enumerate(parts) if i not in drop)
+    text = re.sub(r"\n{3,}", "\n\n", text).strip()
+
+    if len(text) < min_chars:
+        if counters is not None:
+            counters["BOILERPLATE_SHORT"] += 1
+        return None
+    return text
+
+
+def strip_lines(lines, min_count, unit="line", min_chars=200):
+    """Pass 2 worker: returns (output_lines, counters) for a batch of JSONL lines."""
+    counters = Counter()
+    out = []
+    for text in _parse_texts(lines):
+        text = remove_boilerplate(text, _sketch, min_count, unit, min_chars, counters)
+        if text is not None:
+            out.append(json.dumps({"text": text}) + "\n")
+    return out, counters
+
+
+def count_units(input_path, unit="line", log2_width=22, depth=4, workers=1,
+                batch_size=256, max_chars=1_000_000, verbose=True):
+    """Pass 1: document frequency of every line/paragraph in a count-min sketch."""
+    sketch = CountMinSketch(log2_width=log2_width, depth=depth)
+
+    batches = iter_line_batches(input_path, batch_size=batch_size, max_chars=max_chars)
+    with tqdm(unit=" batches", disable=not verbose, desc="boilerplate pass 1") as pbar:
+        for hashes in map_batches(partial(hash_lines, unit=unit), batches, workers):
+            sketch.add(hashes)
+            pbar.update(1)
+
+    return sketch
+
+
+def boilerplate_dataset(input_path, output_path, min_count=100, unit="line",
+                        min_chars=200, log2_width=22, depth=4, workers=1,
+                        batch_size=256, max_chars=1_000_000, verbose=True):
+    """
+    Remove lines (unit="line") or paragraphs (unit="paragraph") that occur
+    in at least `min_count` documents of a cleaned {"text": ...} JSONL file.
+
+    Documents left with fewer than `min_chars` characters are dropped.
+    Returns a Counter with BOILERPLATE_LINES (units removed),
+    BOILERPLATE_DOCS (documents changed) and BOILERPLATE_SHORT (documents
+    dropped). Only BOILERPLATE_SHORT is a per-document cleaning status; the
+    other two are reported separately.
+
+    The sketch never undercounts, so every unit at or above min_count is
+    removed; a rare unit may be removed too if its estimate is inflated by
+    collisions (see CountMinSketch.error_bound()).
+    """
+    if verbose:
+        print("\n=== RUNNING BOILERPLATE REMOVAL ===")
+
+    sketch = count_units(input_path, unit=unit, log2_width=log2_width, depth=depth,
+                         workers=workers, batch_size=batch_size, max_chars=max_chars,
+                         verbose=verbose)
+    if verbose:
+        print(f"Counted {sketch.total:,} {unit}s in a {sketch.memory_bytes / 2**20:.0f} MiB sketch "
+              f"(overcount <= {sketch.error_bound():.1f} w.p. {1 - np.exp(-depth):.3f})")
+
+    counters = Counter()
+    strip = partial(strip_lines, min_count=min_count, unit=unit, min_chars=min_chars)
+
+    batches = iter_line_batches(input_path, batch_size=batch_size, max_chars=max_chars)
+    with open(output_path, "w", encoding="utf-8") as fout:
+        for out, batch_counters in map_batches(strip, batches, workers,
+                                               initializer=_init_sketch, initargs=(sketch,)):
+            fout.writelines(out)
+            counters.update(batch_counters)
+
+    if verbose:
+        for k in ("BOILERPLATE_LINES", "BOILERPLATE_DOCS", "BOILERPLATE_SHORT"):
+            print(f"{k}: {counters[k]:,}")
+
+    return counters
@@ -1,86 +1,374 @@
 import json
-from collections import Counter
+from collections import Counter, deque
+from functools import partial
+from multiprocessing import get_context, get_all_start_methods
+import numpy as np
 import matplotlib.pyplot as plt
 from tqdm import tqdm
-from src.utils.io_utils import stream_jsonl, write_jsonl
-from src.detectors.html_detect import has_html, strip_html
-from src.detectors.language_detect import detect_lang
+from src.utils.io_utils import write_jsonl, iter_batches, iter_line_batches
+from src.detectors.doc_features import DocFeatures, detect_langs
 from src.detectors.code_ASCII_detect import code_fraction
-from src.detectors.code_strong_detect import code_fraction_strong
 
-from src.cleaning.txt_norm_pipe import normalize_text
+from src.cleaning.filter_chain import print_filter_summary
+from src.cleaning.stages import Pipeline, cleaning_config
 
-def clean_dataset(input_path, output_path, verbose=True):
+# lingua's parallel batch API starts a native thread pool, and a worker forked
+# from a process that has used it deadlocks; workers are started from a clean
+# process instead
+_MP_CONTEXT = get_context("forkserver" if "forkserver" in get_all_start_methods() else "spawn")
+
+_cache = None       # run-level FeatureCache, installed by _init_cache() (in each worker)
+_pipelines = {}     # (config, adaptive) -> Pipeline of this process
+
+
+def _init_cache(cache):
+    global _cache
+    _cache = cache
+
+
+def get_pipeline(config=None, lang_detector="full", adaptive=False):
+    """
+    The cleaning Pipeline of this process for a list of stage specs
+    (default: stages.cleaning_config(lang_detector)), see stages.py.
+    """
+    if config is None:
+        config = cleaning_config(lang_detector)
+    key = (json.dumps(config, sort_keys=True), adaptive)
+    if key not in _pipelines:
+        _pipelines[key] = Pipeline(config, adaptive=adaptive)
+    return _pipelines[key]
+
+
+def prepare_text(text, cache=None, stats=None):
+    """
+    Cleaning steps that come before the pipeline stages.
+
+    Returns the DocFeatures of the document, or None if it is empty.
+    """
+    if not text:
+        return None
+    return DocFeatures(text, cache, stats)
+
+
+def feature_record(doc, lang):
+    """
+    (length, lang, has_html, code_fraction_strong) of a document as stored
+    in the feature sidecar (see clean_dataset(features_path=...)). Length
+    and code fraction are those of the visible text.
+    """
+    if not doc:
+        return (0, "", False, float("nan"))
+    visible = doc.visible
+    return (visible.length, lang, doc.has_html, visible.code_fraction_strong)
+
+
+def clean_text(text, counters, lang_detector="full", cache=None, pipeline=None):
+    """
+    Run the cleaning filters on a single document.
+
+    Updates `counters` in place and returns the cleaned text,
+    or None if the document is dropped. `lang_detector` names an entry of
+    LANG_DETECTORS ("full" = detect_lang, "cascade" = detect_lang_cascade).
+    """
+    doc = prepare_text(text, cache)
+    if doc is None:
+        counters["EMPTY"] += 1
+        return None
+    pipeline = pipeline or get_pipeline(lang_detector=lang_detector)
+    outputs, _ = pipeline.run([doc], counters)
+    return outputs[0].text if outputs[0] is not None else None
+
+
+def clean_rows(rows, lang_detector="full", cache=None, records=None, pipeline=None,
+               filter_stats=None):
+    """
+    Clean a batch of parsed rows.
+
+    The whole batch goes through the stages of `pipeline` (default:
+    get_pipeline(lang_detector)); its filters run cheapest first, so only
+    documents that pass the length and code checks reach language
+    detection, which is done in one call to the batch detector (lingua
+    runs it on native threads). Results and counters are the same as
+    calling clean_text() on each row. Features already in `cache` (a
+    FeatureCache) are not computed again.
+
+    Returns (cleaned_texts, counters, feature_stats) with the kept texts in
+    input order; feature_stats counts computed features and cache hits.
+    Per-stage counts and timings are added to the Counter `filter_stats`.
+    If `records` is a list, feature_record() + (status,) is appended to it
+    for every row (this computes every feature of every non-empty
+    document, so nothing is short-circuited).
+    """
+    pipeline = pipeline or get_pipeline(lang_detector=lang_detector)
+    counters = Counter()
+    stats = Counter()
+    texts = []
+
+    prepared = []       # False for malformed rows
+    for row in rows:
+        try:
+            text = row.get("text", "").strip()
+        except:
+            prepared.append(False)
+            continue
+        prepared.append(prepare_text(text, cache, stats))
+
+    docs = [doc for doc in prepared if doc]
+    if records is not None and docs:
+        visible = [doc.visible for doc in docs]
+        detect_langs(visible, lang_detector)
+        for doc in visible:
+            doc.code_fraction_strong
+    results = zip(*pipeline.run(docs, counters, filter_stats))
+
+    for doc in prepared:
+        if doc is False:
+            counters["MALFORMED"] += 1
+            if records is not None:
+                records.append(feature_record(None, "") + ("MALFORMED",))
+            continue
+
+        if doc is None:
+            counters["EMPTY"] += 1
+            if records is not None:
+                records.append(feature_record(None, "") + ("EMPTY",))
+            continue
+
+        out, status = next(results)
+        if records is not None:
+            records.append(feature_record(doc, doc.visible.lang(lang_detector)) + (status,))
+        if out is None:
+            continue
+
+        texts.append(out.text)
+        counters["KEPT"] += 1
+
+    return texts, counters, stats
+
+
+def clean_lines(lines, lang_detector="full", cache=None, offsets=None, records=None,
+                pipeline=None, filter_stats=None):
+    """
+    Clean a batch of raw JSONL lines.
+
+    Returns (output_lines, counters, feature_stats). Blank and unparsable
+    lines are skipped the same way as in stream_jsonl(). This is the unit
+    of work sent to each worker process by clean_dataset(workers>1).
+    With `offsets` (byte offset of each line) and a `records` list,
+    (offset,) + feature_record() is appended for every parsed line.
+    """
+    rows = []
+    row_offsets = []
+    for i, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rows.append(json.loads(line))
+        except:
+            continue
+        if offsets is not None:
+            row_offsets.append(offsets[i])
+
+    row_records = [] if records is not None else None
+    texts, counters, stats = clean_rows(rows, lang_detector, cache, row_records, pipeline, filter_stats)
+    if records is not None:
+        records.extend((off,) + rec for off, rec in zip(row_offsets, row_records))
+    return [json.dumps({"text": t}) + "\n" for t in texts], counters, stats
+
+
+def _clean_rows_cached(rows, lang_detector="full", config=None, adaptive=False):
+    filter_stats = Counter()
+    out = clean_rows(rows, lang_detector, _cache, pipeline=get_pipeline(config, lang_detector, adaptive),
+                     filter_stats=filter_stats)
+    return out + (filter_stats,)
+
+
+def _clean_lines_cached(batch, lang_detector="full", features=False, config=None, adaptive=False):
+    # batch: lines, or (offset, line) pairs with features=True
+    filter_stats = Counter()
+    pipeline = get_pipeline(config, lang_detector, adaptive)
+    if not features:
+        out = clean_lines(batch, lang_detector, _cache, pipeline=pipeline, filter_stats=filter_stats)
+        return out + (filter_stats, None)
+    records = []
+    offsets = [off for off, _ in batch]
+    lines = [line for _, line in batch]
+    out = clean_lines(lines, lang_detector, _cache, offsets, records, pipeline, filter_stats)
+    return out + (filter_stats, feature_columns(records))
+
+
+def feature_columns(records):
+    """Feature records (see clean_lines) of one batch as a dict of NumPy columns."""
+    offset, length, lang, html, code, status = zip(*records) if records else ([],) * 6
+    return {
+        "offset": np.array(offset, dtype=np.int64),
+        "length": np.array(length, dtype=np.int64),
+        "lang": np.array(lang, dtype=str),
+        "html": np.array(html, dtype=bool),
+        "code_fraction": np.array(code, dtype=np.float64),
+        "status": np.array(status, dtype=str),
+    }
+
+
+def save_features(path, batches, source):
+    """
+    Write the feature_columns() of all batches as one columnar .npz
+    sidecar: offset, length, lang, html, code_fraction and status arrays,
+    one entry per parsed line of `source`.
+    """
+    batches = [feature_columns([])] + list(batches)
+    np.savez(path, source=np.array(source),
+             **{name: np.concatenate([b[name] for b in batches]) for name in batches[0]})
+
+
+def map_batches(fn, batches, workers=1, initializer=None, initargs=()):
+    """
+    Yield fn(batch) for each batch, in input order.
+
+    With workers > 1 batches are dispatched to a process pool. Idle
+    workers pull the next pending batch as soon as they finish, so one
+    batch of very long documents does not hold the others back, and at
+    most `workers * 4` batches are in flight to bound memory.
+
+    initializer(*initargs) is run once per worker process (or once
+    in-process when workers <= 1), e.g. to install shared read-only state.
+    """
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for batch in batches:
+            yield fn(batch)
+        return
+
+    max_pending = workers * 4
+    with _MP_CONTEXT.Pool(processes=workers, initializer=initializer, initargs=initargs) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.apply_async(fn, (batch,)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def iter_clean_texts(rows, counters, workers=1, batch_size=256, max_chars=1_000_000,
+                     lang_detector="full", cache=None, filter_stats=None, adaptive_filters=False,
+                     pipeline_config=None):
+    """
+    Streaming version of clean_dataset(): yield cleaned texts for an
+    iterable of rows, updating `counters` (and `filter_stats`) in place.
+    """
+    batches = iter_batches(rows, batch_size=batch_size, max_chars=max_chars,
+                           size=lambda row: len(row.get("text", "")) if isinstance(row, dict) else 0)
+    clean = partial(_clean_rows_cached, lang_detector=lang_detector, config=pipeline_config,
+                    adaptive=adaptive_filters)
+    for texts, batch_counters, stats, batch_filter_stats in map_batches(
+            clean, batches, workers, initializer=_init_cache, initargs=(cache,)):
+        counters.update(batch_counters)
+        if filter_stats is not None:
+            filter_stats.update(batch_filter_stats)
+        if cache is not None:
+            cache.stats.update(stats)
+        yield from texts
+
+
+def _record_sizes(batches, sizes):
+    """Pass batches through, appending the length of each to `sizes`."""
+    for batch in batches:
+        sizes.append(len(batch))
+        yield batch
+
+
+def clean_dataset(input_path, output_path, verbose=True,
+                  workers=1, batch_size=256, max_chars=1_000_000, lang_detector="full",
+                  cache=None, features_path=None, filter_stats=None, adaptive_filters=False,
+                  pipeline_config=None):
+    """
+    Clean a deduplicated JSONL file and write {"text": ...} rows.
+
+    Args:
+        input_path   : deduplicated jsonl
+        output_path  : cleaned jsonl
+        workers      : number of worker processes (1 = run in-process)
+        batch_size   : max documents per batch sent to a worker
+        max_chars    : max characters per batch (keeps long docs in small batches)
+        lang_detector: "full" (detect_lang) or "cascade" (detect_lang_cascade)
+        cache        : optional run-level FeatureCache; each worker gets a copy
+                       and the hit counts are added to cache.stats
+        features_path: optional .npz sidecar of per-document features
+                       (save_features) for reports and re-filtering with
+                       other thresholds, see src/cleaning/feature_store.py
+        filter_stats : optional Counter, updated in place with the per-stage
+                       counts and timings (filter_summary())
+        adaptive_filters: re-rank the filters by observed seconds per
+                       rejection (see FilterChain)
+        pipeline_config: list of stage specs (see src/cleaning/stages.py);
+                       default stages.cleaning_config(lang_detector)
+
+    The kept documents are the same for any filter order. Output order and
+    counters are identical for any number of workers, except with
+    adaptive_filters, where the filter a dropped document is counted under
+    can depend on the order each worker has chosen.
+    """
 
     if verbose:
         print("\n=== RUNNING CLEANING PIPELINE ===")
 
     counters = Counter()
+    run_filter_stats = Counter()
+    features = features_path is not None
+    feature_batches = []
+
+    sizes = deque()     # lines per batch, in the order map_batches() returns results
+    with open(output_path, "w", encoding="utf-8") as fout, \
+         tqdm(unit=" docs", disable=not verbose) as pbar:
+        batches = iter_line_batches(input_path, batch_size=batch_size, max_chars=max_chars,
+                                    offsets=features)
+        batches = _record_sizes(batches, sizes)
+        clean = partial(_clean_lines_cached, lang_detector=lang_detector, features=features,
+                        config=pipeline_config, adaptive=adaptive_filters)
+        for out, batch_counters, stats, batch_filter_stats, columns in map_batches(
+                clean, batches, workers, initializer=_init_cache, initargs=(cache,)):
+            fout.writelines(out)
+            run_filter_stats.update(batch_filter_stats)
+            if features:
+                feature_batches.append(columns)
+            counters.update(batch_counters)
+            if cache is not None:
+                cache.stats.update(stats)
+            pbar.update(sizes.popleft())
 
-    with open(output_path, "w", encoding="utf-8") as fout:
-        for row in tqdm(stream_jsonl(input_path)):
-            try:
-                text = row.get("text", "").strip()
-            except:
-                counters["MALFORMED"] += 1
-                continue
-
-            # Empty
-            if not text:
-                counters["EMPTY"] += 1
-                continue
-
-            # Strip HTML
-            if has_html(text):
-                counters["HTML_STRIPPED"] += 1
-                text = strip_html(text)
-
-            # Language detection
-            lang = detect_lang(text)
-            if lang != "EN":
-                counters["NON_ENGLISH"] += 1
-                continue
-
-            # Code-heavy filtering
-            #if code_fraction(text) > 0.40:
-            #    counters["CODE_HEAVY"] += 1
-            #    continue
-            if code_fraction_strong(text) > 0.40:
-                counters["CODE_HEAVY"] += 1
-                continue
-
-            # Length rules
-            L = len(text)
-            if L < 200:
-                counters["TOO_SHORT"] += 1
-                continue
-            if L > 50000:
-                counters["TOO_LONG"] += 1
-                continue
-
-            # Normalize
-            text = normalize_text(text)
-
-            # Save cleaned doc
-            fout.write(json.dumps({"text": text}) + "\n")
-            counters["KEPT"] += 1
+    if features:
+        save_features(features_path, feature_batches, input_path)
+        if verbose:
+            n_docs = sum(len(b["offset"]) for b in feature_batches)
+            print(f"[clean] Saved features of {n_docs:,} documents to {features_path}")
 
     total = sum(counters.values())
     if verbose:
         print("\n=== CLEANING FINISHED ===")
         for k, v in counters.items():
             print(f"{k}: {v:,} ({v*100/total:6.2f}%) ")
+        print_filter_summary(run_filter_stats)
 
+    if filter_stats is not None:
+        filter_stats.update(run_filter_stats)
     return counters
 
 
-def print_cleaning_summary(counters):
+def print_cleaning_summary(counters, boilerplate=None):
+    """
+    Print the per-document cleaning statuses, then the counts of
+    boilerplate_dataset() (units removed, documents edited) if given;
+    those are not document statuses, so they are not part of the total.
+    """
     print("\n========== CLEANING SUMMARY ==========")
     total = sum(counters.values())
 
     removal_keys = [
         "EMPTY", "HTML_STRIPPED", "NON_ENGLISH", "CODE_HEAVY",
-        "TOO_SHORT", "TOO_LONG", "MALFORMED"
+        "TOO_SHORT", "TOO_LONG", "MALFORMED", "BOILERPLATE_SHORT"
     ]
     keep_key = "KEPT"
 
@@ -91,6 +379,12 @@ def print_cleaning_summary(counters):
     if keep_key in counters:
         print(f"{keep_key:15}: {counters[keep_key]:6}  ({counters[keep_key]/total*100:6.2f}%)")
 
+    if boilerplate:
+        print("--------------- boilerplate ----------")
+        for k in ("BOILERPLATE_LINES", "BOILERPLATE_DOCS"):
+            if k in boilerplate:
+                print(f"{k:15}: {boilerplate[k]:6}")
+
     print("======================================\n")
 
     
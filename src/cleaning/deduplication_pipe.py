@@ -1,60 +1,213 @@
 import json
-from src.utils.hash_utils import hash_text, simhash_text
+import os
+import tempfile
+import numpy as np
+from src.utils.io_utils import stream_jsonl, iter_batches
+from src.utils.hash_utils import hash_text, hash_digest, simhash_batch
+from src.utils.simhash_index import SimhashLSHIndex
+from src.utils.digest_index import DigestIndex
+from src.utils.minhash import MinHasher, UnionFind, band_keys, union_band_buckets, has_shingles
+
+
+def iter_dedup_exact(rows, counters, index=None, batch_size=4096, store=None):
+    """
+    Yield rows whose text has not been seen before (exact SHA-256 match).
+    Updates counters["kept"] / counters["dropped"] in place.
+
+    By default seen hashes are kept in a Python set of hex strings. Pass a
+    DigestIndex to store truncated binary digests in sorted NumPy runs that
+    spill to disk instead; rows are then checked in batches of batch_size.
+
+    With a DedupStore (src/utils/dedup_store.py), rows already in the store
+    from earlier runs are dropped too (counted in counters["store_dropped"]),
+    and the new digests are staged in the store once the input is exhausted.
+    The caller publishes them with store.commit().
+    """
+    if store is not None:
+        own_index = index is None
+        if own_index:
+            index = DigestIndex(n_bytes=store.n_bytes)
+        try:
+            yield from _iter_dedup_exact_index(rows, counters, index, batch_size, store)
+            store.add_digests(index.sorted_runs())
+        finally:
+            if own_index:
+                index.close()
+        return
+
+    if index is not None:
+        yield from _iter_dedup_exact_index(rows, counters, index, batch_size)
+        return
 
-def dedup_exact(input_path, output_path):
     seen = set()
-    kept = 0
-    dropped = 0
 
-    with open(input_path, "r", encoding="utf-8") as fin, \
-         open(output_path, "w", encoding="utf-8") as fout:
+    for row in rows:
+        text = row.get("text", "")
+        h = hash_text(text)
 
-        for line in fin:
-            try:
-                row = json.loads(line)
-            except:
-                continue
+        if h in seen:
+            counters["dropped"] += 1
+            continue
+
+        seen.add(h)
+        counters["kept"] += 1
+        yield row
+
+
+def _iter_dedup_exact_index(rows, counters, index, batch_size, store=None):
+    if store is not None:
+        counters.setdefault("store_dropped", 0)
+
+    for batch in iter_batches(rows, batch_size=batch_size):
+        digests = np.array([hash_digest(row.get("text", ""), index.n_bytes) for row in batch],
+                           dtype=index.dtype)
+
+        if store is None:
+            is_new = index.add_batch(digests)
+        else:
+            known = store.contains_digests(digests)
+            is_new = np.zeros(len(batch), dtype=bool)
+            is_new[~known] = index.add_batch(digests[~known])
+            counters["store_dropped"] += int(known.sum())
+
+        n_new = int(is_new.sum())
+        counters["kept"] += n_new
+        counters["dropped"] += len(batch) - n_new
+        for row, new in zip(batch, is_new):
+            if new:
+                yield row
+
+
+def dedup_exact(input_path, output_path, index=None, store=None):
+    """
+    Exact dedup on the SHA-256 of "text". With a DigestIndex (see
+    src/utils/digest_index.py) memory use is bounded and the collision
+    probability of the truncated digest is added to the returned counters.
+    With a DedupStore, rows seen in earlier runs are dropped as well; call
+    store.commit() once the run has succeeded to record this run's rows.
+    """
+    counters = {"kept": 0, "dropped": 0}
 
-            text = row.get("text", "")
-            h = hash_text(text)
+    with open(output_path, "w", encoding="utf-8") as fout:
+        for row in iter_dedup_exact(stream_jsonl(input_path), counters, index=index, store=store):
+            fout.write(json.dumps(row) + "\n")
+
+    print(f"Exact deduplication done: kept={counters['kept']:,}, dropped={counters['dropped']:,}")
+    if store is not None:
+        print(f"  of which already in dedup store: {counters['store_dropped']:,}")
+    if index is not None:
+        counters["collision_probability"] = index.collision_probability()
+        print(f"Digest index: {index.n_bytes}-byte digests, "
+              f"collision probability {counters['collision_probability']:.3e}")
+    return counters
+
+
+def iter_dedup_near(rows, counters, hamming_threshold=3, store=None, batch_size=4096):
+    """
+    Yield rows whose SimHash is more than `hamming_threshold` bits away from
+    every previously kept row. Updates counters["kept"] / counters["dropped"].
 
-            if h in seen:
-                dropped += 1
+    Fingerprints are computed with simhash_batch() over batches of
+    batch_size rows. With a DedupStore, fingerprints stored by earlier runs
+    are checked too (counted in counters["store_dropped"]), and the
+    fingerprints of kept rows are staged in the store at the end.
+    """
+    index = SimhashLSHIndex(hamming_threshold=hamming_threshold)
+    if store is not None:
+        counters.setdefault("store_dropped", 0)
+    kept_sigs = []
+
+    for batch in iter_batches(rows, batch_size=batch_size):
+        sigs = simhash_batch([row.get("text", "") for row in batch])
+        if store is not None:
+            known = store.contains_simhashes(sigs, hamming_threshold)
+        else:
+            known = np.zeros(len(batch), dtype=bool)
+        is_new = np.zeros(len(batch), dtype=bool)
+        is_new[~known] = index.add_batch(sigs[~known])
+
+        for row, sig, old, new in zip(batch, sigs.tolist(), known, is_new):
+            if old:
+                counters["store_dropped"] += 1
+                counters["dropped"] += 1
+                continue
+            if not new:
+                counters["dropped"] += 1
                 continue
 
-            seen.add(h)
-            kept += 1
+            if store is not None:
+                kept_sigs.append(sig)
+            counters["kept"] += 1
+            yield row
+
+    if store is not None:
+        store.add_simhashes(kept_sigs)
+
+
+def dedup_near(input_path, output_path, hamming_threshold=3, store=None):
+    counters = {"kept": 0, "dropped": 0}
+
+    with open(output_path, "w", encoding="utf-8") as fout:
+        for row in iter_dedup_near(stream_jsonl(input_path), counters, hamming_threshold, store=store):
             fout.write(json.dumps(row) + "\n")
 
-    print(f"Exact deduplication done: kept={kept:,}, dropped={dropped:,}")
+    print(f"Near-dedup: kept={counters['kept']:,}, dropped={counters['dropped']:,}")
+    if store is not None:
+        print(f"  of which near a fingerprint in the dedup store: {counters['store_dropped']:,}")
+    return counters
+
+
+def dedup_minhash(input_path, output_path, bands=16, rows=8, ngram=5, seed=1,
+                  batch_size=1024, work_dir=None):
+    """
+    Jaccard near-dedup with MinHash signatures and LSH banding.
+
+    Pass 1 streams the input in batches, computes MinHash signatures
+    (bands * rows permutations) and appends each band's keys to its own
+    temporary file. Each band file is then loaded on its own and sorted, and
+    docs with equal keys are merged with union-find. Pass 2 re-streams the
+    input and keeps the first document of every cluster.
 
+    Docs without any shingle are kept as their own cluster.
 
-def dedup_near(input_path, output_path, hamming_threshold=3):
-    signatures = []
-    kept = 0
-    dropped = 0
+    Memory is O(n_docs) regardless of the number of bands. Docs with
+    Jaccard similarity s collide in some band with probability
+    1 - (1 - s^rows)^bands, i.e. the threshold is about (1/bands)^(1/rows).
+    """
+    hasher = MinHasher(num_perm=bands * rows, ngram=ngram, seed=seed)
+    counters = {"kept": 0, "dropped": 0}
 
-    with open(input_path, "r") as fin, \
-         open(output_path, "w") as fout:
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        band_paths = [os.path.join(tmp, f"band_{b:03d}.u64") for b in range(bands)]
+        band_files = [open(p, "wb") for p in band_paths]
 
-        for line in fin:
-            row = json.loads(line)
-            text = row.get("text", "")
+        n_docs = 0
+        shingled = []
+        for batch in iter_batches(stream_jsonl(input_path), batch_size=batch_size):
+            sigs = hasher.signatures([row.get("text", "") for row in batch])
+            shingled.append(has_shingles(sigs))
+            keys = band_keys(sigs, bands, rows)
+            for b, f in enumerate(band_files):
+                f.write(np.ascontiguousarray(keys[:, b]).tobytes())
+            n_docs += len(batch)
 
-            sig = simhash_text(text) 
+        for f in band_files:
+            f.close()
 
-            is_duplicate = False
-            for prev_sig in signatures:
-                if bin(sig ^ prev_sig).count("1") <= hamming_threshold:
-                    is_duplicate = True
-                    break
+        # docs without shingles (e.g. no Latin letters or digits) are never merged
+        valid = np.concatenate(shingled) if shingled else np.zeros(0, dtype=bool)
+        uf = UnionFind(n_docs)
+        for p in band_paths:
+            union_band_buckets(uf, np.fromfile(p, dtype=np.uint64), valid)
+        keep = uf.roots()
 
-            if is_duplicate:
-                dropped += 1
+    with open(output_path, "w", encoding="utf-8") as fout:
+        for i, row in enumerate(stream_jsonl(input_path)):
+            if not keep[i]:
+                counters["dropped"] += 1
                 continue
-            
-            signatures.append(sig)
-            kept += 1
+            counters["kept"] += 1
             fout.write(json.dumps(row) + "\n")
 
-    print(f"Near-dedup: kept={kept:,}, dropped={dropped:,}")
+    print(f"MinHash dedup (bands={bands}, rows={rows}): kept={counters['kept']:,}, dropped={counters['dropped']:,}")
+    return counters
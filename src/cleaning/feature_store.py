@@ -0,0 +1,112 @@
+import argparse
+import json
+from collections import Counter
+import numpy as np
+from src.detectors.html_detect import strip_html_fast
+from src.cleaning.txt_norm_pipe import normalize_text
+from src.cleaning.filter_chain import CODE_THRESHOLD, MIN_CHARS, MAX_CHARS
+
+# Queries over the feature sidecar written by
+#
+#   clean_dataset(dedup_path, clean_path, features_path="data/clean/features.npz")
+#
+# One entry per parsed input line: byte offset in the input file, length of
+# the visible text, language, HTML flag, code_fraction_strong and the status
+# given by the cleaning filters ("KEPT", "NON_ENGLISH", ...). Reports and
+# "what-if" thresholds are then vectorized NumPy expressions, and
+# refilter_dataset() writes the clean file for other thresholds by seeking to
+# the kept documents, without running any detector again.
+#
+#   python -m src.cleaning.feature_store data/clean/features.npz \
+#       data/clean/clean_code50.jsonl --code-threshold 0.5
+
+
+def load_features(path):
+    """Columns of a feature sidecar as a dict of arrays ("source" is the input path)."""
+    with np.load(path) as data:
+        features = {name: data[name] for name in data.files}
+    features["source"] = str(features["source"])
+    return features
+
+
+def filter_statuses(features, code_threshold=CODE_THRESHOLD,
+                    min_chars=MIN_CHARS, max_chars=MAX_CHARS):
+    """
+    Status of every document under the given thresholds, checked in the
+    order the default Pipeline runs them (stages.cleaning_config(), filters
+    sorted by cost). With the default thresholds this is the stored "status"
+    column (the kept documents are the same for any order).
+    """
+    status = features["status"]
+    length = features["length"]
+    unparsed = (status == "EMPTY") | (status == "MALFORMED")
+    return np.select(
+        [unparsed,
+         length < min_chars,
+         length > max_chars,
+         features["code_fraction"] > code_threshold,
+         features["lang"] != "EN"],
+        [status, "TOO_SHORT", "TOO_LONG", "CODE_HEAVY", "NON_ENGLISH"],
+        default="KEPT")
+
+
+def status_counters(features, statuses):
+    """clean_dataset()-style counters for an array of statuses."""
+    names, counts = np.unique(statuses, return_counts=True)
+    counters = Counter({str(k): int(v) for k, v in zip(names, counts)})
+    n_html = int(features["html"].sum())       # empty/malformed rows are never HTML
+    if n_html:
+        counters["HTML_STRIPPED"] = n_html
+    return counters
+
+
+def refilter_dataset(features_path, output_path, code_threshold=CODE_THRESHOLD,
+                     min_chars=MIN_CHARS, max_chars=MAX_CHARS, input_path=None, verbose=True):
+    """
+    Write the clean file clean_dataset() would produce with other
+    thresholds, reading only the kept documents from the input file.
+
+    Args:
+        features_path : sidecar written by clean_dataset(features_path=...)
+        output_path   : cleaned jsonl
+        input_path    : input of that cleaning run (default: path stored in the sidecar)
+
+    Returns the counters of the new cleaning result.
+    """
+    features = load_features(features_path)
+    statuses = filter_statuses(features, code_threshold, min_chars, max_chars)
+    keep = np.flatnonzero(statuses == "KEPT")
+
+    with open(input_path or features["source"], "rb") as fin, \
+         open(output_path, "w", encoding="utf-8") as fout:
+        for i in keep:
+            fin.seek(features["offset"][i])
+            text = json.loads(fin.readline().decode("utf-8")).get("text", "").strip()
+            if features["html"][i]:
+                text = strip_html_fast(text)
+            fout.write(json.dumps({"text": normalize_text(text)}) + "\n")
+
+    counters = status_counters(features, statuses)
+    if verbose:
+        before = status_counters(features, features["status"])
+        print("\n=== RE-FILTERING FROM FEATURES ===")
+        print(f"code_threshold={code_threshold}, min_chars={min_chars}, max_chars={max_chars}")
+        for k in sorted(set(before) | set(counters)):
+            print(f"{k:15}: {before[k]:8,} -> {counters[k]:8,}")
+        print(f"[refilter] Saved {len(keep):,} documents to {output_path}")
+
+    return counters
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-filter a cleaned dataset from its feature sidecar")
+    parser.add_argument("features", help="Feature sidecar (.npz) written by the cleaning stage")
+    parser.add_argument("output", help="Path of the new cleaned JSONL file")
+    parser.add_argument("--input", default=None,
+                        help="Input of the cleaning run (default: path stored in the sidecar)")
+    parser.add_argument("--code-threshold", type=float, default=CODE_THRESHOLD)
+    parser.add_argument("--min-chars", type=int, default=MIN_CHARS)
+    parser.add_argument("--max-chars", type=int, default=MAX_CHARS)
+    args = parser.parse_args()
+    refilter_dataset(args.features, args.output, args.code_threshold,
+                     args.min_chars, args.max_chars, input_path=args.input)
@@ -0,0 +1,116 @@
+import time
+from collections import Counter
+
+# length and code thresholds of the filters; the feature sidecar allows
+# re-filtering with other values (see src/cleaning/feature_store.py)
+CODE_THRESHOLD = 0.40
+MIN_CHARS = 200
+MAX_CHARS = 50000
+
+# The cleaning filters as a chain that runs the cheapest filters first, so a
+# document dropped by a length check never reaches the code or language
+# detector. A document is kept only if no filter rejects it, so the kept set
+# does not depend on the order; the order only decides which filter a
+# dropped document is counted under.
+#
+#   chain = FilterChain([MinLength(), CodeHeavy(), Language()])    (src/cleaning/stages.py)
+#   statuses = chain.run(docs)      # "KEPT" or the name of the rejecting filter
+#
+# chain.stats counts, per filter, the documents evaluated and rejected and
+# the seconds spent, keyed by (name, "evaluated" | "rejected" | "seconds").
+
+
+class Filter:
+    """
+    Base class of cleaning filters. `name` is the counter of rejected
+    documents and `cost` the estimated time per document relative to a
+    length check. Subclasses implement rejects(doc) for one DocFeatures, or
+    override process(docs) with a batch version (e.g. batch language
+    detection).
+    """
+    name = None
+    cost = 1
+
+    def rejects(self, doc):
+        raise NotImplementedError
+
+    def process(self, docs):
+        """List with True for each rejected document."""
+        return [self.rejects(doc) for doc in docs]
+
+
+class FilterChain:
+    """
+    Runs filters cheapest first (by `cost`), or in the given order with
+    reorder=False (when the first rejecting filter decides a category).
+    With adaptive=True, once every filter has evaluated `min_docs`
+    documents the order is re-ranked by the observed seconds per rejected
+    document, which minimises the expected time per document for
+    independent filters.
+    """
+
+    def __init__(self, filters, adaptive=False, min_docs=1000, reorder=True):
+        self.filters = sorted(filters, key=lambda f: f.cost) if reorder else list(filters)
+        self.adaptive = adaptive and reorder
+        self.min_docs = min_docs
+        self.stats = Counter()
+
+    def order(self):
+        if not self.adaptive or any(self.stats[(f.name, "evaluated")] < self.min_docs
+                                    for f in self.filters):
+            return self.filters
+
+        def seconds_per_rejection(f):
+            rejected = self.stats[(f.name, "rejected")]
+            return self.stats[(f.name, "seconds")] / rejected if rejected else float("inf")
+
+        return sorted(self.filters, key=seconds_per_rejection)
+
+    def run(self, docs, stats=None):
+        """
+        Status of each DocFeatures in `docs`: "KEPT" or the name of the first
+        filter that rejects it. Timings and counts are added to self.stats
+        and, if given, to the Counter `stats`.
+        """
+        statuses = ["KEPT"] * len(docs)
+        alive = list(range(len(docs)))
+        run_stats = Counter()
+
+        for f in self.order():
+            if not alive:
+                break
+            t0 = time.perf_counter()
+            passed = []
+            for i, rejected in zip(alive, f.process([docs[i] for i in alive])):
+                if rejected:
+                    statuses[i] = f.name
+                else:
+                    passed.append(i)
+            run_stats[(f.name, "seconds")] += time.perf_counter() - t0
+            run_stats[(f.name, "evaluated")] += len(alive)
+            run_stats[(f.name, "rejected")] += len(alive) - len(passed)
+            alive = passed
+
+        self.stats.update(run_stats)
+        if stats is not None:
+            stats.update(run_stats)
+        return statuses
+
+
+def filter_summary(stats):
+    """{stage: {"evaluated", "rejected", "seconds"}} from chain/pipeline statistics."""
+    summary = {}
+    for (name, field), v in stats.items():
+        summary.setdefault(name, {"evaluated": 0, "rejected": 0, "seconds": 0.0})
+        summary[name][field] = round(v, 3) if field == "seconds" else v
+    return summary
+
+
+def print_filter_summary(stats):
+    print("\n========== CLEANING FILTERS ==========")
+    for name, s in filter_summary(stats).items():
+        rate = s["rejected"] / s["evaluated"] * 100 if s["evaluated"] else 0
+        per_doc = s["seconds"] / s["evaluated"] * 1e3 if s["evaluated"] else 0
+        print(f"{name:12}: {s['evaluated']:8,} evaluated  {s['rejected']:8,} rejected ({rate:5.1f}%)  "
+              f"{s['seconds']:8.2f} s  ({per_doc:.3f} ms/doc)")
+    print("======================================\n")
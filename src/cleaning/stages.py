@@ -0,0 +1,240 @@
+import importlib
+import json
+import time
+from src.detectors.doc_features import DocFeatures, detect_langs
+from src.cleaning.txt_norm_pipe import normalize_text
+from src.cleaning.filter_chain import Filter, FilterChain, CODE_THRESHOLD, MIN_CHARS, MAX_CHARS
+
+# Pluggable pipeline stages. A pipeline is a list of stage specs:
+#
+#   [{"stage": "strip_html"},
+#    {"stage": "min_length", "min_chars": 200},
+#    {"stage": "language", "detector": "cascade"},
+#    {"stage": "my_package.filters:BoilerplateFilter", "min_count": 5},
+#    {"stage": "normalize"}]
+#
+# "stage" is a name registered with @register_stage or "module:Class", the
+# other keys are passed to the constructor, and an optional "name" renames
+# the stage's counter. Every stage works on a whole batch of DocFeatures
+# (process(docs)), so batch/native-parallel implementations such as lingua's
+# parallel detector run without per-document Python overhead. Consecutive
+# filters run as one FilterChain, cheapest first.
+
+STAGES = {}
+
+
+def register_stage(name):
+    """Class decorator: make a Filter or Transform usable as {"stage": name}."""
+    def register(cls):
+        STAGES[name] = cls
+        return cls
+    return register
+
+
+class Transform:
+    """
+    Base class of stages that change documents. process(docs) returns one
+    DocFeatures per input (the same object if unchanged); `counter`, if
+    set, counts the documents that were changed. `name` labels its timing.
+    """
+    name = None
+    counter = None
+
+    def apply(self, doc):
+        raise NotImplementedError
+
+    def process(self, docs):
+        return [self.apply(doc) for doc in docs]
+
+
+@register_stage("strip_html")
+class StripHTML(Transform):
+    """Replace documents that contain HTML by their visible text."""
+    name = "strip_html"
+    counter = "HTML_STRIPPED"
+
+    def apply(self, doc):
+        return doc.visible
+
+
+@register_stage("normalize")
+class Normalize(Transform):
+    """normalize_text() (zero-width chars, control chars, whitespace runs)."""
+    name = "normalize"
+
+    def apply(self, doc):
+        return DocFeatures(normalize_text(doc.text), doc.cache, doc.stats)
+
+
+@register_stage("html")
+class HasHTML(Filter):
+    name = "HTML"
+    cost = 10
+
+    def rejects(self, doc):
+        return doc.has_html
+
+
+@register_stage("min_length")
+class MinLength(Filter):
+    name = "TOO_SHORT"
+
+    def __init__(self, min_chars=MIN_CHARS):
+        self.min_chars = min_chars
+
+    def rejects(self, doc):
+        return doc.length < self.min_chars
+
+
+@register_stage("max_length")
+class MaxLength(Filter):
+    name = "TOO_LONG"
+
+    def __init__(self, max_chars=MAX_CHARS):
+        self.max_chars = max_chars
+
+    def rejects(self, doc):
+        return doc.length > self.max_chars
+
+
+@register_stage("code_heavy")
+class CodeHeavy(Filter):
+    name = "CODE_HEAVY"
+    cost = 100
+
+    def __init__(self, threshold=CODE_THRESHOLD):
+        self.threshold = threshold
+
+    def rejects(self, doc):
+        # == code_fraction_strong(text) > threshold, with early exit
+        return doc.is_code_heavy(self.threshold)
+
+
+@register_stage("language")
+class Language(Filter):
+    name = "NON_ENGLISH"
+    cost = 1000
+
+    def __init__(self, keep=("EN",), detector="full"):
+        self.keep = set(keep)
+        self.detector = detector
+
+    def process(self, docs):
+        # one call to the batch detector (lingua: native threads)
+        return [lang not in self.keep for lang in detect_langs(docs, self.detector)]
+
+
+def build_stage(spec):
+    """Stage object for one spec, see the comment at the top of this file."""
+    spec = dict(spec)
+    stage_name = spec.pop("stage")
+    name = spec.pop("name", None)
+    if stage_name in STAGES:
+        cls = STAGES[stage_name]
+    elif ":" in stage_name:
+        module, attr = stage_name.split(":")
+        cls = getattr(importlib.import_module(module), attr)
+    else:
+        raise ValueError(f"Unknown stage {stage_name!r} (registered: {', '.join(sorted(STAGES))})")
+    stage = cls(**spec)
+    if name is not None:
+        stage.name = name
+    return stage
+
+
+def cleaning_config(lang_detector="full"):
+    """Stage specs of the default cleaning pipeline (README section 4.1)."""
+    return [
+        {"stage": "strip_html"},
+        {"stage": "min_length", "min_chars": MIN_CHARS},
+        {"stage": "max_length", "max_chars": MAX_CHARS},
+        {"stage": "code_heavy", "threshold": CODE_THRESHOLD},
+        {"stage": "language", "detector": lang_detector},
+        {"stage": "normalize"},
+    ]
+
+
+# classify_doc(): the first matching category wins, so no reordering
+CLASSIFY_CONFIG = [
+    {"stage": "html", "name": "HTML"},                  # HTML has highest priority
+    {"stage": "code_heavy", "name": "CODE_HEAVY"},      # code-heavy comes next
+    {"stage": "language", "name": "NON_ENGLISH_LANG"},  # other languages
+    {"stage": "min_length", "name": "SHORT_ENGLISH"},   # else GOOD_ENGLISH
+]
+
+
+def load_pipeline_config(path):
+    """
+    Read a pipeline config file: JSON, or YAML (.yaml/.yml, needs pyyaml).
+    A top-level {"cleaning": [...]} or a plain list of stage specs.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            config = yaml.safe_load(f)
+        else:
+            config = json.load(f)
+    stages = config["cleaning"] if isinstance(config, dict) else config
+    for spec in stages:
+        build_stage(spec)       # fail early on unknown stages or arguments
+    return stages
+
+
+class Pipeline:
+    """
+    Stages run in order on a batch of DocFeatures; each run of consecutive
+    filters is one FilterChain (cheapest first, adaptive=True re-ranks by
+    observed cost, reorder=False keeps the configured order).
+    """
+
+    def __init__(self, stages, adaptive=False, reorder=True):
+        self.stages = [build_stage(s) if isinstance(s, dict) else s for s in stages]
+        self.steps = []
+        for stage in self.stages:
+            if isinstance(stage, Filter) and self.steps and isinstance(self.steps[-1], list):
+                self.steps[-1].append(stage)
+            else:
+                self.steps.append([stage] if isinstance(stage, Filter) else stage)
+        self.steps = [FilterChain(step, adaptive=adaptive, reorder=reorder)
+                      if isinstance(step, list) else step for step in self.steps]
+
+    def run(self, docs, counters=None, stats=None):
+        """
+        Returns (outputs, statuses): the output DocFeatures of each input
+        (None if dropped) and "KEPT" or the name of the filter that dropped
+        it. Rejections and transform counters are added to `counters`, and
+        per-stage counts and timings to the Counter `stats`
+        (see filter_chain.filter_summary()).
+        """
+        outputs = list(docs)
+        statuses = ["KEPT"] * len(outputs)
+        alive = list(range(len(outputs)))
+
+        for step in self.steps:
+            if not alive:
+                break
+            batch = [outputs[i] for i in alive]
+
+            if isinstance(step, FilterChain):
+                passed = []
+                for i, status in zip(alive, step.run(batch, stats)):
+                    if status == "KEPT":
+                        passed.append(i)
+                        continue
+                    statuses[i] = status
+                    outputs[i] = None
+                    if counters is not None:
+                        counters[status] += 1
+                alive = passed
+                continue
+
+            t0 = time.perf_counter()
+            for i, doc in zip(alive, step.process(batch)):
+                if step.counter is not None and counters is not None and doc is not outputs[i]:
+                    counters[step.counter] += 1
+                outputs[i] = doc
+            if stats is not None:
+                stats[(step.name, "seconds")] += time.perf_counter() - t0
+                stats[(step.name, "evaluated")] += len(batch)
+
+        return outputs, statuses
@@ -91,3 +91,111 @@ def code_fraction_strong(text: str) -> float:
 # YES/NO CODE CLASSIFICATION
 def is_code_document_strong(text: str, threshold: float = 0.40) -> bool:
     return code_fraction_strong(text) > threshold
+
+
+# SINGLE-PASS ENGINE
+# Same decisions as is_code_line_strong / code_fraction_strong, but faster:
+# - cheap substring tests run first and gate the regexes that need them
+#   ("=" for assignments, "<" / "`" for fenced code); the keyword regex is
+#   compiled as a prefix trie and runs last
+# - the indentation branch above can never fire (the line is stripped
+#   first), so it is left out
+# - lines are scanned lazily with finditer instead of building a list
+# - is_code_document_fast() stops as soon as the answer is certain
+
+
+def _keyword_trie(words):
+    """Regex alternation of `words` factored by common prefix."""
+    root = {}
+    for w in words:
+        node = root
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node):
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 and len(node) == 1 else "(?:" + "|".join(alts) + ")"
+        return body + ("?" if "" in node else "")
+
+    return emit(root)
+
+
+# keywords of CODE_KEYWORDS (pattern is \b(kw1|kw2|...)\b)
+KEYWORD_WORDS = CODE_KEYWORDS.pattern[3:-3].split("|")
+CODE_KEYWORDS_TRIE = re.compile(r"\b" + _keyword_trie(KEYWORD_WORDS) + r"\b")
+
+# str.splitlines() boundaries; blank lines are skipped, so \r\n needs no special case
+LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+LINE_SEGMENT = re.compile(f"[^{LINE_BREAKS}]+")
+
+
+def _is_code_stripped(line: str) -> bool:
+    """is_code_line_strong() for an already stripped, non-empty line."""
+    if "{" in line or "}" in line or line[-1] == ";":
+        return True
+    if ("`" in line or "<" in line) and FENCED_CODE.search(line):
+        return True
+    if SYMBOL_HEAVY.match(line):
+        return True
+    if "=" in line and ASSIGNMENT.search(line):
+        return True
+    if PYTHON_DEF.match(line) or PYTHON_IMPORT.match(line):
+        return True
+    return CODE_KEYWORDS_TRIE.search(line) is not None
+
+
+def is_code_line_fast(line: str) -> bool:
+    line = line.strip()
+    return bool(line) and _is_code_stripped(line)
+
+
+def code_fraction_fast(text: str) -> float:
+    """Equal to code_fraction_strong(text)."""
+    n_lines = code_lines = 0
+    for m in LINE_SEGMENT.finditer(text):
+        line = m.group().strip()
+        if not line:
+            continue
+        n_lines += 1
+        if _is_code_stripped(line):
+            code_lines += 1
+
+    if not n_lines:
+        return 0.0
+    return code_lines / n_lines
+
+
+def is_code_document_fast(text: str, threshold: float = 0.40) -> bool:
+    """
+    Equal to is_code_document_strong(text, threshold), with early exit.
+
+    The number of line segments is at most (line breaks + 1). With c code
+    lines out of n non-blank lines seen and at most r segments left, the
+    final fraction lies in [c / (n + r), (c + r) / (n + r)]; we stop once
+    the whole interval is on one side of the threshold. Float division is
+    monotonic, so the early answer is the same as the full computation.
+    """
+    max_segments = 1 + sum(text.count(ch) for ch in LINE_BREAKS)
+
+    n_lines = code_lines = segments = 0
+    for m in LINE_SEGMENT.finditer(text):
+        segments += 1
+        line = m.group().strip()
+        if not line:
+            continue
+        n_lines += 1
+        if _is_code_stripped(line):
+            code_lines += 1
+
+        left = max_segments - segments
+        if code_lines / (n_lines + left) > threshold:
+            return True
+        if (code_lines + left) / (n_lines + left) <= threshold:
+            return False
+
+    if not n_lines:
+        return 0.0 > threshold
+    return code_lines / n_lines > threshold
@@ -0,0 +1,173 @@
+import hashlib
+from collections import Counter
+from src.detectors.html_detect import has_html_fast, strip_html_fast
+from src.detectors.language_detect import LANG_DETECTORS, LANG_BATCH_DETECTORS
+from src.detectors.code_ASCII_detect import code_fraction
+from src.detectors.code_strong_detect import code_fraction_strong, is_code_document_fast
+
+# Per-document features shared by the cleaning filters and the reports.
+#
+#   doc = DocFeatures(text, cache)
+#   doc.has_html, doc.lang(), doc.is_code_heavy(0.40), ...
+#
+# Each feature is computed on first access and cached on the document. With a
+# FeatureCache the values are also shared between stages of one run, keyed by
+# the text: the raw category report, cleaning, the clean category report and
+# the quality report then analyse a document they have in common only once.
+# The first use of a feature on a DocFeatures is counted as
+# "<feature>_computed", or as "<feature>_hits" if the value was already known
+# (same text seen earlier in the run); repeated uses on the same object are
+# free and not counted.
+
+
+def _lang_key(lang_detector):
+    return "lang" if lang_detector == "full" else f"lang_{lang_detector}"
+
+
+class FeatureCache:
+    """
+    Run-level store of DocFeatures values keyed by a 16-byte BLAKE2b digest
+    of the text (the texts themselves are not kept). At most `max_docs`
+    documents are stored; later ones are analysed without sharing.
+    """
+
+    def __init__(self, max_docs=100_000):
+        self.max_docs = max_docs
+        self.entries = {}
+        self.stats = Counter()
+
+    def values_for(self, text):
+        key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        values = self.entries.get(key)
+        if values is None:
+            values = {}
+            if len(self.entries) < self.max_docs:
+                self.entries[key] = values
+        return values
+
+    def summary(self):
+        """{feature: {"computed": n, "hits": n}} plus the number of cached documents."""
+        features = sorted({k.rsplit("_", 1)[0] for k in self.stats})
+        summary = {f: {"computed": self.stats[f + "_computed"], "hits": self.stats[f + "_hits"]}
+                   for f in features}
+        summary["cached_docs"] = len(self.entries)
+        return summary
+
+
+class DocFeatures:
+    """
+    Lazily computed, cached features of one document:
+
+        has_html            has_html_fast(text)
+        stripped            text with HTML removed (html_to_text)
+        visible             DocFeatures of `stripped` (self if there is no HTML)
+        length              len(text)
+        lang(detector)      language code ("full" or "cascade" detector)
+        code_fraction       code_ASCII_detect.code_fraction(text)
+        code_fraction_strong
+        is_code_heavy(t)    code_fraction_strong(text) > t, with early exit
+
+    `stats` counts computed values and cache hits (defaults to cache.stats).
+    """
+
+    def __init__(self, text, cache=None, stats=None):
+        self.text = text
+        self.cache = cache
+        self.values = cache.values_for(text) if cache is not None else {}
+        if stats is None:
+            stats = cache.stats if cache is not None else Counter()
+        self.stats = stats
+        self._stripped = None
+        self._visible = None
+        self._seen = set()
+
+    def _count(self, name, computed):
+        if name not in self._seen:
+            self._seen.add(name)
+            self.stats[name + ("_computed" if computed else "_hits")] += 1
+
+    def _get(self, name, compute):
+        computed = name not in self.values
+        if computed:
+            self.values[name] = compute()
+        self._count(name, computed)
+        return self.values[name]
+
+    @property
+    def has_html(self):
+        return self._get("has_html", lambda: has_html_fast(self.text))
+
+    @property
+    def stripped(self):
+        # not shared through the cache: it is as large as the text
+        if self._stripped is None:
+            self._stripped = strip_html_fast(self.text) if self.has_html else self.text
+        return self._stripped
+
+    @property
+    def visible(self):
+        if not self.has_html:
+            return self
+        if self._visible is None:
+            self._visible = DocFeatures(self.stripped, self.cache, self.stats)
+        return self._visible
+
+    @property
+    def length(self):
+        return len(self.text)
+
+    def lang(self, lang_detector="full"):
+        return self._get(_lang_key(lang_detector), lambda: LANG_DETECTORS[lang_detector](self.text))
+
+    @property
+    def code_fraction(self):
+        return self._get("code_fraction", lambda: code_fraction(self.text))
+
+    @property
+    def code_fraction_strong(self):
+        return self._get("code_fraction_strong", lambda: code_fraction_strong(self.text))
+
+    def is_code_heavy(self, threshold=0.40):
+        if "code_fraction_strong" in self.values:
+            return self.code_fraction_strong > threshold
+        return self._get(f"code_heavy_{threshold}",
+                         lambda: is_code_document_fast(self.text, threshold))
+
+
+def as_features(doc, cache=None):
+    """DocFeatures for a text, or `doc` itself if it already is one."""
+    return doc if isinstance(doc, DocFeatures) else DocFeatures(doc, cache)
+
+
+def detect_langs(docs, lang_detector="full"):
+    """
+    Languages of a list of DocFeatures. Documents without a cached language
+    are detected in one call to the batch detector (repeated texts once).
+    """
+    name = _lang_key(lang_detector)
+    todo = {}       # id of the shared values dict -> first document
+    for d in docs:
+        if name not in d.values:
+            todo.setdefault(id(d.values), d)
+    if todo:
+        todo = list(todo.values())
+        langs = LANG_BATCH_DETECTORS[lang_detector]([d.text for d in todo])
+        for d, lang in zip(todo, langs):
+            d.values[name] = lang
+            d._count(name, True)
+
+    for d in docs:
+        d._count(name, False)
+    return [d.values[name] for d in docs]
+
+
+def print_feature_summary(cache):
+    print("\n========== FEATURE CACHE ==========")
+    for name, s in cache.summary().items():
+        if name == "cached_docs":
+            continue
+        total = s["computed"] + s["hits"]
+        print(f"{name:22}: {s['computed']:8,} computed  {s['hits']:8,} hits  "
+              f"({s['hits'] / total * 100 if total else 0:5.1f}% saved)")
+    print(f"{'cached documents':22}: {len(cache.entries):8,}")
+    print("===================================\n")
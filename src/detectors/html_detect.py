@@ -57,3 +57,110 @@ def strip_html(text):
     # Collapse whitespace
     text = re.sub(r"\s+", " ", text)
     return text.strip()
+
+
+
+# ------------------------------------------------------------------
+# LINEAR-TIME EXTRACTOR
+# ------------------------------------------------------------------
+# The lazy regexes above rescan to the end of the text for every "<script",
+# "<!--" or "<a " that is never closed; for script/style blocks they do so
+# once per ">" that follows, so a truncated page full of "<script>" takes
+# minutes. has_html() has the same problem with its tag pattern.
+#
+# html_to_text() returns exactly (has_html(text), strip_html(text)) in linear
+# time, with the same three removal steps:
+#   - script/style blocks: a forward scan that remembers the next ">" and the
+#     next closing tag, so a missing one is only searched for once
+#   - comments and tags: the original regexes, run only up to the last "-->"
+#     (resp. ">"). Before that point every opener that can match does match
+#     and is consumed, and after it nothing can match.
+
+SCRIPT_OPEN = re.compile(r"<(?:(script)|style)", re.IGNORECASE)
+SCRIPT_CLOSE = re.compile(r"</script>", re.IGNORECASE)
+STYLE_CLOSE = re.compile(r"</style>", re.IGNORECASE)
+GT = re.compile(r">")
+COMMENT_PATTERN = re.compile(r"<!--.*?-->", re.DOTALL)
+
+
+class _Finder:
+    """
+    End of the first match of `pattern` at or after a position (None if there
+    is none). Positions only move forward, so the last answer is reused until
+    the position passes it.
+    """
+
+    def __init__(self, text, pattern):
+        self.text = text
+        self.pattern = pattern
+        self.last_pos = -1
+        self.last_hit = None
+
+    def __call__(self, pos):
+        if self.last_pos >= 0 and pos >= self.last_pos and (
+                self.last_hit is None or self.last_hit[0] >= pos):
+            return self.last_hit
+        m = self.pattern.search(self.text, pos)
+        self.last_pos, self.last_hit = pos, m.span() if m else None
+        return self.last_hit
+
+
+def _strip_script_style(text):
+    """re.sub(r"<script.*?>.*?</script>|<style.*?>.*?</style>", " ", text, flags=DOTALL | IGNORECASE)"""
+    gt = _Finder(text, GT)
+    close = {True: _Finder(text, SCRIPT_CLOSE), False: _Finder(text, STYLE_CLOSE)}
+    pieces = []
+    pos = start = 0
+    while True:
+        m = SCRIPT_OPEN.search(text, pos)
+        if m is None:
+            break
+        g = gt(m.end())
+        c = close[m.group(1) is not None](g[1]) if g else None
+        if c is None:
+            pos = m.start() + 1
+            continue
+        pieces.append(text[start:m.start()])
+        pieces.append(" ")
+        pos = start = c[1]
+    if not pieces:
+        return text
+    pieces.append(text[start:])
+    return "".join(pieces)
+
+
+def _sub_until(pattern, text, last):
+    """pattern.sub(" ", text) when no match can end after text[:last]."""
+    if last <= 0:
+        return text
+    return pattern.sub(" ", text[:last]) + text[last:]
+
+
+def has_html_fast(text):
+    """Same result as has_html(), in linear time."""
+    if HTML_ENTITY_PATTERN.search(text) or SCRIPT_STYLE_PATTERN.search(text):
+        return True
+    return HTML_TAG_PATTERN.search(text, 0, text.rfind(">") + 1) is not None
+
+
+def strip_html_fast(text):
+    """Same result as strip_html(), in linear time."""
+    text = _strip_script_style(text)
+
+    last = text.rfind("-->")
+    text = _sub_until(COMMENT_PATTERN, text, last + 3 if last >= 0 else 0)
+    text = _sub_until(HTML_TAG_PATTERN, text, text.rfind(">") + 1)
+
+    text = html.unescape(text)
+    return " ".join(text.split())
+
+
+def html_to_text(text):
+    """
+    Returns (had_html, text): whether `text` contains HTML, and the text with
+    script/style blocks, comments and tags removed, entities decoded and
+    whitespace collapsed. Text without HTML is returned unchanged.
+    """
+    if not has_html_fast(text):
+        return False, text
+    return True, strip_html_fast(text)
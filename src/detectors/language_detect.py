@@ -1,7 +1,10 @@
 import json
 import random
+import re
+import time
 from lingua import Language, LanguageDetectorBuilder
 from collections import Counter
+from src.utils.io_utils import iter_batches
 
 
 ALL_LANGUAGES = Language.all()
@@ -14,6 +17,194 @@ def detect_lang(text):
     except:
         return "ERROR"
 
+
+def _lang_code(lang):
+    return lang.iso_code_639_1.name if lang else "UNKNOWN"
+
+
+def detect_lang_batch(texts):
+    """
+    detect_lang() for a list of texts, using lingua's parallel entry point
+    (detection runs on native threads without holding the GIL).
+
+    Returns one "EN"/.../"UNKNOWN"/"ERROR" code per text, same as calling
+    detect_lang() on each. If the batch call fails (e.g. a non-string
+    item), the batch falls back to detect_lang() per item so only the
+    offending items get "ERROR".
+    """
+    texts = list(texts)
+    try:
+        return [_lang_code(lang) for lang in lang_detector.detect_languages_in_parallel_of(texts)]
+    except:
+        return [detect_lang(t) for t in texts]
+
+
+def iter_detect_lang(texts, batch_size=256, lang_detector="full"):
+    """Yield (text, lang) for an iterable of texts, detecting one batch at a time."""
+    detect = LANG_BATCH_DETECTORS[lang_detector]
+    for batch in iter_batches(texts, batch_size=batch_size):
+        yield from zip(batch, detect(batch))
+
+
+# Cascaded detection: cheap checks first, the full detector above only when
+# the cheap ones are not confident.
+#
+#   1. script    : no letters at all -> "UNKNOWN"; mostly non-Latin letters
+#                  selects the all-language fast detector below instead of
+#                  the Latin candidate set
+#   2. fast      : lingua in low-accuracy mode, restricted to CANDIDATE_LANGUAGES,
+#                  on a bounded sample (the whole text if short, otherwise a
+#                  few windows spread over it)
+#   3. full      : lang_detector (all languages, high accuracy, full text)
+#                  when the top fast confidence is below min_confidence
+
+CANDIDATE_LANGUAGES = [
+    Language.ENGLISH, Language.GERMAN, Language.FRENCH, Language.SPANISH,
+    Language.PORTUGUESE, Language.ITALIAN, Language.DUTCH, Language.POLISH,
+    Language.SWEDISH, Language.DANISH, Language.BOKMAL, Language.FINNISH,
+    Language.CZECH, Language.ROMANIAN, Language.HUNGARIAN, Language.TURKISH,
+    Language.INDONESIAN, Language.VIETNAMESE, Language.LATIN, Language.CATALAN,
+]
+
+LETTER_RE = re.compile(r"[^\W\d_]")
+LATIN_LETTER_RE = re.compile(r"[A-Za-z\u00C0-\u024F]")
+
+_fast_detectors = {}
+
+
+def fast_detector(languages=None):
+    """Low-accuracy lingua detector for a language set (cached per set)."""
+    key = tuple(sorted(languages, key=lambda l: l.name)) if languages else None
+    if key not in _fast_detectors:
+        builder = (LanguageDetectorBuilder.from_languages(*key) if key
+                   else LanguageDetectorBuilder.from_all_languages())
+        _fast_detectors[key] = builder.with_low_accuracy_mode().build()
+    return _fast_detectors[key]
+
+
+def sample_windows(text, max_chars=2000, n_windows=3):
+    """The whole text if short, else n_windows slices of max_chars // n_windows spread evenly."""
+    if len(text) <= max_chars:
+        return text
+    width = max_chars // n_windows
+    step = (len(text) - width) // max(n_windows - 1, 1)
+    return "\n".join(text[i * step:i * step + width] for i in range(n_windows))
+
+
+def detect_lang_cascade_batch(texts, candidates=None, max_chars=2000, n_windows=3,
+                              min_confidence=0.9, min_latin=0.5, return_stages=False):
+    """
+    Cheaper drop-in for detect_lang_batch() with the same return values.
+    Each step runs on the whole batch through lingua's parallel methods.
+    With return_stages=True returns (langs, stages), stage being "script",
+    "fast" or "full" (the step that decided).
+    """
+    texts = list(texts)
+    langs = [None] * len(texts)
+    stages = ["script"] * len(texts)
+
+    # 1. script check, and pick the fast detector per text
+    groups = {True: ([], []), False: ([], [])}      # latin -> (indices, samples)
+    for i, text in enumerate(texts):
+        try:
+            if LETTER_RE.search(text) is None:
+                langs[i] = "UNKNOWN"
+                continue
+            sample = sample_windows(text, max_chars, n_windows)
+            n_letters = len(LETTER_RE.findall(sample))
+            latin = len(LATIN_LETTER_RE.findall(sample)) / max(n_letters, 1) >= min_latin
+            groups[latin][0].append(i)
+            groups[latin][1].append(sample)
+        except:
+            langs[i], stages[i] = "ERROR", "full"
+
+    # 2. low-accuracy detection on the samples
+    escalate = []
+    for latin, (idx, samples) in groups.items():
+        if not idx:
+            continue
+        detector = fast_detector((candidates or CANDIDATE_LANGUAGES) if latin else None)
+        for i, values in zip(idx, detector.compute_language_confidence_values_in_parallel(samples)):
+            if values and values[0].value >= min_confidence:
+                langs[i], stages[i] = _lang_code(values[0].language), "fast"
+            else:
+                escalate.append(i)
+
+    # 3. full detector on the whole text when the fast step was not confident
+    for i, lang in zip(escalate, detect_lang_batch([texts[i] for i in escalate])):
+        langs[i], stages[i] = lang, "full"
+
+    return (langs, stages) if return_stages else langs
+
+
+def detect_lang_cascade(text, return_stage=False, **kwargs):
+    """Single-text detect_lang_cascade_batch() (see there for the steps and options)."""
+    langs, stages = detect_lang_cascade_batch([text], return_stages=True, **kwargs)
+    return (langs[0], stages[0]) if return_stage else langs[0]
+
+
+# detectors selectable by name (e.g. clean_dataset(lang_detector="cascade"))
+LANG_DETECTORS = {"full": detect_lang, "cascade": detect_lang_cascade}
+LANG_BATCH_DETECTORS = {"full": detect_lang_batch, "cascade": detect_lang_cascade_batch}
+
+
+def lang_agreement_report(path, sample_size=5000, save_json_path=None, seed=0, **cascade_kwargs):
+    """
+    Compare detect_lang_cascade_batch() with detect_lang_batch() on a sample of a JSONL
+    file: agreement on the language code and on the EN / not-EN decision
+    used by cleaning, disagreements, which cascade stage decided, and time
+    spent by each detector.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lines = list(f)
+    random.Random(seed).shuffle(lines)
+
+    texts = []
+    for line in lines:
+        if len(texts) >= sample_size:
+            break
+        try:
+            text = json.loads(line).get("text", "")
+        except:
+            continue
+        if isinstance(text, str) and text.strip():
+            texts.append(text)
+
+    t0 = time.perf_counter()
+    ref = [lang for _, lang in iter_detect_lang(texts)]
+    t_ref = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    casc = []
+    for i in range(0, len(texts), 256):
+        langs, stages = detect_lang_cascade_batch(texts[i:i + 256], return_stages=True,
+                                                  **cascade_kwargs)
+        casc.extend(zip(langs, stages))
+    t_casc = time.perf_counter() - t0
+
+    n = max(len(texts), 1)
+    same = sum(r == c for r, (c, _) in zip(ref, casc))
+    same_en = sum((r == "EN") == (c == "EN") for r, (c, _) in zip(ref, casc))
+    disagreements = Counter(f"{r}->{c}" for r, (c, _) in zip(ref, casc) if r != c)
+
+    report = {
+        "docs": len(texts),
+        "agreement": same / n,
+        "en_decision_agreement": same_en / n,
+        "false_en": sum(r != "EN" and c == "EN" for r, (c, _) in zip(ref, casc)),
+        "missed_en": sum(r == "EN" and c != "EN" for r, (c, _) in zip(ref, casc)),
+        "disagreements": dict(disagreements.most_common(20)),
+        "stages": dict(Counter(stage for _, stage in casc)),
+        "seconds_detect_lang": t_ref,
+        "seconds_cascade": t_casc,
+        "speedup": t_ref / t_casc if t_casc else None,
+    }
+
+    if save_json_path:
+        with open(save_json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
 def sample_language_distribution(path, sample_size=5000):
     langs = Counter()
     lines = []
@@ -21,13 +212,8 @@ def sample_language_distribution(path, sample_size=5000):
     with open(path, "r", encoding="utf-8") as f:
         lines = random.sample(list(f), sample_size)
 
-    for line in lines:
-        row = json.loads(line)
-        text = row.get("text", "")
-        if not text.strip():
-            continue
-
-        lang = detect_lang(text)
+    texts = (json.loads(line).get("text", "") for line in lines)
+    for _, lang in iter_detect_lang(t for t in texts if t.strip()):
         langs[lang] += 1
 
     return langs
\ No newline at end of file
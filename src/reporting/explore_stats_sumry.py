@@ -3,10 +3,10 @@ import random
 from collections import Counter
 import os
 import numpy as np
-from src.detectors.html_detect import has_html
-from src.detectors.language_detect import detect_lang
-from src.detectors.code_ASCII_detect import code_fraction
-from src.detectors.code_strong_detect import code_fraction_strong
+from src.detectors.doc_features import DocFeatures, as_features, detect_langs
+from src.cleaning.stages import Pipeline, CLASSIFY_CONFIG
+from src.cleaning.filter_chain import CODE_THRESHOLD, MIN_CHARS
+from src.utils.io_utils import iter_batches
 import matplotlib.pyplot as plt
 
 
@@ -212,45 +212,53 @@ def show_longest_docs(path, n=5):
         print("\n------------------------------------\n")
 
 
-def summarize_dataset(path, sample_size=10000):
+def summarize_dataset(path, sample_size=10000, batch_size=256, cache=None):
     summary = Counter()
 
     with open(path, "r", encoding="utf-8") as f:
         lines = random.sample(list(f), sample_size)
 
-    for line in lines:
-        try:
-            row = json.loads(line)
-        except:
-            summary["MALFORMED"] += 1
-            continue
-
-        text = row.get("text", "")
-        if not text.strip():
-            summary["EMPTY"] += 1
-            continue
-
-        # Language detection
-        lang = detect_lang(text)
-        if lang != "EN":
-            summary["NON_ENGLISH"] += 1
-
-        # HTML detection
-        if has_html(text):
-            summary["HTML"] += 1
-
-        # Code-heavy detection
-        if code_fraction(text) > 0.40:
-            summary["CODE_HEAVY"] += 1
-
-        # Good English
-        if (
-            lang == "EN"
-            and not has_html(text)
-            and code_fraction(text) <= 0.40
-            and len(text) >= 200
-        ):
-            summary["GOOD_ENGLISH"] += 1
+    # languages are detected per batch with detect_langs()
+    for batch in iter_batches(lines, batch_size=batch_size):
+        docs = []       # (skip_category, DocFeatures)
+        for line in batch:
+            try:
+                row = json.loads(line)
+            except:
+                docs.append(("MALFORMED", None))
+                continue
+            text = row.get("text", "")
+            docs.append(("EMPTY", None) if not text.strip() else (None, DocFeatures(text, cache)))
+
+        to_detect = [doc for skip, doc in docs if skip is None]
+        langs = iter(detect_langs(to_detect) if to_detect else [])
+
+        for skip, doc in docs:
+            if skip is not None:
+                summary[skip] += 1
+                continue
+
+            # Language detection
+            lang = next(langs)
+            if lang != "EN":
+                summary["NON_ENGLISH"] += 1
+
+            # HTML detection
+            if doc.has_html:
+                summary["HTML"] += 1
+
+            # Code-heavy detection
+            if doc.code_fraction > 0.40:
+                summary["CODE_HEAVY"] += 1
+
+            # Good English
+            if (
+                lang == "EN"
+                and not doc.has_html
+                and doc.code_fraction <= 0.40
+                and doc.length >= 200
+            ):
+                summary["GOOD_ENGLISH"] += 1
 
     # convert to percentages
     summary_pct = {k: (v / sample_size) * 100 for k, v in summary.items()}
@@ -259,52 +267,74 @@ def summarize_dataset(path, sample_size=10000):
 
 
 
-def classify_doc(text):
-    """Return a single category for each document."""
-    
-    # HTML has highest priority
-    if has_html(text):
-        return "HTML"
-    
-    # Code-heavy comes next
-    #code_fraction_strong or code_fraction
-    if code_fraction_strong(text) > 0.40:
-        return "CODE_HEAVY"
-    
-    # OTHER Languages
-    lang = detect_lang(text)
-    if lang != "EN":
-        return "NON_ENGLISH_LANG"
-    
-    # Good English (no HTML, no code, significant length for training, EN) 
-    if len(text) >= 200:
-        return "GOOD_ENGLISH"
-    
-    # 5 — fallback
-    return "SHORT_ENGLISH"
-
-def summarize_dataset_exclusive(path, sample_size=10000):
+# exclusive categories: stages of CLASSIFY_CONFIG in their configured order,
+# the first rejecting filter names the category, GOOD_ENGLISH if none does
+CLASSIFIER = Pipeline(CLASSIFY_CONFIG, reorder=False)
+
+
+def classify_doc(doc, cache=None):
+    """Return a single category for each document (text or DocFeatures)."""
+    return classify_docs([doc], cache)[0]
+
+
+def classify_docs(docs, cache=None):
+    """classify_doc() for a list of texts or DocFeatures, detecting languages in one batch."""
+    docs = [as_features(d, cache) for d in docs]
+    _, statuses = CLASSIFIER.run(docs)
+    return ["GOOD_ENGLISH" if status == "KEPT" else status for status in statuses]
+
+
+def summarize_dataset_exclusive(path, sample_size=10000, batch_size=256, cache=None):
     summary = Counter()
 
     with open(path, "r", encoding="utf-8") as f:
         lines = random.sample(list(f), sample_size)
 
-    for line in lines:
-        try:
-            row = json.loads(line)
-        except:
-            summary["MALFORMED"] += 1
-            continue
+    for batch in iter_batches(lines, batch_size=batch_size):
+        docs = []       # (skip_category, text)
+        for line in batch:
+            try:
+                row = json.loads(line)
+            except:
+                docs.append(("MALFORMED", None))
+                continue
+            text = row.get("text", "").strip()
+            docs.append(("EMPTY", None) if not text else (None, text))
 
-        text = row.get("text", "").strip()
-        if not text:
-            summary["EMPTY"] += 1
-            continue
+        categories = iter(classify_docs([text for skip, text in docs if skip is None], cache))
 
-        category = classify_doc(text)
-        summary[category] += 1
+        for skip, text in docs:
+            summary[skip if skip is not None else next(categories)] += 1
 
     # Convert to percentages
     summary_pct = {k: v / sample_size * 100 for k, v in summary.items()}
 
     return summary, summary_pct
+
+
+def summarize_features(features, mask=None):
+    """
+    summarize_dataset_exclusive() categories computed from a feature
+    sidecar (src/cleaning/feature_store.py) instead of running the
+    detectors: all documents of the cleaned input, or those selected by
+    the boolean `mask`.
+    """
+    status = features["status"]
+    categories = np.select(
+        [status == "MALFORMED",
+         status == "EMPTY",
+         features["html"],
+         features["code_fraction"] > CODE_THRESHOLD,
+         features["lang"] != "EN",
+         features["length"] >= MIN_CHARS],
+        ["MALFORMED", "EMPTY", "HTML", "CODE_HEAVY", "NON_ENGLISH_LANG", "GOOD_ENGLISH"],
+        default="SHORT_ENGLISH")
+    if mask is not None:
+        categories = categories[mask]
+
+    names, counts = np.unique(categories, return_counts=True)
+    summary = Counter({str(k): int(v) for k, v in zip(names, counts)})
+    total = len(categories)
+    summary_pct = {k: v / total * 100 for k, v in summary.items()}
+
+    return summary, summary_pct
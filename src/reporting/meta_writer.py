@@ -11,6 +11,10 @@ def write_meta(
     block_size,
     total_blocks,
     cleaning_summary,
+    cleaning_filters=None,
+    length_buckets=None,
+    dedup_summary=None,
+    boilerplate=None,
     shard_info=None,
     cli_args=None, 
     pipeline_version="1.0"
@@ -26,6 +30,10 @@ def write_meta(
         block_size        : fixed packed length (e.g. 2048)
         total_blocks      : number of packed blocks
         cleaning_summary  : dict returned by clean_dataset()
+        cleaning_filters  : dict, optional (evaluated/rejected/seconds per filter, filter_summary())
+        length_buckets    : dict, optional ({block_size: blocks, docs, tokens, packed/shard paths})
+        dedup_summary     : dict, optional (kept/dropped per dedup stage)
+        boilerplate       : dict, optional (boilerplate_dataset() counters)
         shard_info        : dict, optional (num_shards, shard_size, split ratios)
         pipeline_version  : version tag for your pipeline
     """
@@ -42,7 +50,11 @@ def write_meta(
         "data": {
             "total_blocks": total_blocks,
             "block_size": block_size,
-            "cleaning_summary": cleaning_summary
+            "cleaning_summary": cleaning_summary,
+            "cleaning_filters": cleaning_filters or {},
+            "length_buckets": {str(k): v for k, v in (length_buckets or {}).items()},
+            "dedup_summary": dedup_summary or {},
+            "boilerplate": boilerplate or {}
         },
         "shards": shard_info or {}
     }
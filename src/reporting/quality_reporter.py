@@ -4,7 +4,7 @@ import time
 from collections import Counter
 from detoxify import Detoxify
 #from langdetect import detect
-from src.detectors.language_detect import detect_lang
+from src.detectors.doc_features import DocFeatures, detect_langs
 from src.utils.io_utils import sample_docs
 import torch
 from transformers import GPT2LMHeadModel, GPT2TokenizerFast
@@ -71,9 +71,10 @@ def to_python(obj):
 
 
 #  MAIN QUALITY REPORT 
-def quality_report(path, sample_size=2000, save_path="reports/quality_report.json"):
+def quality_report(path, sample_size=2000, save_path="reports/quality_report.json", cache=None):
     """
     Evaluate PII, toxicity, perplexity, and language distribution on CLEANED data.
+    Languages already detected in this run (FeatureCache `cache`) are reused.
     """
 
     docs = sample_docs(path, n=sample_size)
@@ -85,7 +86,10 @@ def quality_report(path, sample_size=2000, save_path="reports/quality_report.jso
 
     t0 = time.time()
 
-    for text in docs:
+    # languages for the whole sample in one batch (native threads)
+    langs = detect_langs([DocFeatures(text, cache) for text in docs])
+
+    for text, lang in zip(docs, langs):
         # PII
         pii = detect_pii(text)
         for p in pii:
@@ -102,7 +106,6 @@ def quality_report(path, sample_size=2000, save_path="reports/quality_report.jso
             ppl_scores.append(ppl)
 
         # Language
-        lang = detect_lang(text)
         lang_counter[lang] += 1
 
     elapsed = time.time() - t0
@@ -0,0 +1,66 @@
+from collections import Counter
+import numpy as np
+
+
+class TokenLengthStats:
+    """
+    Token-length statistics collected while tokenizing, without keeping
+    the lengths: a histogram {length: count} plus exact sum and max.
+
+    Token lengths are integers bounded by the longest cleaned document
+    (MAX_CHARS characters), so the histogram stays small whatever the
+    number of documents, and quantiles are exact
+    (same values as np.percentile on the full list of lengths). Histograms
+    of different workers are merged by adding counts.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.n = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, length):
+        self.counts[length] += 1
+        self.n += 1
+        self.total += length
+        if length > self.max:
+            self.max = length
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.n += other.n
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantiles(self, qs):
+        """np.percentile(lengths, q * 100) (linear interpolation) for each q."""
+        values = np.array(sorted(self.counts), dtype=np.int64)
+        cum = np.cumsum([self.counts[v] for v in values])
+
+        def value_at(rank):     # rank-th smallest length, 0-based
+            return values[np.searchsorted(cum, rank, side="right")]
+
+        result = []
+        for q in qs:
+            pos = (self.n - 1) * q
+            lo, hi = int(np.floor(pos)), int(np.ceil(pos))
+            a, b = value_at(lo), value_at(hi)
+            result.append(float(a + (b - a) * (pos - lo)))
+        return result
+
+    def summary(self):
+        """The dict of reports/token_length_stats.json (None values if there are no documents)."""
+        if not self.n:
+            return {"docs_counted": 0, "avg_tokens": None, "median_tokens": None,
+                    "p95_tokens": None, "p99_tokens": None, "max_tokens": None}
+        median, p95, p99 = self.quantiles([0.5, 0.95, 0.99])
+        return {
+            "docs_counted": self.n,
+            "avg_tokens": self.total / self.n,
+            "median_tokens": median,
+            "p95_tokens": p95,
+            "p99_tokens": p99,
+            "max_tokens": self.max,
+        }
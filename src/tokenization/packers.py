@@ -1,4 +1,14 @@
+import os
 import json 
+import shutil
+import tempfile
+from bisect import bisect_left, insort
+from contextlib import ExitStack
+import numpy as np
+from src.tokenization.token_bin import TokenBinReader, TokenBinWriter, is_token_bin
+from src.tokenization.token_bin import jsonl_to_token_bin
+from src.tokenization.packing_stats import packing_stats, doc_starts_prefix
+from src.utils.io_utils import iter_batches
 
 def pack_to_variable_blocks(
     tokenized_path,
@@ -17,10 +27,10 @@ def pack_to_variable_blocks(
     block_len = 0
     total_blocks = 0
 
-    with open(tokenized_path, "r") as fin, open(output_path, "w") as fout:
-        for line in fin:
-            row = json.loads(line)
-            ids = row["input_ids"]
+    with open(output_path, "w") as fout:
+        for ids in iter_token_docs(tokenized_path):
+            if isinstance(ids, np.ndarray):
+                ids = ids.tolist()
 
             # If adding this sample overflows: flush current block
             if block_len + len(ids) > block_size:
@@ -57,50 +67,197 @@ def pack_to_variable_blocks(
 
 
 
-def pack_to_fixed_blocks(
-    tokenized_path,
-    output_path,
-    encoder,
-    block_size=2048,
-    pad_token="<|pad|>"
-):
+def iter_fixed_blocks(docs, pad_id, block_size=2048):
     """
-    Pack data so that *every* output block is exactly block_size tokens.
+    Greedily pack token lists into blocks of exactly block_size tokens.
+    A block is padded with pad_id and flushed when the next doc does not fit.
     """
-
-    PAD = encoder.encode(pad_token, allowed_special="all")[0]
     block = []
     block_len = 0
-    total_blocks = 0
 
-    with open(tokenized_path, "r") as fin, open(output_path, "w") as fout:
+    for ids in docs:
+        # If full, flush block
+        if block_len + len(ids) > block_size:
+            pad_len = block_size - block_len
+            block.extend([pad_id] * pad_len)
+            yield block
+
+            block = []
+            block_len = 0
+
+        # Add current document tokens
+        block.extend(ids)
+        block_len += len(ids)
+
+    # Final block (pad it)
+    if block:
+        pad_len = block_size - block_len
+        block.extend([pad_id] * pad_len)
+        yield block
+
+
+def iter_best_fit_blocks(docs, pad_id, block_size=2048, window=10000, stats=None):
+    """
+    Pack token lists into blocks of exactly block_size tokens with
+    best-fit decreasing over windows of `window` documents: the documents
+    of a window are placed longest first, each into the open block with
+    the least free space that still fits it (a new block if none does).
+    The blocks of a window are padded with pad_id and yielded in the order
+    they were opened. Documents longer than block_size are split into
+    full blocks plus a remainder that is packed like any other document.
+
+    `stats` (a Counter) gets the packing_summary() counts, including the
+    number of blocks the greedy packer would have used on the same input.
+    """
+    greedy_len = 0
+
+    for batch in iter_batches(docs, batch_size=window):
+        pieces = []
+        for ids in batch:
+            n = len(ids)
+            if stats is not None:
+                stats["docs"] += 1
+                stats["tokens"] += n
+                # same flush rule as iter_fixed_blocks()
+                if greedy_len + n > block_size:
+                    stats["greedy_blocks"] += 1
+                    greedy_len = 0
+                greedy_len += n
+
+            while len(ids) > block_size:
+                if stats is not None:
+                    stats["blocks"] += 1
+                    stats["split_blocks"] += 1
+                yield ids[:block_size]
+                ids = ids[block_size:]
+            if len(ids):
+                pieces.append(ids)
+
+        # free space of the open blocks as sorted (free, block index) pairs
+        free = []
+        blocks = []
+        for ids in sorted(pieces, key=len, reverse=True):
+            n = len(ids)
+            i = bisect_left(free, (n, -1))
+            if i < len(free):
+                space, b = free.pop(i)
+                blocks[b].append(ids)
+            else:
+                space, b = block_size, len(blocks)
+                blocks.append([ids])
+            insort(free, (space - n, b))
+
+        for block in blocks:
+            if stats is not None:
+                stats["blocks"] += 1
+            if isinstance(block[0], np.ndarray):
+                yield _pad_block(np.concatenate(block), pad_id, block_size)
+            else:
+                ids = [t for piece in block for t in piece]
+                yield ids + [pad_id] * (block_size - len(ids))
+
+    if stats is not None and greedy_len > 0:
+        stats["greedy_blocks"] += 1
+
+
+def packing_summary(stats, block_size=2048):
+    """Blocks, padding ratio and real tokens per block, greedy vs best-fit."""
+    def summary(blocks):
+        capacity = blocks * block_size
+        return {"blocks": blocks,
+                "padding_ratio": round(1 - stats["tokens"] / capacity, 4) if capacity else 0.0,
+                "tokens_per_block": round(stats["tokens"] / blocks, 1) if blocks else 0.0}
+
+    return {"docs": stats["docs"],
+            "tokens": stats["tokens"],
+            "split_blocks": stats["split_blocks"],
+            "greedy": summary(stats["greedy_blocks"]),
+            "best_fit": summary(stats["blocks"])}
+
+
+def print_packing_summary(stats, block_size=2048):
+    s = packing_summary(stats, block_size)
+    print("\n========== PACKING (best-fit) ==========")
+    print(f"docs: {s['docs']:,}  tokens: {s['tokens']:,}  split into full blocks: {s['split_blocks']:,}")
+    for name in ("greedy", "best_fit"):
+        b = s[name]
+        print(f"{name:9}: {b['blocks']:8,} blocks  padding {b['padding_ratio'] * 100:5.1f}%  "
+              f"{b['tokens_per_block']:7.1f} tokens/block")
+    if s["greedy"]["blocks"]:
+        saved = 1 - s["best_fit"]["blocks"] / s["greedy"]["blocks"]
+        print(f"blocks saved: {saved * 100:.1f}%")
+    print("========================================\n")
+
+
+def iter_fixed_blocks_bin(reader, pad_id, block_size=2048):
+    """
+    Same greedy packing as iter_fixed_blocks(), on a TokenBinReader.
+    Documents of a block are contiguous in the .bin file, so each block is
+    one slice of the memory-mapped token array plus padding.
+    """
+    tokens, offsets = reader.tokens, reader.offsets
+    start = 0
+    block_len = 0
+
+    for i, n in enumerate(reader.lengths.tolist()):
+        # If full, flush block
+        if block_len + n > block_size:
+            yield _pad_block(tokens[offsets[start]:offsets[i]], pad_id, block_size)
+            start = i
+            block_len = 0
+
+        block_len += n
+
+    # Final block (pad it)
+    if block_len > 0:
+        yield _pad_block(tokens[offsets[start]:offsets[len(reader)]], pad_id, block_size)
+
+
+def _pad_block(block, pad_id, block_size):
+    pad_len = max(block_size - len(block), 0)
+    return np.concatenate([block, np.full(pad_len, pad_id, dtype=block.dtype)])
+
+
+def iter_token_docs(tokenized_path):
+    """
+    Yield input_ids from a tokenized JSONL file, or numpy views from a
+    .bin/.idx pair (see token_bin.py).
+    """
+    if is_token_bin(tokenized_path):
+        yield from TokenBinReader(tokenized_path)
+        return
+
+    with open(tokenized_path, "r") as fin:
         for line in fin:
-            row = json.loads(line)
-            ids = row["input_ids"]
+            yield json.loads(line)["input_ids"]
 
-            # If full, flush block
-            if block_len + len(ids) > block_size:
-                pad_len = block_size - block_len
-                block.extend([PAD] * pad_len)
 
-                fout.write(json.dumps({
-                    "input_ids": block,
-                    "length": block_size
-                }) + "\n")
+def iter_doc_lengths(tokenized_path):
+    """Yield the token length of every document / block in a tokenized file."""
+    if is_token_bin(tokenized_path):
+        yield from TokenBinReader(tokenized_path).lengths.tolist()
+        return
 
-                total_blocks += 1
-                block = []
-                block_len = 0
+    with open(tokenized_path, "r") as fin:
+        for line in fin:
+            yield len(json.loads(line)["input_ids"])
 
-            # Add current document tokens
-            block.extend(ids)
-            block_len += len(ids)
 
-        # Final block (pad it)
-        if block:
-            pad_len = block_size - block_len
-            block.extend([PAD] * pad_len)
+def write_blocks(blocks, output_path, block_size, output_format="jsonl", vocab_size=None):
+    """Write packed blocks as JSONL or as a .bin/.idx pair. Returns the block count."""
+    total_blocks = 0
 
+    if output_format == "bin":
+        with TokenBinWriter(output_path, vocab_size) as writer:
+            for block in blocks:
+                writer.add(block)
+                total_blocks += 1
+        return total_blocks
+
+    with open(output_path, "w") as fout:
+        for block in blocks:
+            if isinstance(block, np.ndarray):
+                block = block.tolist()
             fout.write(json.dumps({
                 "input_ids": block,
                 "length": block_size
@@ -108,43 +265,303 @@ def pack_to_fixed_blocks(
 
             total_blocks += 1
 
+    return total_blocks
+
+
+def pack_to_fixed_blocks(
+    tokenized_path,
+    output_path,
+    encoder,
+    block_size=2048,
+    pad_token="<|pad|>",
+    output_format="jsonl",
+    strategy="greedy",
+    window=10000,
+    stats=None
+):
+    """
+    Pack data so that *every* output block is exactly block_size tokens.
+
+    tokenized_path may be a JSONL file or a .bin/.idx prefix; output_format
+    selects "jsonl" or "bin" output (output_path is then used as prefix).
+    strategy="best_fit" packs windows of `window` documents with
+    iter_best_fit_blocks() (fewer, fuller blocks; `stats` gets its counts).
+    """
+
+    PAD = encoder.encode(pad_token, allowed_special="all")[0]
+
+    if strategy == "best_fit":
+        blocks = iter_best_fit_blocks(iter_token_docs(tokenized_path), PAD, block_size,
+                                      window=window, stats=stats)
+    elif strategy != "greedy":
+        raise ValueError(f"Unknown packing strategy {strategy!r} (greedy or best_fit)")
+    elif is_token_bin(tokenized_path):
+        blocks = iter_fixed_blocks_bin(TokenBinReader(tokenized_path), PAD, block_size)
+    else:
+        blocks = iter_fixed_blocks(iter_token_docs(tokenized_path), PAD, block_size)
+
+    total_blocks = write_blocks(blocks, output_path, block_size,
+                                output_format=output_format, vocab_size=encoder.n_vocab)
+
     print(f"Total fixed-length blocks written: {total_blocks}")
     return total_blocks
 
 
+class JsonlBlockWriter:
+    """Append packed blocks to a JSONL file, same lines as write_blocks()."""
+
+    def __init__(self, path, block_size):
+        self.block_size = block_size
+        self._f = open(path, "w")
+
+    def add(self, block):
+        self._f.write(json.dumps({
+            "input_ids": np.asarray(block).tolist(),
+            "length": self.block_size
+        }) + "\n")
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def split_docs(docs, block_size):
+    """Yield documents, cut into pieces of at most block_size tokens."""
+    for ids in docs:
+        for i in range(0, max(len(ids), 1), block_size):
+            yield ids[i:i + block_size]
+
+
+# pack_length_buckets() policies: (document length, sorted block sizes) -> block sizes
+BUCKET_POLICIES = {
+    # the smallest block that holds the whole document (the largest if none does)
+    "fit": lambda n, sizes: [next((s for s in sizes if n <= s), sizes[-1])],
+    # every document in every length (cut where it is longer than the block)
+    "all": lambda n, sizes: list(sizes),
+}
+
+
+def pack_length_buckets(
+    tokenized_path,
+    output_paths,
+    encoder,
+    pad_token="<|pad|>",
+    output_format="jsonl",
+    policy="fit",
+    strategy="best_fit",
+    window=10000,
+    stats=None
+):
+    """
+    Pack one read of the tokenized file into blocks of several lengths.
+
+    Args:
+        output_paths  : {block_size: output path (prefix for "bin")}
+        policy        : name in BUCKET_POLICIES or a function
+                        (doc length, sorted block sizes) -> block sizes
+        strategy      : "best_fit" or "greedy", applied per bucket to each
+                        window of `window` documents (documents longer than
+                        a block are cut into several)
+        stats         : optional {block_size: PackingStats}, counting the
+                        documents routed to each bucket and its blocks
+
+    Returns {block_size: number of blocks written}.
+    """
+
+    if strategy not in ("best_fit", "greedy"):
+        raise ValueError(f"Unknown packing strategy {strategy!r} (greedy or best_fit)")
+
+    PAD = encoder.encode(pad_token, allowed_special="all")[0]
+    sizes = sorted(output_paths)
+    route = BUCKET_POLICIES[policy] if isinstance(policy, str) else policy
+    totals = {size: 0 for size in sizes}
+
+    with ExitStack() as stack:
+        writers = {}
+        for size in sizes:
+            if output_format == "bin":
+                writer = TokenBinWriter(output_paths[size], encoder.n_vocab)
+            else:
+                writer = JsonlBlockWriter(output_paths[size], size)
+            writers[size] = stack.enter_context(writer)
+
+        for batch in iter_batches(iter_token_docs(tokenized_path), batch_size=window):
+            routed = {size: [] for size in sizes}
+            for ids in batch:
+                for size in route(len(ids), sizes):
+                    routed[size].append(ids)
+
+            for size, docs in routed.items():
+                if not docs:
+                    continue
+                if strategy == "best_fit":
+                    blocks = iter_best_fit_blocks(docs, PAD, size, window=len(docs))
+                else:
+                    blocks = iter_fixed_blocks(split_docs(docs, size), PAD, size)
+                if stats is not None:
+                    stats[size].add_docs([len(ids) for ids in docs])
+                    blocks = stats[size].iter_blocks(blocks)
+                for block in blocks:
+                    writers[size].add(block)
+                    totals[size] += 1
+
+    for size in sizes:
+        print(f"{size:5}-token blocks written: {totals[size]:,} -> {output_paths[size]}")
+    return totals
+
+
+def iter_concat_chunks(reader, block_size=2048, chunk_blocks=4096, pad_id=0):
+    """
+    Yield (blocks, starts, counts) for runs of `chunk_blocks` consecutive
+    blocks of the token stream of a TokenBinReader:
+
+        blocks : (n, block_size) array, a slice of the memory-mapped tokens
+                 (only the last block of the stream is padded with pad_id)
+        starts : positions in its block where a document starts, block by
+                 block; every block starts with 0 (a document start or the
+                 continuation of the previous block's last document)
+        counts : number of starts of each block
+    """
+    tokens = reader.tokens
+    doc_starts = reader.offsets[:-1]
+    n_tokens = reader.n_tokens
+    n_blocks = -(-n_tokens // block_size)
+
+    for c0 in range(0, n_blocks, chunk_blocks):
+        c1 = min(c0 + chunk_blocks, n_blocks)
+        t0, t1 = c0 * block_size, min(c1 * block_size, n_tokens)
+
+        chunk = np.asarray(tokens[t0:t1])
+        pad_len = (c1 - c0) * block_size - len(chunk)
+        if pad_len:
+            chunk = np.concatenate([chunk, np.full(pad_len, pad_id, dtype=chunk.dtype)])
+
+        i0, i1 = np.searchsorted(doc_starts, [t0, t1])
+        starts = np.union1d(doc_starts[i0:i1], np.arange(c0, c1, dtype=np.int64) * block_size)
+        counts = np.bincount(starts // block_size - c0, minlength=c1 - c0)
+
+        yield chunk.reshape(-1, block_size), starts % block_size, counts
+
+
+def pack_concat(
+    tokenized_path,
+    output_path,
+    encoder,
+    block_size=2048,
+    pad_token="<|pad|>",
+    output_format="jsonl",
+    chunk_blocks=4096
+):
+    """
+    Concatenate the EOS-delimited documents into one token stream and cut it
+    into blocks of exactly block_size tokens, without padding (except the
+    last block). Documents may cross block boundaries.
+
+    The positions where documents start in each block (for position-id
+    resets or block-diagonal attention masks) are written as "doc_starts"
+    in each JSONL line, or for output_format="bin" as a second .bin/.idx
+    pair at doc_starts_prefix(output_path).
+
+    Works on chunks of `chunk_blocks` blocks of the memory-mapped token
+    file; a JSONL tokenized file is first converted to a temporary .bin.
+    """
+
+    PAD = encoder.encode(pad_token, allowed_special="all")[0]
+
+    tmp_dir = None
+    if not is_token_bin(tokenized_path):
+        tmp_dir = tempfile.mkdtemp(prefix="pack_concat_",
+                                   dir=os.path.dirname(os.path.abspath(output_path)))
+        tmp_prefix = os.path.join(tmp_dir, "tokenized")
+        jsonl_to_token_bin(tokenized_path, tmp_prefix, encoder.n_vocab)
+        tokenized_path = tmp_prefix
+
+    try:
+        chunks = iter_concat_chunks(TokenBinReader(tokenized_path), block_size, chunk_blocks, PAD)
+        total_blocks = 0
+
+        if output_format == "bin":
+            with TokenBinWriter(output_path, encoder.n_vocab) as writer, \
+                 TokenBinWriter(doc_starts_prefix(output_path), vocab_size=block_size) as starts_writer:
+                for blocks, starts, counts in chunks:
+                    writer.add_many(blocks.ravel(), np.full(len(blocks), block_size))
+                    starts_writer.add_many(starts, counts)
+                    total_blocks += len(blocks)
+        else:
+            with open(output_path, "w") as fout:
+                for blocks, starts, counts in chunks:
+                    ends = np.cumsum(counts)
+                    for block, s0, s1 in zip(blocks.tolist(), ends - counts, ends):
+                        fout.write(json.dumps({
+                            "input_ids": block,
+                            "length": block_size,
+                            "doc_starts": starts[s0:s1].tolist()
+                        }) + "\n")
+                    total_blocks += len(blocks)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"Total concatenated blocks written: {total_blocks}")
+    return total_blocks
+
 
 def diagnose_packed_lengths(
     tokenized_path,
     packed_path,
-    block_size=2048
+    block_size=2048,
+    pad_id=None,
+    save_path=None
 ):
-    print("\n=== Checking ORIGINAL token lengths (FULL) ===")
-    orig_lengths = []
-
-    with open(tokenized_path, "r") as f:
-        for line in f:
-            row = json.loads(line)
-            orig_lengths.append(len(row["input_ids"]))
+    """
+    Check packed blocks against the tokenized documents in one streaming
+    pass over each file (see packing_stats.py): block lengths, padding and
+    token conservation (document tokens == non-pad block tokens, needs
+    pad_id), plus document starts for concat packing. The statistics are
+    written to `save_path` (e.g. reports/packing_stats.json) and returned.
+    """
+    summary = packing_stats(tokenized_path, packed_path, pad_id, block_size).summary()
+    docs, blocks = summary["docs"], summary["blocks"]
 
-    print(f"Total original docs: {len(orig_lengths)}")
-    print(f"Min original length: {min(orig_lengths)}")
-    print(f"Max original length: {max(orig_lengths)}")
-    print(f"Avg original length: {sum(orig_lengths)/len(orig_lengths):.2f}")
+    print("\n=== Checking ORIGINAL token lengths (FULL) ===")
+    print(f"Total original docs: {docs['count']}")
+    if docs["count"]:
+        print(f"Min original length: {docs['min_length']}")
+        print(f"Max original length: {docs['max_length']}")
+        print(f"Avg original length: {docs['avg_length']:.2f}")
 
     print("\n=== Checking PACKED blocks (FULL) ===")
-    packed_lengths = []
-    with open(packed_path, "r") as f:
-        for line in f:
-            row = json.loads(line)
-            packed_lengths.append(len(row["input_ids"]))
-
-    print(f"Total packed blocks: {len(packed_lengths)}")
-    unique_lengths = set(packed_lengths)
-    print(f"Unique packed block lengths: {unique_lengths}")
+    print(f"Total packed blocks: {blocks['count']}")
 
-    if unique_lengths == {block_size}:
+    if blocks["wrong_length"] == 0:
         print(f"All packed blocks are EXACTLY {block_size} tokens.")
     else:
-        print("ERROR: Some blocks do NOT match the required length.")
-        bad = [x for x in packed_lengths if x != block_size]
-        print(f"Examples of incorrect lengths (first 10): {bad[:10]}")
+        print(f"ERROR: {blocks['wrong_length']} blocks do NOT match the required length.")
+
+    if pad_id is not None:
+        if blocks["pad_fraction"] is not None:
+            print(f"Padding: {blocks['pad_tokens']:,} tokens ({blocks['pad_fraction'] * 100:.1f}% of all block tokens)")
+        if summary["tokens_conserved"]:
+            print(f"Token conservation OK: {docs['tokens']:,} document tokens == non-pad block tokens")
+        else:
+            print(f"ERROR: {docs['tokens']:,} document tokens != {blocks['real_tokens']:,} non-pad block tokens")
+
+    ok = summary["doc_starts_ok"]
+    if ok is not None:
+        print("\n=== Checking DOCUMENT STARTS (concat packing) ===")
+        if ok:
+            print("Document starts match the tokenized documents in every block.")
+        else:
+            print("ERROR: Document starts do NOT match the tokenized documents.")
+
+    if save_path is not None:
+        with open(save_path, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"[INFO] Saved packing stats to {save_path}")
+
+    return summary
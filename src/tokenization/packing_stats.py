@@ -0,0 +1,285 @@
+import json
+import numpy as np
+from src.tokenization.token_bin import TokenBinReader, is_token_bin, bin_prefix
+
+# Single-pass packing statistics with memory independent of the data size:
+# fixed-bin histograms and running totals, fed with arrays of document
+# lengths and of (block length, real tokens) per block. For concat packing
+# the document starts of each block are checked in the same pass.
+#
+#   stats = packing_stats("data/final/tokenized", "data/final/packed_blocks", pad_id=PAD_ID)
+#   stats.summary()     # -> reports/packing_stats.json
+
+# tokens of a binary packed file read per chunk (bounds the temporary arrays)
+TOKENS_PER_CHUNK = 1 << 22
+
+
+def doc_starts_prefix(packed_path):
+    """Prefix of the .bin/.idx pair with the document starts of pack_concat() blocks."""
+    return bin_prefix(packed_path) + "_doc_starts"
+
+
+def count_real(block, pad_id=None):
+    """Number of non-pad tokens in one block (list or array)."""
+    if pad_id is None:
+        return len(block)
+    if isinstance(block, np.ndarray):
+        return len(block) - int(np.count_nonzero(block == pad_id))
+    return len(block) - block.count(pad_id)
+
+
+class Histogram:
+    """Counts over bins [edges[i], edges[i+1]); the last bin is open-ended."""
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges)
+        self.counts = np.zeros(len(self.edges), dtype=np.int64)
+
+    def add(self, values):
+        bins = np.searchsorted(self.edges, values, side="right") - 1
+        self.counts += np.bincount(np.clip(bins, 0, len(self.edges) - 1),
+                                   minlength=len(self.edges))
+
+    def to_dict(self):
+        return {"edges": self.edges.tolist(), "counts": self.counts.tolist()}
+
+
+class PackingStats:
+    """
+    Document-length histogram, real (non-pad) tokens per block, pad
+    fraction distribution and token conservation of a packing run.
+    """
+
+    def __init__(self, block_size=2048, pad_id=None, bins=16):
+        self.block_size = block_size
+        self.pad_id = pad_id
+        step = max(block_size // bins, 1)
+        self.doc_hist = Histogram(np.arange(0, block_size + 1, step))
+        self.real_hist = Histogram(np.arange(0, block_size + 1, step))
+        self.pad_hist = Histogram(np.linspace(0, 1, 21)[:-1])
+
+        self.n_docs = 0
+        self.doc_tokens = 0
+        self.min_doc = None
+        self.max_doc = 0
+        self.n_blocks = 0
+        self.wrong_length = 0
+        self.block_tokens = 0
+        self.real_tokens = 0
+        self.doc_starts_ok = None     # set by packing_stats() for concat packing
+
+    def add_docs(self, lengths):
+        lengths = np.asarray(lengths, dtype=np.int64)
+        if not len(lengths):
+            return
+        self.n_docs += len(lengths)
+        self.doc_tokens += int(lengths.sum())
+        low = int(lengths.min())
+        self.min_doc = low if self.min_doc is None else min(self.min_doc, low)
+        self.max_doc = max(self.max_doc, int(lengths.max()))
+        self.doc_hist.add(lengths)
+
+    def add_blocks(self, lengths, real):
+        lengths = np.asarray(lengths, dtype=np.int64)
+        real = np.asarray(real, dtype=np.int64)
+        if not len(lengths):
+            return
+        self.n_blocks += len(lengths)
+        self.wrong_length += int((lengths != self.block_size).sum())
+        self.block_tokens += int(lengths.sum())
+        self.real_tokens += int(real.sum())
+        self.real_hist.add(real)
+        self.pad_hist.add(1 - real / np.maximum(lengths, 1))
+
+    def iter_docs(self, docs, chunk_size=65536):
+        """Pass token sequences through, counting their lengths."""
+        lengths = []
+        for ids in docs:
+            lengths.append(len(ids))
+            if len(lengths) >= chunk_size:
+                self.add_docs(lengths)
+                lengths = []
+            yield ids
+        self.add_docs(lengths)
+
+    def iter_blocks(self, blocks, chunk_size=65536):
+        """Pass packed blocks through, counting their real tokens."""
+        lengths, real = [], []
+        for block in blocks:
+            lengths.append(len(block))
+            real.append(count_real(block, self.pad_id))
+            if len(lengths) >= chunk_size:
+                self.add_blocks(lengths, real)
+                lengths, real = [], []
+            yield block
+        self.add_blocks(lengths, real)
+
+    def summary(self):
+        pad_tokens = self.block_tokens - self.real_tokens
+        return {
+            "block_size": self.block_size,
+            "docs": {
+                "count": self.n_docs,
+                "tokens": self.doc_tokens,
+                "min_length": self.min_doc,
+                "max_length": self.max_doc,
+                "avg_length": self.doc_tokens / self.n_docs if self.n_docs else None,
+                "length_histogram": self.doc_hist.to_dict(),
+            },
+            "blocks": {
+                "count": self.n_blocks,
+                "wrong_length": self.wrong_length,
+                "real_tokens": self.real_tokens,
+                "pad_tokens": pad_tokens,
+                "pad_fraction": pad_tokens / self.block_tokens if self.block_tokens else None,
+                "real_tokens_histogram": self.real_hist.to_dict(),
+                "pad_fraction_histogram": self.pad_hist.to_dict(),
+            },
+            "tokens_conserved": self.doc_tokens == self.real_tokens,
+            "doc_starts_ok": self.doc_starts_ok,
+        }
+
+
+class DocStartsCheck:
+    """
+    Streaming check of pack_concat() document starts: block b must list 0
+    plus every document start in [b * block_size, (b + 1) * block_size),
+    relative to the block. Document lengths are pulled from
+    `length_chunks` only as far as the current block needs, so memory is
+    one chunk of lengths.
+    """
+
+    def __init__(self, length_chunks, block_size=2048):
+        self.length_chunks = length_chunks
+        self.block_size = block_size
+        self.pending = np.zeros(0, dtype=np.int64)     # upcoming document starts
+        self.next_start = 0                            # start of the first unread document
+        self.n_blocks = 0
+        self.ok = True
+
+    def _read_until(self, end):
+        while self.next_start < end:
+            lengths = next(self.length_chunks, None)
+            if lengths is None:
+                return
+            ends = self.next_start + np.cumsum(lengths, dtype=np.int64)
+            starts = np.concatenate([[self.next_start], ends[:-1]]) if len(ends) else ends
+            self.pending = np.concatenate([self.pending, starts])
+            if len(ends):
+                self.next_start = int(ends[-1])
+
+    def add_block(self, starts):
+        b0 = self.n_blocks * self.block_size
+        b1 = b0 + self.block_size
+        self._read_until(b1)
+        k = int(np.searchsorted(self.pending, b1))
+        expected = np.union1d(self.pending[:k] - b0, [0])
+        self.pending = self.pending[k:]
+        self.n_blocks += 1
+
+        starts = np.asarray(starts, dtype=np.int64)
+        if len(starts) != len(expected) or (starts != expected).any():
+            self.ok = False
+
+    def finish(self):
+        """True if every block matched and no document starts after the last block."""
+        self._read_until(np.inf)
+        # only empty documents at the very end of the stream may be left over
+        return self.ok and bool((self.pending == self.next_start).all())
+
+
+def iter_length_chunks(path, chunk_size=65536):
+    """Arrays of document/block lengths of a JSONL or .bin/.idx token file."""
+    if is_token_bin(path):
+        offsets = TokenBinReader(path).offsets
+        for i in range(0, len(offsets) - 1, chunk_size):
+            yield np.diff(offsets[i:i + chunk_size + 1])
+        return
+
+    lengths = []
+    with open(path, "r") as fin:
+        for line in fin:
+            lengths.append(len(json.loads(line)["input_ids"]))
+            if len(lengths) >= chunk_size:
+                yield np.array(lengths)
+                lengths = []
+    if lengths:
+        yield np.array(lengths)
+
+
+def iter_block_chunks(path, pad_id=None, block_size=2048, chunk_size=65536):
+    """
+    (lengths, real tokens, doc starts) of the blocks of a packed file, in
+    chunks. doc starts is a list with the document starts of each block
+    (pack_concat() output), or None if the file has none.
+    """
+    if not is_token_bin(path):
+        lengths, real, starts = [], [], []
+        with open(path, "r") as fin:
+            for line in fin:
+                row = json.loads(line)
+                block = row["input_ids"]
+                lengths.append(len(block))
+                real.append(count_real(block, pad_id))
+                starts.append(row.get("doc_starts"))
+                if len(lengths) >= chunk_size:
+                    yield np.array(lengths), np.array(real), _starts_or_none(starts)
+                    lengths, real, starts = [], [], []
+        if lengths:
+            yield np.array(lengths), np.array(real), _starts_or_none(starts)
+        return
+
+    reader = TokenBinReader(path)
+    offsets = reader.offsets
+    starts_reader = None
+    if is_token_bin(doc_starts_prefix(path)):
+        starts_reader = TokenBinReader(doc_starts_prefix(path))
+    step = max(1, min(chunk_size, TOKENS_PER_CHUNK // block_size))
+    for i in range(0, len(reader), step):
+        ends = np.asarray(offsets[i:i + step + 1])
+        lengths = np.diff(ends)
+        starts = None
+        if starts_reader is not None:
+            starts = [starts_reader[j] for j in range(i, i + len(lengths))]
+        if pad_id is None:
+            yield lengths, lengths, starts
+            continue
+        # non-pad tokens per block: cumulative count at each block end
+        is_real = np.asarray(reader.tokens[ends[0]:ends[-1]]) != pad_id
+        cum = np.concatenate([[0], np.cumsum(is_real, dtype=np.int32)])
+        yield lengths, np.diff(cum[ends - ends[0]]), starts
+
+
+def _starts_or_none(starts):
+    return None if any(s is None for s in starts) else starts
+
+
+def packing_stats(tokenized_path, packed_path, pad_id=None, block_size=2048, chunk_size=65536):
+    """
+    PackingStats of a tokenized file and its packed blocks, one pass over
+    each. The tokenized file is read alongside the blocks, so the document
+    starts of concat packing are checked without a further pass.
+    """
+    stats = PackingStats(block_size, pad_id)
+
+    def doc_chunks():
+        for lengths in iter_length_chunks(tokenized_path, chunk_size):
+            stats.add_docs(lengths)
+            yield lengths
+
+    docs = doc_chunks()
+    check = None
+    for lengths, real, starts in iter_block_chunks(packed_path, pad_id, block_size, chunk_size):
+        stats.add_blocks(lengths, real)
+        if starts is None:
+            continue
+        if check is None:
+            check = DocStartsCheck(docs, block_size)
+        for block_starts in starts:
+            check.add_block(block_starts)
+
+    if check is not None:
+        stats.doc_starts_ok = check.finish()
+    for _ in docs:      # rest of the tokenized file
+        pass
+    return stats
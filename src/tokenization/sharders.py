@@ -1,4 +1,220 @@
 import os
+import math
+import shutil
+import tempfile
+import numpy as np
+from src.tokenization.token_bin import TokenBinReader, TokenBinWriter, is_token_bin, bin_prefix
+from src.tokenization.packing_stats import doc_starts_prefix
+
+
+class ShardWriter:
+    """
+    Write packed blocks into rotating shard files, one directory per split:
+        out_dir/<split>/shard_00001.jsonl, shard_00002.jsonl, ...
+    A new shard is started every shard_size blocks.
+
+    With fmt="jsonl" each item is a JSONL line; with fmt="bin" each item is
+    a token array and shards are written as shard_XXXXX.bin/.idx pairs.
+    With fmt="bin" and starts_dtype set, each item is a (tokens, doc starts)
+    pair and the starts go to a shard_XXXXX_doc_starts.bin/.idx pair.
+    """
+
+    def __init__(self, out_dir, shard_size=50000, splits=("train", "val", "test"),
+                 fmt="jsonl", vocab_size=None, dtype=None, starts_dtype=None):
+        self.out_dir = out_dir
+        self.shard_size = shard_size
+        self.fmt = fmt
+        self.vocab_size = vocab_size
+        self.dtype = dtype
+        self.starts_dtype = starts_dtype if fmt == "bin" else None
+
+        # Create output directories
+        for s in splits:
+            os.makedirs(os.path.join(out_dir, s), exist_ok=True)
+
+        # Initialize writers
+        self.shard_idx = {s: 1 for s in splits}
+        self.counters = {s: 0 for s in splits}
+        self.writers = {s: self._open_shard(s, 1) for s in splits}
+        self.starts_writers = {s: self._open_starts(s, 1) for s in splits}
+
+    def _open_shard(self, split, idx):
+        shard_path = os.path.join(self.out_dir, split, f"shard_{idx:05d}")
+        if self.fmt == "bin":
+            return TokenBinWriter(shard_path, self.vocab_size, dtype=self.dtype)
+        return open(shard_path + ".jsonl", "w")
+
+    def _open_starts(self, split, idx):
+        if self.starts_dtype is None:
+            return None
+        shard_path = os.path.join(self.out_dir, split, f"shard_{idx:05d}")
+        return TokenBinWriter(doc_starts_prefix(shard_path), dtype=self.starts_dtype)
+
+    def _rotate(self, split):
+        """Start new shard when shard_size is hit."""
+        self.writers[split].close()
+        self.shard_idx[split] += 1
+        self.writers[split] = self._open_shard(split, self.shard_idx[split])
+        if self.starts_dtype is not None:
+            self.starts_writers[split].close()
+            self.starts_writers[split] = self._open_starts(split, self.shard_idx[split])
+
+    def write(self, split, item):
+        if self.starts_dtype is not None:
+            tokens, starts = item
+            self.writers[split].add(tokens)
+            self.starts_writers[split].add(starts)
+        elif self.fmt == "bin":
+            self.writers[split].add(item)
+        else:
+            self.writers[split].write(item)
+        self.counters[split] += 1
+
+        # Rotate shard if needed
+        if self.counters[split] % self.shard_size == 0:
+            self._rotate(split)
+
+    def close(self):
+        # Close final shards
+        for w in self.writers.values():
+            w.close()
+        for w in self.starts_writers.values():
+            if w is not None:
+                w.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def print_shard_summary(writer):
+    print("Sharding completed.")
+    print(f"Train shards: {writer.shard_idx['train']}")
+    print(f"Val shards:   {writer.shard_idx['val']}")
+    print(f"Test shards:  {writer.shard_idx['test']}")
+
+
+class BucketFiles:
+    """
+    Temporary bucket files filled by appending: data is buffered per
+    bucket in memory and written in batches once `flush_bytes` are
+    buffered, opening each file only while its batch is appended. The
+    number of open files stays at one whatever the number of buckets.
+    """
+
+    def __init__(self, prefixes, flush_bytes):
+        self.prefixes = prefixes
+        self.flush_bytes = flush_bytes
+        self.buffers = {}
+        self.buffered = 0
+
+    def add(self, k, suffix, data):
+        self.buffers.setdefault((k, suffix), []).append(data)
+        self.buffered += len(data)
+
+    def maybe_flush(self):
+        if self.buffered >= self.flush_bytes:
+            self.flush()
+
+    def flush(self):
+        for (k, suffix), chunks in self.buffers.items():
+            with open(self.prefixes[k] + suffix, "ab") as f:
+                f.write(b"".join(chunks))
+        self.buffers = {}
+        self.buffered = 0
+
+    def read(self, k, suffix):
+        path = self.prefixes[k] + suffix
+        if not os.path.exists(path):
+            return b""
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def _read_bin_bucket(buckets, k, suffix, dtype):
+    """Token array and offsets of a bucket written as <suffix>.bin / <suffix>.len."""
+    tokens = np.frombuffer(buckets.read(k, suffix + ".bin"), dtype=dtype)
+    lengths = np.frombuffer(buckets.read(k, suffix + ".len"), dtype="<i8")
+    return tokens, np.concatenate([[0], np.cumsum(lengths)])
+
+
+def iter_shuffled_blocks(packed_path, seed=0, bucket_mb=256, tmp_dir=None):
+    """
+    Yield the blocks of a packed file (JSONL lines or token arrays) in a
+    seeded random order, with memory bounded by `bucket_mb`. A binary file
+    with a doc starts pair (pack_concat()) yields (tokens, doc starts)
+    pairs, so the starts follow their block.
+
+    Pass 1 scatters the blocks sequentially into K temporary bucket files,
+    picking a uniformly random bucket for each block (K = file size /
+    bucket_mb). Buckets are buffered in memory (up to bucket_mb in total)
+    and appended to their files in batches, so only one file is open at a
+    time. Pass 2 loads one bucket at a time and yields its blocks in
+    random order. Every permutation is equally likely, and the same seed
+    gives the same order.
+    """
+    binary = is_token_bin(packed_path)
+    data_path = bin_prefix(packed_path) + ".bin" if binary else packed_path
+    bucket_bytes = bucket_mb * 2**20
+    n_buckets = max(1, math.ceil(os.path.getsize(data_path) / bucket_bytes))
+    scatter_rng, shuffle_rng = [np.random.default_rng(s)
+                                for s in np.random.SeedSequence(seed).spawn(2)]
+
+    bucket_dir = tempfile.mkdtemp(prefix="shuffle_", dir=tmp_dir)
+    try:
+        buckets = BucketFiles([os.path.join(bucket_dir, f"bucket_{k:05d}") for k in range(n_buckets)],
+                              flush_bytes=bucket_bytes)
+        starts_reader = None
+        if binary:
+            reader = TokenBinReader(packed_path)
+            items = iter(reader)
+            if is_token_bin(doc_starts_prefix(packed_path)):
+                starts_reader = TokenBinReader(doc_starts_prefix(packed_path))
+        else:
+            items = _iter_lines(packed_path)
+
+        # pass 1: scatter, drawing bucket ids in chunks
+        choice = []
+        for i, item in enumerate(items):
+            if not choice:
+                choice = scatter_rng.integers(0, n_buckets, size=65536).tolist()[::-1]
+            k = choice.pop()
+            if binary:
+                buckets.add(k, ".bin", item.tobytes())
+                buckets.add(k, ".len", np.int64(len(item)).tobytes())
+                if starts_reader is not None:
+                    starts = starts_reader[i]
+                    buckets.add(k, "_doc_starts.bin", starts.tobytes())
+                    buckets.add(k, "_doc_starts.len", np.int64(len(starts)).tobytes())
+            else:
+                if not item.endswith("\n"):    # last line of the file
+                    item += "\n"
+                buckets.add(k, ".jsonl", item.encode("utf-8"))
+            buckets.maybe_flush()
+        buckets.flush()
+
+        # pass 2: shuffle each bucket in memory
+        for k in range(n_buckets):
+            if binary:
+                tokens, offsets = _read_bin_bucket(buckets, k, "", reader.dtype)
+                if starts_reader is not None:
+                    starts, starts_offsets = _read_bin_bucket(buckets, k, "_doc_starts",
+                                                              starts_reader.dtype)
+                for i in shuffle_rng.permutation(len(offsets) - 1):
+                    block = tokens[offsets[i]:offsets[i + 1]]
+                    if starts_reader is None:
+                        yield block
+                    else:
+                        yield block, starts[starts_offsets[i]:starts_offsets[i + 1]]
+            else:
+                lines = buckets.read(k, ".jsonl").decode("utf-8").split("\n")[:-1]
+                for i in shuffle_rng.permutation(len(lines)):
+                    yield lines[i] + "\n"
+    finally:
+        shutil.rmtree(bucket_dir, ignore_errors=True)
+
 
 def shard_packed_dataset(
     packed_path,
@@ -6,20 +222,39 @@ def shard_packed_dataset(
     train_ratio=0.98,
     val_ratio=0.01,
     test_ratio=0.01,
-    shard_size=50000      # number of blocks per shard file
+    shard_size=50000,     # number of blocks per shard file
+    shuffle=False,
+    seed=0,
+    shuffle_bucket_mb=256
 ):
-    """Shard packed 2048-token blocks into train/val/test splits."""
+    """
+    Shard packed 2048-token blocks into train/val/test splits.
+    packed_path may be a JSONL file or a .bin/.idx prefix; binary input is
+    written as binary shards by slicing the memory-mapped token array. The
+    doc starts pair of a binary pack_concat() file is split the same way,
+    as shard_XXXXX_doc_starts.bin/.idx next to each shard.
 
-    assert abs(train_ratio + val_ratio + test_ratio - 1.0) < 1e-6, "Ratios must sum to 1."
+    By default blocks are assigned in file order (the tail goes to val/test).
+    With shuffle=True they are first put in a seeded random order by
+    iter_shuffled_blocks() (temporary buckets next to out_dir), so every
+    split and shard is a uniform sample of the whole file.
+    """
 
-    # Create output directories
-    splits = ["train", "val", "test"]
-    for s in splits:
-        os.makedirs(os.path.join(out_dir, s), exist_ok=True)
+    assert abs(train_ratio + val_ratio + test_ratio - 1.0) < 1e-6, "Ratios must sum to 1."
 
-    # Count total examples
-    with open(packed_path, "r") as f:
-        total = sum(1 for _ in f)
+    starts_reader = None
+    if is_token_bin(packed_path):
+        reader = TokenBinReader(packed_path)
+        fmt, dtype = "bin", reader.dtype
+        total = len(reader)
+        if is_token_bin(doc_starts_prefix(packed_path)):
+            starts_reader = TokenBinReader(doc_starts_prefix(packed_path))
+    else:
+        reader = None
+        fmt, dtype = "jsonl", None
+        # Count total examples
+        with open(packed_path, "r") as f:
+            total = sum(1 for _ in f)
 
     n_train = int(total * train_ratio)
     n_val   = int(total * val_ratio)
@@ -30,30 +265,20 @@ def shard_packed_dataset(
     print(f"Val blocks   ({val_ratio*100:.1f}%): {n_val}")
     print(f"Test blocks  ({test_ratio*100:.1f}%): {n_test}\n")
 
-    # Helper to open shard
-    def open_shard(split, idx):
-        shard_path = os.path.join(out_dir, split, f"shard_{idx:05d}.jsonl")
-        return open(shard_path, "w")
-
-    # Initialize writers
-    shard_idx = {"train": 1, "val": 1, "test": 1}
-    counters  = {"train": 0, "val": 0, "test": 0}
-
-    writers = {
-        "train": open_shard("train", 1),
-        "val":   open_shard("val", 1),
-        "test":  open_shard("test", 1),
-    }
-
-    def rotate(split):
-        """Start new shard when shard_size is hit."""
-        writers[split].close()
-        shard_idx[split] += 1
-        writers[split] = open_shard(split, shard_idx[split])
+    items = reader if reader is not None else _iter_lines(packed_path)
+    if starts_reader is not None:
+        items = zip(reader, starts_reader)
+    if shuffle:
+        tmp_dir = os.path.dirname(os.path.abspath(out_dir))
+        items = iter_shuffled_blocks(packed_path, seed=seed, bucket_mb=shuffle_bucket_mb,
+                                     tmp_dir=tmp_dir)
+        print(f"Shuffling blocks (seed={seed})")
 
     # Start reading and splitting
-    with open(packed_path, "r") as f:
-        for line in f:
+    starts_dtype = starts_reader.dtype if starts_reader is not None else None
+    with ShardWriter(out_dir, shard_size, fmt=fmt, dtype=dtype, starts_dtype=starts_dtype) as writer:
+        counters = writer.counters
+        for item in items:
             # Decide split based on counters (percentage logic)
             if counters["train"] < n_train:
                 split = "train"
@@ -62,19 +287,52 @@ def shard_packed_dataset(
             else:
                 split = "test"
 
-            # Write line
-            writers[split].write(line)
-            counters[split] += 1
+            writer.write(split, item)
 
-            # Rotate shard if needed
-            if counters[split] % shard_size == 0:
-                rotate(split)
+    print_shard_summary(writer)
 
-    # Close final shards
-    for w in writers.values():
-        w.close()
 
-    print("Sharding completed.")
-    print(f"Train shards: {shard_idx['train']}")
-    print(f"Val shards:   {shard_idx['val']}")
-    print(f"Test shards:  {shard_idx['test']}")
+def _iter_lines(path):
+    with open(path, "r") as f:
+        yield from f
+
+
+def shard_block_stream(
+    blocks,
+    out_dir,
+    train_ratio=0.98,
+    val_ratio=0.01,
+    test_ratio=0.01,
+    shard_size=50000,
+    fmt="jsonl",
+    vocab_size=None
+):
+    """
+    Shard an iterable of packed blocks in a single pass. Items are JSONL
+    lines for fmt="jsonl" and token arrays for fmt="bin".
+
+    The total number of blocks is not known up front, so each block goes
+    to the split that is furthest below its target share so far. Every
+    prefix of the stream therefore respects the split ratios, and val/test
+    blocks are spread across the stream instead of being taken from the tail.
+
+    Returns the number of blocks written.
+    """
+
+    assert abs(train_ratio + val_ratio + test_ratio - 1.0) < 1e-6, "Ratios must sum to 1."
+    ratios = {"train": train_ratio, "val": val_ratio, "test": test_ratio}
+
+    total = 0
+    with ShardWriter(out_dir, shard_size, fmt=fmt, vocab_size=vocab_size) as writer:
+        counters = writer.counters
+        for block in blocks:
+            total += 1
+            split = max(ratios, key=lambda s: ratios[s] * total - counters[s])
+            writer.write(split, block)
+
+    print(f"\nTotal blocks: {total}")
+    print(f"Train blocks: {counters['train']}")
+    print(f"Val blocks  : {counters['val']}")
+    print(f"Test blocks : {counters['test']}\n")
+    print_shard_summary(writer)
+    return total
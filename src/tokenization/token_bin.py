@@ -0,0 +1,195 @@
+import os
+import json
+import shutil
+import numpy as np
+
+# Binary token format
+#   <prefix>.bin : all token ids concatenated (uint16 if vocab fits, else uint32)
+#   <prefix>.idx : 16-byte header (magic, version, itemsize) followed by
+#                  int64 offsets [0, end_0, end_1, ...] so that document i is
+#                  tokens[offsets[i]:offsets[i+1]]
+
+IDX_MAGIC = b"MPNSIDX\x00"
+IDX_VERSION = 1
+IDX_HEADER_BYTES = 16
+
+
+def token_dtype(vocab_size):
+    """Smallest unsigned dtype that can hold every token id."""
+    return np.uint16 if vocab_size <= np.iinfo(np.uint16).max + 1 else np.uint32
+
+
+def bin_prefix(path):
+    """Strip a .bin / .idx / .jsonl extension to get the file prefix."""
+    for ext in (".bin", ".idx", ".jsonl"):
+        if path.endswith(ext):
+            return path[: -len(ext)]
+    return path
+
+
+def is_token_bin(path):
+    """True if `path` refers to a .bin/.idx pair rather than a JSONL file."""
+    if path.endswith(".jsonl"):
+        return False
+    return os.path.exists(bin_prefix(path) + ".idx")
+
+
+class TokenBinWriter:
+    """
+    Append token sequences to <prefix>.bin / <prefix>.idx.
+
+    Usage:
+        with TokenBinWriter("data/final/tokenized", vocab_size=enc.n_vocab) as w:
+            w.add(ids)
+    """
+
+    def __init__(self, prefix, vocab_size=None, dtype=None, flush_every=65536):
+        self.prefix = bin_prefix(prefix)
+        self.dtype = np.dtype(dtype if dtype is not None else token_dtype(vocab_size))
+        self.flush_every = flush_every
+
+        os.makedirs(os.path.dirname(self.prefix) or ".", exist_ok=True)
+        self._bin = open(self.prefix + ".bin", "wb")
+        self._idx = open(self.prefix + ".idx", "wb")
+
+        header = IDX_MAGIC + np.array([IDX_VERSION, self.dtype.itemsize], dtype="<u4").tobytes()
+        self._idx.write(header)
+
+        self.n_docs = 0
+        self.n_tokens = 0
+        self._offsets = [0]
+
+    def add(self, ids):
+        arr = np.asarray(ids, dtype=self.dtype)
+        self._bin.write(arr.tobytes())
+
+        self.n_docs += 1
+        self.n_tokens += len(arr)
+        self._offsets.append(self.n_tokens)
+        if len(self._offsets) >= self.flush_every:
+            self._flush_offsets()
+
+    def add_many(self, tokens, lengths):
+        """Append len(lengths) sequences stored back to back in `tokens`."""
+        arr = np.asarray(tokens, dtype=self.dtype)
+        self._bin.write(arr.tobytes())
+
+        self._flush_offsets()
+        ends = self.n_tokens + np.cumsum(lengths, dtype=np.int64)
+        self._idx.write(ends.astype("<i8").tobytes())
+        self.n_docs += len(lengths)
+        self.n_tokens += len(arr)
+
+    def _flush_offsets(self):
+        self._idx.write(np.asarray(self._offsets, dtype="<i8").tobytes())
+        self._offsets = []
+
+    def close(self):
+        if self._bin.closed:
+            return
+        self._flush_offsets()
+        self._bin.close()
+        self._idx.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TokenBinReader:
+    """
+    Memory-mapped view of a .bin/.idx pair.
+
+    reader[i] returns document i as a zero-copy numpy view;
+    reader.tokens and reader.offsets expose the raw arrays.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = bin_prefix(prefix)
+
+        with open(self.prefix + ".idx", "rb") as f:
+            header = f.read(IDX_HEADER_BYTES)
+        if header[:8] != IDX_MAGIC:
+            raise ValueError(f"{self.prefix}.idx is not a token index file")
+        version, itemsize = np.frombuffer(header[8:], dtype="<u4")
+        if version != IDX_VERSION:
+            raise ValueError(f"Unsupported token index version: {version}")
+
+        self.dtype = np.dtype(np.uint16 if itemsize == 2 else np.uint32)
+        self.offsets = np.memmap(self.prefix + ".idx", dtype="<i8", mode="r",
+                                 offset=IDX_HEADER_BYTES)
+
+        if os.path.getsize(self.prefix + ".bin") == 0:
+            self.tokens = np.zeros(0, dtype=self.dtype)
+        else:
+            self.tokens = np.memmap(self.prefix + ".bin", dtype=self.dtype, mode="r")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"document index out of range for {len(self)} documents")
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def n_tokens(self):
+        return int(self.offsets[-1])
+
+
+def tee_token_bin(docs, prefix, vocab_size):
+    """
+    Pass token sequences through unchanged, writing them to a .bin/.idx
+    pair as a side effect. With prefix=None nothing is written.
+    """
+    if prefix is None:
+        yield from docs
+        return
+
+    with TokenBinWriter(prefix, vocab_size) as writer:
+        for ids in docs:
+            writer.add(ids)
+            yield ids
+
+
+def jsonl_to_token_bin(tokenized_path, prefix, vocab_size):
+    """Convert a tokenized JSONL file ({"input_ids": [...]}) to .bin/.idx."""
+    with open(tokenized_path, "r") as fin, TokenBinWriter(prefix, vocab_size) as writer:
+        for line in fin:
+            writer.add(json.loads(line)["input_ids"])
+
+    print(f"Converted {writer.n_docs:,} docs ({writer.n_tokens:,} tokens) to {writer.prefix}.bin")
+    return writer.n_docs
+
+
+def concat_token_bins(prefixes, prefix):
+    """
+    Concatenate .bin/.idx pairs (same dtype) into one, in the given order.
+    Token bytes are copied as-is and the offsets shifted; returns the
+    number of documents.
+    """
+    readers = [TokenBinReader(p) for p in prefixes]
+    dtype = readers[0].dtype if readers else np.dtype(np.uint16)
+    with TokenBinWriter(prefix, dtype=dtype) as writer:
+        for r in readers:
+            if r.dtype != dtype:
+                raise ValueError(f"{r.prefix}.bin has dtype {r.dtype}, expected {dtype}")
+            with open(r.prefix + ".bin", "rb") as f:
+                shutil.copyfileobj(f, writer._bin)
+            writer._flush_offsets()
+            writer._idx.write((np.asarray(r.offsets[1:]) + writer.n_tokens).astype("<i8").tobytes())
+            writer.n_docs += len(r)
+            writer.n_tokens += r.n_tokens
+    return writer.n_docs
@@ -1,6 +1,18 @@
+import os
 import json 
+import shutil
+import tempfile
+from functools import partial
+from multiprocessing import get_context, get_all_start_methods
 import tiktoken
 import numpy as np
+from src.tokenization.token_bin import TokenBinWriter, concat_token_bins
+from src.tokenization.length_stats import TokenLengthStats
+from src.utils.io_utils import iter_batches
+
+# tokenization workers start from a clean process, like the cleaning workers
+# (the parent has used lingua's native threads by then, see clean_pipe.py)
+_MP_CONTEXT = get_context("forkserver" if "forkserver" in get_all_start_methods() else "spawn")
 
 base_enc = tiktoken.get_encoding("gpt2")
 start_id = base_enc.n_vocab
@@ -75,59 +87,192 @@ def tokenize_to_jsonl(input_path, output_path, encoder, max_seq_len=2048, limit=
     print(f"Read docs : {count_in}")
     print(f"Wrote docs: {count_out}")
 
-# Extended tokenizer function
-def tokenize_ext_to_jsonl(input_path, output_path, encoder,
-                          bos_token="<|bos|>", eos_token="<|eos|>",
-                          max_seq_len=2048, limit=None):
+def iter_texts(path, limit=None):
+    """Yield stripped, non-empty texts from a cleaned JSONL file."""
+    count = 0
+    with open(path, "r", encoding="utf-8") as fin:
+        for line in fin:
+            if limit is not None and count >= limit:
+                break
+
+            row = json.loads(line)
+            text = row.get("text", "").strip()
+            if not text:
+                continue
+
+            count += 1
+            yield text
+
+
+def iter_texts_in_range(path, start, end):
     """
-    Tokenize text using an extended tokenizer with BOS/EOS tokens.
+    iter_texts() for the lines of a cleaned JSONL file that start in the
+    byte range [start, end), so that consecutive ranges split the file
+    without losing or repeating a line.
+    """
+    with open(path, "rb") as fin:
+        if start > 0:
+            fin.seek(start - 1)
+            fin.readline()      # rest of the line that crosses `start`
+        while fin.tell() < end:
+            line = fin.readline()
+            if not line:
+                break
+            text = json.loads(line).get("text", "").strip()
+            if text:
+                yield text
 
-    Args:
-        encoder      : tiktoken Encoding with special tokens added
-        bos_token    : BOS token string (must exist in encoder)
-        eos_token    : EOS token string
+
+def byte_ranges(path, n):
+    """Split a file into `n` byte ranges of (almost) equal size."""
+    size = os.path.getsize(path)
+    return [(size * i // n, size * (i + 1) // n) for i in range(n)]
+
+
+def default_threads():
+    """tiktoken threads per process: number of CPUs, at most 8."""
+    return min(8, os.cpu_count() or 1)
+
+
+def add_bos_eos(ids, BOS, EOS, max_seq_len=2048):
+    """[BOS] + ids + [EOS], truncated to max_seq_len and always ending with EOS."""
+
+    # add BOS and EOS
+    ids = [BOS] + ids + [EOS]
+
+    # truncate if needed
+    if len(ids) > max_seq_len:
+        ids = ids[:max_seq_len]
+        ids[-1] = EOS  # ensure ends with EOS
+
+    return ids
+
+
+def iter_tokenize_ext(texts, encoder, bos_token="<|bos|>", eos_token="<|eos|>",
+                      max_seq_len=2048, batch_size=1024, num_threads=None, length_stats=None):
+    """
+    Yield [BOS] + ids + [EOS] for each text, truncated to max_seq_len
+    and always ending with EOS. The encoded length of each text (before
+    BOS/EOS and truncation) is added to `length_stats` if given.
+
+    Texts are encoded `batch_size` at a time with encoder.encode_batch(),
+    which runs tiktoken's Rust encoder on `num_threads` threads with the
+    GIL released (default: number of CPUs, at most 8). Output and order
+    are the same as encoding one text at a time (batch_size=None or a
+    single thread, where the thread pool would only add overhead).
     """
 
     # get IDs safely
     BOS = encoder.encode(bos_token, allowed_special="all")[0]
     EOS = encoder.encode(eos_token, allowed_special="all")[0]
 
-    count_in, count_out = 0, 0
-
-    with open(input_path, "r", encoding="utf-8") as fin, \
-         open(output_path, "w", encoding="utf-8") as fout:
-
-        for line in fin:
-            if limit is not None and count_in >= limit:
-                break
+    if num_threads is None:
+        num_threads = default_threads()
 
-            row = json.loads(line)
-            text = row.get("text", "").strip()
-            if not text:
-                continue
+    if not batch_size or batch_size <= 1 or num_threads <= 1:
+        encoded = (encoder.encode(text, allowed_special="all") for text in texts)
+    else:
+        encoded = (ids for batch in iter_batches(texts, batch_size=batch_size)
+                   for ids in encoder.encode_batch(batch, num_threads=num_threads,
+                                                   allowed_special="all"))
 
-            count_in += 1
+    for ids in encoded:
+        if length_stats is not None:
+            length_stats.add(len(ids))
+        yield add_bos_eos(ids, BOS, EOS, max_seq_len)
 
-            # encode
-            ids = encoder.encode(text, allowed_special="all")
 
-            # add BOS and EOS
-            ids = [BOS] + ids + [EOS]
-
-            # truncate if needed
-            if len(ids) > max_seq_len:
-                ids = ids[:max_seq_len]
-                ids[-1] = EOS  # ensure ends with EOS
+def write_tokenized(docs, output_path, vocab_size, output_format="jsonl"):
+    """Write token sequences as JSONL or .bin/.idx; returns the number written."""
+    count_out = 0
+    if output_format == "bin":
+        with TokenBinWriter(output_path, vocab_size) as writer:
+            for ids in docs:
+                writer.add(ids)
+                count_out += 1
+    else:
+        with open(output_path, "w", encoding="utf-8") as fout:
+            for ids in docs:
+                fout.write(json.dumps({
+                    "input_ids": ids,
+                    "length": len(ids)
+                }) + "\n")
+
+                count_out += 1
+    return count_out
+
+
+def _tokenize_range(task, input_path, encoder, output_format, **kwargs):
+    # worker of tokenize_ext_to_jsonl(workers>1): one byte range -> one part file
+    start, end, part_path = task
+    length_stats = TokenLengthStats()
+    docs = iter_tokenize_ext(iter_texts_in_range(input_path, start, end), encoder,
+                             length_stats=length_stats, **kwargs)
+    return write_tokenized(docs, part_path, encoder.n_vocab, output_format), length_stats
 
-            fout.write(json.dumps({
-                "input_ids": ids,
-                "length": len(ids)
-            }) + "\n")
 
-            count_out += 1
+# Extended tokenizer function
+def tokenize_ext_to_jsonl(input_path, output_path, encoder,
+                          bos_token="<|bos|>", eos_token="<|eos|>",
+                          max_seq_len=2048, limit=None, output_format="jsonl",
+                          batch_size=1024, num_threads=None, workers=1):
+    """
+    Tokenize text using an extended tokenizer with BOS/EOS tokens.
 
-    print(f"Read docs : {count_in}")
+    Args:
+        encoder       : tiktoken Encoding with special tokens added
+        bos_token     : BOS token string (must exist in encoder)
+        eos_token     : EOS token string
+        output_format : "jsonl" ({"input_ids": [...], "length": N} per line) or
+                        "bin" (output_path is used as prefix for .bin/.idx, see token_bin.py)
+        batch_size    : texts per encode_batch() call (None = one at a time)
+        num_threads   : tiktoken threads per process (default: default_threads())
+        workers       : processes; each tokenizes byte ranges of the input into
+                        a part file and the parts are joined in input order
+
+    The output is identical for any batch size, thread and worker count.
+    Returns the TokenLengthStats of the encoded texts (merged over workers).
+    """
+    kwargs = dict(bos_token=bos_token, eos_token=eos_token, max_seq_len=max_seq_len,
+                  batch_size=batch_size, num_threads=num_threads)
+    length_stats = TokenLengthStats()
+
+    if workers <= 1:
+        docs = iter_tokenize_ext(iter_texts(input_path, limit), encoder,
+                                 length_stats=length_stats, **kwargs)
+        count_out = write_tokenized(docs, output_path, encoder.n_vocab, output_format)
+    else:
+        if limit is not None:
+            raise ValueError("limit is not supported with workers > 1")
+
+        part_dir = tempfile.mkdtemp(prefix="tokenize_", dir=os.path.dirname(os.path.abspath(output_path)))
+        ext = "" if output_format == "bin" else ".jsonl"
+        ranges = byte_ranges(input_path, workers * 4)
+        tasks = [(start, end, os.path.join(part_dir, f"part{i:05d}{ext}"))
+                 for i, (start, end) in enumerate(ranges)]
+        try:
+            tokenize = partial(_tokenize_range, input_path=input_path, encoder=encoder,
+                               output_format=output_format, **kwargs)
+            with _MP_CONTEXT.Pool(processes=workers) as pool:
+                count_out = 0
+                for count, part_stats in pool.map(tokenize, tasks, chunksize=1):
+                    count_out += count
+                    length_stats.merge(part_stats)
+
+            parts = [part for _, _, part in tasks]
+            if output_format == "bin":
+                concat_token_bins(parts, output_path)
+            else:
+                with open(output_path, "wb") as fout:
+                    for part in parts:
+                        with open(part, "rb") as f:
+                            shutil.copyfileobj(f, fout)
+        finally:
+            shutil.rmtree(part_dir, ignore_errors=True)
+
+    print(f"Read docs : {count_out}")
     print(f"Wrote docs: {count_out}")
+    return length_stats
 
 
 def token_length_stats(path, encoder, max_docs=None):
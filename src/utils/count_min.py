@@ -0,0 +1,62 @@
+import math
+import numpy as np
+
+
+class CountMinSketch:
+    """
+    Count-min sketch over 64-bit keys with a fixed memory footprint of
+    depth * 2^log2_width uint32 counters.
+
+    Each row maps a key to a column with multiply-shift hashing
+    ((key * a) >> (64 - log2_width), a odd). estimate() returns the minimum
+    over the rows: it never undercounts, and overcounts by at most
+    e * total / width with probability 1 - exp(-depth).
+
+    Sketches built with the same (log2_width, depth, seed) can be merged by
+    adding their tables, so counting can be split across workers.
+    """
+
+    def __init__(self, log2_width=22, depth=4, seed=0):
+        self.log2_width = log2_width
+        self.width = 1 << log2_width
+        self.depth = depth
+        self.seed = seed
+
+        rng = np.random.RandomState(seed)
+        mult = rng.randint(0, np.iinfo(np.int64).max, size=depth, dtype=np.int64)
+        self.mult = mult.astype(np.uint64) | np.uint64(1)
+        self.table = np.zeros((depth, self.width), dtype=np.uint32)
+        self.total = 0
+
+    @property
+    def memory_bytes(self):
+        return self.table.nbytes
+
+    def _columns(self, keys, row):
+        with np.errstate(over="ignore"):
+            return (keys * self.mult[row]) >> np.uint64(64 - self.log2_width)
+
+    def add(self, keys):
+        """Count every key in a uint64 array once (repeats are counted repeatedly)."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        for row in range(self.depth):
+            np.add.at(self.table[row], self._columns(keys, row), 1)
+        self.total += len(keys)
+
+    def estimate(self, keys):
+        """Estimated count of each key (never below the true count)."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        est = self.table[0][self._columns(keys, 0)]
+        for row in range(1, self.depth):
+            est = np.minimum(est, self.table[row][self._columns(keys, row)])
+        return est
+
+    def merge(self, other):
+        if (other.log2_width, other.depth, other.seed) != (self.log2_width, self.depth, self.seed):
+            raise ValueError("Can only merge sketches with the same width, depth and seed")
+        self.table += other.table
+        self.total += other.total
+
+    def error_bound(self):
+        """Overcount that holds with probability 1 - exp(-depth)."""
+        return math.e * self.total / self.width
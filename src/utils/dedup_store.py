@@ -0,0 +1,231 @@
+import json
+import os
+import numpy as np
+from src.utils.digest_index import run_contains, merge_sorted_runs, merge_sorted_into
+from src.utils.simhash_index import (KEY_BLOCKS, permuted_tables, build_permuted_tables,
+                                     query_permuted_tables)
+
+MANIFEST = "manifest.json"
+STORE_VERSION = 2
+
+
+class DedupStore:
+    """
+    Persistent dedup state shared across runs, so a new raw file can be
+    deduplicated against everything ingested before without re-reading it.
+
+    Layout of `root`:
+        manifest.json              list of committed runs (the source of truth)
+        exact_XXXXX.npy            sorted "S<n_bytes>" digests, disjoint across runs
+        simhash_XXXXX.npy          (n_tables, n) permuted fingerprints, each row
+                                   sorted (see build_permuted_tables())
+
+    - Runs are memory-mapped on the first lookup, and lookups are batched
+      (np.searchsorted per run), so the store can be much larger than RAM.
+    - New keys are staged with add_digests() / add_simhashes(), which write
+      new run files but do not touch the manifest. commit() then replaces the
+      manifest atomically (write temp file + os.replace). A run that fails
+      before commit() leaves the store as it was; unreferenced files from
+      such a run are removed on the next commit.
+    - When more than `max_runs` runs of one kind exist, commit() merges them
+      into one by pairwise external merges, chunk by chunk on disk (per
+      table row for SimHash runs), so compaction never loads a whole run.
+
+    One writer at a time; readers only see committed runs.
+    """
+
+    def __init__(self, root, n_bytes=16, hamming_threshold=3, max_runs=16):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.max_runs = max_runs
+
+        path = os.path.join(root, MANIFEST)
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.manifest = json.load(f)
+            if self.manifest.get("version") != STORE_VERSION:
+                raise ValueError(f"Unsupported dedup store version in {path}")
+            if self.manifest["n_bytes"] != n_bytes:
+                raise ValueError(
+                    f"Dedup store {root} uses {self.manifest['n_bytes']}-byte digests, "
+                    f"not {n_bytes}"
+                )
+        else:
+            self.manifest = {
+                "version": STORE_VERSION,
+                "n_bytes": n_bytes,
+                "simhash_threshold": hamming_threshold,
+                "simhash_key_blocks": KEY_BLOCKS,
+                "next_run": 1,
+                "exact_runs": [],
+                "simhash_runs": [],
+            }
+
+        self.n_bytes = self.manifest["n_bytes"]
+        self.dtype = np.dtype(f"S{self.n_bytes}")
+        self.hamming_threshold = self.manifest["simhash_threshold"]
+        self.tables = permuted_tables(64, self.hamming_threshold, self.manifest["simhash_key_blocks"])
+
+        self._exact = None      # memmapped committed + staged runs, loaded lazily
+        self._simhash = None
+        self._staged_exact = []
+        self._staged_simhash = []
+
+    # sizes
+    @property
+    def n_digests(self):
+        runs = self.manifest["exact_runs"] + self._staged_exact
+        return sum(r["count"] for r in runs)
+
+    @property
+    def n_simhashes(self):
+        runs = self.manifest["simhash_runs"] + self._staged_simhash
+        return sum(r["count"] for r in runs)
+
+    # loading
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def _load(self, name):
+        return np.load(self._path(name), mmap_mode="r")
+
+    def _exact_runs(self):
+        if self._exact is None:
+            runs = self.manifest["exact_runs"] + self._staged_exact
+            self._exact = [self._load(r["file"]) for r in runs]
+        return self._exact
+
+    def _simhash_runs(self):
+        if self._simhash is None:
+            runs = self.manifest["simhash_runs"] + self._staged_simhash
+            self._simhash = [self._load(r["file"]) for r in runs]
+        return self._simhash
+
+    # lookups
+    def contains_digests(self, keys):
+        """Boolean array: which digests are already in the store."""
+        keys = np.asarray(keys, dtype=self.dtype)
+        hit = np.zeros(len(keys), dtype=bool)
+        for run in self._exact_runs():
+            hit |= run_contains(run, keys)
+        return hit
+
+    def contains_simhashes(self, sigs, hamming_threshold=3):
+        """Boolean array: which fingerprints have a stored one within hamming_threshold bits."""
+        if hamming_threshold > self.hamming_threshold:
+            raise ValueError(
+                f"Dedup store was built for SimHash distances up to {self.hamming_threshold}; "
+                f"hamming_threshold must be <= {self.hamming_threshold}"
+            )
+        sigs = np.asarray(sigs, dtype=np.uint64)
+        hit = np.zeros(len(sigs), dtype=bool)
+        for rows in self._simhash_runs():
+            hit |= query_permuted_tables(rows, self.tables, sigs, hamming_threshold)
+        return hit
+
+    # staging
+    def _new_name(self, kind):
+        n = self.manifest["next_run"]
+        self.manifest["next_run"] = n + 1
+        return f"{kind}_{n:05d}"
+
+    def add_digests(self, runs):
+        """
+        Stage sorted digest arrays (e.g. DigestIndex.sorted_runs()) that are
+        not in the store yet. They become visible to other runs on commit().
+        """
+        for run in runs:
+            if len(run) == 0:
+                continue
+            name = self._new_name("exact") + ".npy"
+            np.save(self._path(name), np.asarray(run, dtype=self.dtype))
+            self._staged_exact.append({"file": name, "count": len(run)})
+        self._exact = None
+
+    def add_simhashes(self, sigs):
+        """Stage 64-bit SimHash fingerprints; visible to other runs on commit()."""
+        sigs = np.asarray(sigs, dtype=np.uint64)
+        if len(sigs) == 0:
+            return
+        self._staged_simhash.append(self._save_simhash_run(sigs))
+        self._simhash = None
+
+    def _save_simhash_run(self, sigs):
+        name = self._new_name("simhash") + ".npy"
+        np.save(self._path(name), build_permuted_tables(sigs, self.tables))
+        return {"file": name, "count": len(sigs)}
+
+    # commit
+    def commit(self):
+        """Atomically publish staged runs, compacting if there are too many."""
+        self.manifest["exact_runs"] += self._staged_exact
+        self.manifest["simhash_runs"] += self._staged_simhash
+        self._staged_exact = []
+        self._staged_simhash = []
+
+        if len(self.manifest["exact_runs"]) > self.max_runs:
+            self._compact_exact()
+        if len(self.manifest["simhash_runs"]) > self.max_runs:
+            self._compact_simhash()
+
+        tmp = self._path(MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(MANIFEST))
+
+        self._exact = None
+        self._simhash = None
+        self._remove_unreferenced()
+
+    def _compact_exact(self):
+        """Pairwise external merge of all digest runs into one."""
+        runs = self.manifest["exact_runs"]
+        while len(runs) > 1:
+            merged = []
+            for i in range(0, len(runs) - 1, 2):
+                a, b = runs[i], runs[i + 1]
+                name = self._new_name("exact") + ".npy"
+                merge_sorted_runs(self._load(a["file"]), self._load(b["file"]), self._path(name))
+                merged.append({"file": name, "count": a["count"] + b["count"]})
+            if len(runs) % 2:
+                merged.append(runs[-1])
+            runs = merged
+        self.manifest["exact_runs"] = runs
+
+    def _compact_simhash(self):
+        """Pairwise external merge of all SimHash runs into one, table row by table row."""
+        runs = self.manifest["simhash_runs"]
+        while len(runs) > 1:
+            merged = []
+            for i in range(0, len(runs) - 1, 2):
+                a, b = runs[i], runs[i + 1]
+                name = self._new_name("simhash") + ".npy"
+                rows_a, rows_b = self._load(a["file"]), self._load(b["file"])
+                out = np.lib.format.open_memmap(self._path(name), mode="w+", dtype=np.uint64,
+                                                shape=(len(self.tables), a["count"] + b["count"]))
+                for row_a, row_b, row in zip(rows_a, rows_b, out):
+                    merge_sorted_into(row_a, row_b, row)
+                out.flush()
+                del out
+                merged.append({"file": name, "count": a["count"] + b["count"]})
+            if len(runs) % 2:
+                merged.append(runs[-1])
+            runs = merged
+        self.manifest["simhash_runs"] = runs
+
+    def _remove_unreferenced(self):
+        """Delete run files not listed in the manifest (compacted or never committed)."""
+        keep = {MANIFEST}
+        for r in self.manifest["exact_runs"]:
+            keep.add(r["file"])
+        for r in self.manifest["simhash_runs"]:
+            keep.add(r["file"])
+
+        for name in os.listdir(self.root):
+            if name.endswith(".npy") and name not in keep:
+                os.remove(self._path(name))
+
+    def summary(self):
+        return {"root": self.root, "digests": self.n_digests, "simhashes": self.n_simhashes}
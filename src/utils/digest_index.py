@@ -0,0 +1,211 @@
+import math
+import os
+import shutil
+import tempfile
+import numpy as np
+
+
+def collision_probability(n_items, n_bytes):
+    """
+    Probability that at least two of n_items distinct texts share a
+    truncated digest of n_bytes (birthday bound, 1 - exp(-n^2 / 2^(bits+1))).
+    """
+    bits = 8 * n_bytes
+    return -math.expm1(-(n_items * (n_items - 1) / 2.0) / 2.0 ** bits)
+
+
+def run_contains(run, keys):
+    """Boolean array: which keys occur in the sorted array `run`."""
+    if len(run) == 0 or len(keys) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    idx = np.searchsorted(run, keys)
+    idx[idx == len(run)] = len(run) - 1
+    return run[idx] == keys
+
+
+def merge_sorted_runs(a, b, path, chunk=1_000_000):
+    """
+    Merge two sorted, disjoint arrays (typically memory-mapped) into a new
+    .npy file at `path`, holding at most ~2 * chunk keys in memory.
+    """
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=a.dtype,
+                                    shape=(len(a) + len(b),))
+    merge_sorted_into(a, b, out, chunk)
+    out.flush()
+    del out
+
+
+def merge_sorted_into(a, b, out, chunk=1_000_000):
+    """
+    Merge two sorted arrays into `out` (length len(a) + len(b), e.g. a row
+    of a memory-mapped file), chunk by chunk. Equal keys are kept.
+    """
+    i = j = k = 0
+    while i < len(a) or j < len(b):
+        a_chunk = a[i:i + chunk]
+        b_chunk = b[j:j + chunk]
+        if len(a_chunk) == 0 or len(b_chunk) == 0:
+            rest = a_chunk if len(a_chunk) else b_chunk
+            out[k:k + len(rest)] = rest
+            k += len(rest)
+            i += len(a_chunk)
+            j += len(b_chunk)
+            continue
+
+        # everything <= the smaller chunk end can be emitted now
+        bound = min(a_chunk[-1], b_chunk[-1])
+        na = np.searchsorted(a_chunk, bound, side="right")
+        nb = np.searchsorted(b_chunk, bound, side="right")
+        merged = np.sort(np.concatenate([a_chunk[:na], b_chunk[:nb]]), kind="stable")
+        out[k:k + len(merged)] = merged
+        k += len(merged)
+        i += na
+        j += nb
+
+
+class DigestIndex:
+    """
+    Exact membership set for fixed-width binary digests (e.g. 16-byte
+    truncated SHA-256), stored as sorted NumPy "S<n>" arrays instead of a
+    Python set of hex strings (~16 bytes per doc instead of >100).
+
+    - New keys are kept in sorted in-memory runs. Runs of similar size are
+      merged, so there are O(log n) runs.
+    - Once more than `max_memory_entries` keys are held in memory, they are
+      merged into one sorted run, saved as .npy in `spill_dir`, and
+      memory-mapped back for lookups.
+    - When there are more than `max_disk_runs` disk runs, they are merged
+      chunk by chunk (external sort-merge) into a single run.
+
+    Lookups are batched: add_batch() checks a whole array of digests with
+    np.searchsorted against every run.
+    """
+
+    def __init__(self, n_bytes=16, max_memory_entries=50_000_000, spill_dir=None,
+                 max_disk_runs=8, merge_chunk=1_000_000):
+        self.n_bytes = n_bytes
+        self.dtype = np.dtype(f"S{n_bytes}")
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_runs = max_disk_runs
+        self.merge_chunk = merge_chunk
+
+        self._own_spill_dir = spill_dir is None
+        self.spill_dir = spill_dir
+        self._n_spilled = 0
+
+        self.mem_runs = []
+        self.disk_runs = []     # (path, memmapped array)
+        self.n_mem = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def memory_bytes(self):
+        return self.n_mem * self.n_bytes
+
+    def collision_probability(self):
+        return collision_probability(self.size, self.n_bytes)
+
+    # lookups
+    def contains_batch(self, keys):
+        """Boolean array: which keys are already stored."""
+        keys = np.asarray(keys, dtype=self.dtype)
+        hit = np.zeros(len(keys), dtype=bool)
+        for run in self.sorted_runs():
+            hit |= run_contains(run, keys)
+        return hit
+
+    def add_batch(self, keys):
+        """
+        Insert a batch of digests. Returns a boolean array marking the keys
+        that were new, i.e. not stored before and the first occurrence
+        within the batch, which is the same rule as a Python set.
+        """
+        keys = np.asarray(keys, dtype=self.dtype)
+        is_new = np.zeros(len(keys), dtype=bool)
+        if len(keys) == 0:
+            return is_new
+
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        new_idx = first[~self.contains_batch(keys[first])]
+
+        is_new[new_idx] = True
+        if len(new_idx):
+            self._insert(np.sort(keys[new_idx]))
+        return is_new
+
+    # storage
+    def _insert(self, run):
+        self.size += len(run)
+        self.n_mem += len(run)
+
+        # merge runs of similar size (binary counter), keeps O(log n) runs
+        while self.mem_runs and len(self.mem_runs[-1]) <= len(run):
+            run = np.sort(np.concatenate([self.mem_runs.pop(), run]), kind="stable")
+        self.mem_runs.append(run)
+
+        if self.n_mem > self.max_memory_entries:
+            self._spill()
+
+    def _new_run_path(self):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="digest_index_")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._n_spilled += 1
+        return os.path.join(self.spill_dir, f"run_{self._n_spilled:05d}.npy")
+
+    def _spill(self):
+        run = self.mem_runs[0]
+        for other in self.mem_runs[1:]:
+            run = np.sort(np.concatenate([run, other]), kind="stable")
+
+        path = self._new_run_path()
+        np.save(path, run)
+        self.disk_runs.append((path, np.load(path, mmap_mode="r")))
+
+        self.mem_runs = []
+        self.n_mem = 0
+
+        if len(self.disk_runs) > self.max_disk_runs:
+            self._compact()
+
+    def _compact(self):
+        """Pairwise external merge of all disk runs into one."""
+        runs = self.disk_runs
+        while len(runs) > 1:
+            merged = []
+            for i in range(0, len(runs) - 1, 2):
+                merged.append(self._merge_runs(runs[i], runs[i + 1]))
+            if len(runs) % 2:
+                merged.append(runs[-1])
+            runs = merged
+        self.disk_runs = runs
+
+    def _merge_runs(self, run_a, run_b):
+        (path_a, a), (path_b, b) = run_a, run_b
+        path = self._new_run_path()
+        merge_sorted_runs(a, b, path, chunk=self.merge_chunk)
+        del a, b
+        os.remove(path_a)
+        os.remove(path_b)
+        return path, np.load(path, mmap_mode="r")
+
+    def sorted_runs(self):
+        """All stored keys as a list of sorted, mutually disjoint arrays."""
+        return self.mem_runs + [arr for _, arr in self.disk_runs]
+
+    def close(self):
+        """Drop spilled runs created in a temporary directory."""
+        self.disk_runs = []
+        if self._own_spill_dir and self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,5 +1,6 @@
 import re
 import hashlib
+import numpy as np
 from simhash import Simhash
 
 def hash_text(text):
@@ -7,6 +8,14 @@ def hash_text(text):
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
+def hash_digest(text, n_bytes=16):
+    """Return the first n_bytes of the binary SHA-256 digest of a string."""
+    return hashlib.sha256(text.encode("utf-8")).digest()[:n_bytes]
+
+
+SIMHASH_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
 def tokenize_for_simhash(text):
     """
     Normalize text for SimHash:
@@ -14,10 +23,8 @@ def tokenize_for_simhash(text):
     - replace punctuation with spaces
     - collapse whitespace
     """
-    text = text.lower()
-    text = re.sub(r"[^a-z0-9]+", " ", text)  # safer than your previous version
-    tokens = text.split()
-    return tokens
+    # same tokens as re.sub(r"[^a-z0-9]+", " ", text).split(), in one pass
+    return SIMHASH_TOKEN_RE.findall(text.lower())
 
 
 def chunk_tokens(tokens, n=8):
@@ -25,6 +32,13 @@ def chunk_tokens(tokens, n=8):
     return [" ".join(tokens[i:i+n]) for i in range(0, len(tokens), n)]
 
 
+def shingle_tokens(tokens, n=5):
+    """Overlapping word n-grams (Jaccard shingles). Short docs give one shingle."""
+    if len(tokens) <= n:
+        return [" ".join(tokens)] if tokens else []
+    return [" ".join(tokens[i:i+n]) for i in range(len(tokens) - n + 1)]
+
+
 def simhash_text(text):
     """
     Compute SimHash of normalized token chunks (recommended).
@@ -34,6 +48,44 @@ def simhash_text(text):
     return Simhash(chunks).value
 
 
+def simhash_batch(texts, chunk_size=8):
+    """
+    SimHash of many documents at once, bit-identical to simhash_text().
+
+    Reference algorithm (simhash.Simhash with its defaults, f=64):
+    - features are the 8-token chunks of tokenize_for_simhash(text)
+    - each feature is hashed with MD5 and the last 8 bytes are kept
+    - bit i of the fingerprint (MSB first, big-endian) is set when more than
+      half of the features have bit i set (ties give 0, no features give 0)
+
+    Hashing is still one hashlib call per feature, but the bit votes for the
+    whole batch are a single unpackbits / add.reduceat / packbits in NumPy
+    instead of one Simhash object per document.
+
+    Returns a uint64 array with one fingerprint per text.
+    """
+    counts = np.zeros(len(texts), dtype=np.int64)
+    digests = []
+    for i, text in enumerate(texts):
+        chunks = chunk_tokens(tokenize_for_simhash(text), chunk_size)
+        counts[i] = len(chunks)
+        digests.extend(hashlib.md5(c.encode("utf-8")).digest()[-8:] for c in chunks)
+
+    sigs = np.zeros(len(texts), dtype=np.uint64)
+    nonempty = np.nonzero(counts)[0]
+    if len(nonempty) == 0:
+        return sigs
+
+    bits = np.unpackbits(np.frombuffer(b"".join(digests), dtype=np.uint8).reshape(-1, 8), axis=1)
+    starts = np.concatenate([[0], np.cumsum(counts[nonempty])[:-1]])
+    votes = np.add.reduceat(bits, starts, axis=0, dtype=np.int64)
+
+    # bit set when votes > count / 2, in integers
+    packed = np.packbits(2 * votes > counts[nonempty, None], axis=1)
+    sigs[nonempty] = packed.view(">u8").ravel()
+    return sigs
+
+
 '''
 def hash_text(text):
     """Return a stable hash (sha256) of a string."""
@@ -46,3 +46,64 @@ def sample_docs(path, n=3):
     with open(path, "r", encoding="utf-8") as f:
         lines = random.sample(list(f), n)
     return [json.loads(l)["text"] for l in lines]
+
+
+def iter_batches(items, batch_size=256, max_chars=None, size=len):
+    """
+    Group any iterable into lists of at most `batch_size` items.
+
+    If `max_chars` is given, a batch is also closed once the summed
+    `size(item)` reaches it, so a run of very long documents produces
+    small batches instead of one oversized task.
+    """
+    batch = []
+    n_chars = 0
+    for item in items:
+        batch.append(item)
+        if max_chars is not None:
+            n_chars += size(item)
+        if len(batch) >= batch_size or (max_chars is not None and n_chars >= max_chars):
+            yield batch
+            batch = []
+            n_chars = 0
+    if batch:
+        yield batch
+
+
+def iter_line_offsets(path):
+    """Yield (byte_offset, line) for each line of a UTF-8 text file."""
+    with open(path, "rb") as f:
+        offset = 0
+        for raw in f:
+            yield offset, raw.decode("utf-8")
+            offset += len(raw)
+
+
+def iter_line_batches(path, batch_size=256, max_chars=1_000_000, offsets=False):
+    """
+    Yield lists of raw JSONL lines from a file (see iter_batches), or of
+    (byte_offset, line) pairs with offsets=True.
+    """
+    if offsets:
+        yield from iter_batches(iter_line_offsets(path), batch_size=batch_size,
+                                max_chars=max_chars, size=lambda item: len(item[1]))
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_batches(f, batch_size=batch_size, max_chars=max_chars)
+
+
+def tee_lines(items, path, to_line):
+    """
+    Pass items through unchanged, optionally writing to_line(item) for each
+    one to `path`. With path=None nothing is written (used to make
+    intermediate files optional in the streaming pipeline).
+    """
+    if path is None:
+        yield from items
+        return
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(to_line(item))
+            yield item
@@ -0,0 +1,151 @@
+import hashlib
+import numpy as np
+from src.utils.hash_utils import tokenize_for_simhash, shingle_tokens
+
+# Universal hashing h(x) = ((a * x + b) mod p) & 0xFFFFFFFF, p = 2^61 - 1.
+# a * x is allowed to wrap at 64 bits, which keeps everything in uint64.
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+# FNV-1a style mixing used to fold the rows of one band into a 64-bit key
+FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+FNV_PRIME = np.uint64(0x100000001B3)
+
+
+def shingle_hashes(text, ngram=5):
+    """32-bit hashes of the word n-gram shingles of a document."""
+    shingles = shingle_tokens(tokenize_for_simhash(text), n=ngram)
+    return np.fromiter(
+        (int.from_bytes(hashlib.sha1(s.encode("utf-8")).digest()[:4], "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+
+
+class MinHasher:
+    """
+    Compute MinHash signatures with NumPy, one batch of documents at a time.
+
+    All shingle hashes of a batch are concatenated into one array; each
+    permutation is applied to the whole array and reduced per document with
+    np.minimum.reduceat, so memory is O(shingles in batch), not
+    O(shingles * num_perm).
+    """
+
+    def __init__(self, num_perm=128, ngram=5, seed=1):
+        self.num_perm = num_perm
+        self.ngram = ngram
+
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+
+    def signatures(self, texts):
+        """Return a (len(texts), num_perm) uint32 signature matrix."""
+        hashes = [shingle_hashes(t, self.ngram) for t in texts]
+        sigs = np.full((len(texts), self.num_perm), MAX_HASH, dtype=np.uint64)
+
+        # docs without shingles keep the all-max signature
+        nonempty = [i for i, h in enumerate(hashes) if len(h)]
+        if not nonempty:
+            return sigs.astype(np.uint32)
+
+        lengths = np.array([len(hashes[i]) for i in nonempty])
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        hv = np.concatenate([hashes[i] for i in nonempty])
+
+        with np.errstate(over="ignore"):
+            for j in range(self.num_perm):
+                phv = ((hv * self.a[j] + self.b[j]) % MERSENNE_PRIME) & MAX_HASH
+                sigs[nonempty, j] = np.minimum.reduceat(phv, starts)
+
+        return sigs.astype(np.uint32)
+
+
+def has_shingles(signatures):
+    """
+    Boolean mask of the rows that come from documents with at least one
+    shingle (the others keep the all-MAX_HASH signature and must not be banded,
+    or every such document would share every bucket).
+    """
+    return (signatures != MAX_HASH).any(axis=1)
+
+
+def band_keys(signatures, bands, rows):
+    """
+    Fold each band of `rows` signature values into one uint64 key.
+    Returns a (n_docs, bands) array; docs sharing a key in any band are candidates.
+    """
+    if bands * rows > signatures.shape[1]:
+        raise ValueError("bands * rows must not exceed the signature length")
+
+    sig = signatures.astype(np.uint64)
+    keys = np.empty((sig.shape[0], bands), dtype=np.uint64)
+
+    with np.errstate(over="ignore"):
+        for band in range(bands):
+            h = np.full(sig.shape[0], FNV_OFFSET, dtype=np.uint64)
+            for r in range(band * rows, (band + 1) * rows):
+                h = (h ^ sig[:, r]) * FNV_PRIME
+            keys[:, band] = h
+
+    return keys
+
+
+class UnionFind:
+    """Union-find over doc ids 0..n-1; the smallest id is always the root."""
+
+    def __init__(self, n):
+        self.parent = np.arange(n, dtype=np.int64)
+
+    def find(self, x):
+        parent = self.parent
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, x, y):
+        rx, ry = self.find(x), self.find(y)
+        if rx == ry:
+            return False
+        if rx < ry:
+            self.parent[ry] = rx
+        else:
+            self.parent[rx] = ry
+        return True
+
+    def roots(self):
+        """Boolean mask of documents that are their own cluster representative."""
+        # vectorized pointer jumping until every doc points at its root
+        parent = self.parent
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+        self.parent = parent
+        return parent == np.arange(len(parent))
+
+
+def union_band_buckets(uf, keys, valid=None):
+    """
+    Union all docs that share a key within one band.
+
+    keys is a 1-D uint64 array (one band, all docs). Sorting groups equal
+    keys, so only adjacent duplicates need a union; memory is O(n).
+    Docs where the boolean mask `valid` is False are left as singletons.
+    """
+    if valid is None:
+        order = np.argsort(keys, kind="stable")
+    else:
+        ids = np.flatnonzero(valid)
+        order = ids[np.argsort(keys[ids], kind="stable")]
+    sorted_keys = keys[order]
+    dup = np.nonzero(sorted_keys[1:] == sorted_keys[:-1])[0]
+
+    merged = 0
+    for k in dup:
+        merged += uf.union(int(order[k]), int(order[k + 1]))
+    return merged
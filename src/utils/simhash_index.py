@@ -0,0 +1,192 @@
+from itertools import combinations
+import numpy as np
+
+# blocks per table key: with the default threshold of 3, 6 blocks of ~11 bits
+# and 20 tables with ~32-bit keys
+KEY_BLOCKS = 3
+
+
+def split_blocks(f=64, n_blocks=4):
+    """(shift, mask) of n_blocks contiguous bit blocks covering an f-bit fingerprint."""
+    blocks = []
+    base, extra = divmod(f, n_blocks)
+    shift = 0
+    for i in range(n_blocks):
+        width = base + (1 if i < extra else 0)
+        blocks.append((shift, (1 << width) - 1))
+        shift += width
+    return blocks
+
+
+def permuted_tables(f=64, hamming_threshold=3, key_blocks=KEY_BLOCKS):
+    """
+    Tables of the permuted-table index: the fingerprint is split into
+    hamming_threshold + key_blocks blocks, and each table moves one choice
+    of key_blocks blocks to the top bits. Its key is those top bits.
+
+    Two fingerprints within hamming_threshold bits differ in at most
+    hamming_threshold blocks, so at least key_blocks blocks agree and they
+    share the key of one table (pigeonhole). Returns a list of
+    (moves, key_shift): moves are (shift, mask, new_shift) per block, key
+    blocks first, and permuted >> key_shift is the key.
+    """
+    n_blocks = hamming_threshold + key_blocks
+    if n_blocks > f:
+        raise ValueError("hamming_threshold + key_blocks cannot exceed the fingerprint width")
+    blocks = split_blocks(f, n_blocks)
+
+    tables = []
+    for chosen in combinations(range(n_blocks), key_blocks):
+        order = list(chosen) + [i for i in range(n_blocks) if i not in chosen]
+        moves, top = [], f
+        for i in order:
+            shift, mask = blocks[i]
+            top -= mask.bit_length()
+            moves.append((shift, mask, top))
+        key_width = sum(blocks[i][1].bit_length() for i in chosen)
+        tables.append((moves, f - key_width))
+    return tables
+
+
+def permute_array(sigs, moves):
+    """Apply a table's bit permutation to a uint64 array."""
+    out = np.zeros(len(sigs), dtype=np.uint64)
+    for shift, mask, new_shift in moves:
+        out |= ((sigs >> np.uint64(shift)) & np.uint64(mask)) << np.uint64(new_shift)
+    return out
+
+
+class SimhashLSHIndex:
+    """
+    Permuted-table index over 64-bit SimHash fingerprints for near-duplicate
+    lookup (Manku et al.).
+
+    The fingerprint is split into `hamming_threshold + key_blocks` blocks and
+    one table is kept per choice of `key_blocks` blocks, keyed by those
+    blocks (permuted_tables()). Two fingerprints that differ in at most
+    `hamming_threshold` bits agree on at least `key_blocks` blocks, so they
+    share a key in one table. Candidates are then verified with a popcount
+    of the XOR, so the result is the same as comparing against every stored
+    fingerprint.
+
+    With the defaults (threshold 3, 3 key blocks) there are 20 tables with
+    ~32-bit keys: a bucket holds about n / 2**32 fingerprints, so lookups
+    stay near constant up to billions of fingerprints. With one 16-bit block
+    per table a bucket holds n / 65536 and the verification cost grows with n.
+
+    Tables are sorted uint64 arrays (build_permuted_tables()), 8 bytes per
+    fingerprint and table, kept as O(log n) runs of doubling size and
+    queried in batches with np.searchsorted.
+    """
+
+    def __init__(self, hamming_threshold=3, f=64, key_blocks=KEY_BLOCKS):
+        self.hamming_threshold = hamming_threshold
+        self.f = f
+        self.tables = permuted_tables(f, hamming_threshold, key_blocks)
+        self.runs = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def contains_batch(self, sigs):
+        """Boolean array: which fingerprints have a stored one within hamming_threshold bits."""
+        sigs = np.asarray(sigs, dtype=np.uint64)
+        hit = np.zeros(len(sigs), dtype=bool)
+        for run in self.runs:
+            hit |= query_permuted_tables(run, self.tables, sigs, self.hamming_threshold)
+        return hit
+
+    def add_batch(self, sigs):
+        """
+        Insert fingerprints with no near duplicate among the stored ones or
+        the earlier ones of the batch. Returns a boolean array marking the
+        inserted ones (the same as add_if_new() one by one).
+        """
+        sigs = np.asarray(sigs, dtype=np.uint64)
+        is_new = ~self.contains_batch(sigs)
+
+        # within the batch, in order: small block index over the kept ones
+        blocks = split_blocks(self.f, self.hamming_threshold + 1)
+        seen = [{} for _ in blocks]
+        for i in np.flatnonzero(is_new):
+            sig = int(sigs[i])
+            keys = [(sig >> shift) & mask for shift, mask in blocks]
+            if any((sig ^ cand).bit_count() <= self.hamming_threshold
+                   for table, key in zip(seen, keys) for cand in table.get(key, ())):
+                is_new[i] = False
+                continue
+            for table, key in zip(seen, keys):
+                table.setdefault(key, []).append(sig)
+
+        if is_new.any():
+            self._insert(build_permuted_tables(sigs[is_new], self.tables))
+        return is_new
+
+    def _insert(self, run):
+        self.size += run.shape[1]
+        # merge runs of similar size (binary counter), keeps O(log n) runs
+        while self.runs and self.runs[-1].shape[1] <= run.shape[1]:
+            run = np.sort(np.concatenate([self.runs.pop(), run], axis=1), axis=1)
+        self.runs.append(run)
+
+    def add_if_new(self, sig):
+        """Insert sig unless a near duplicate is already stored. Returns True if inserted."""
+        return bool(self.add_batch([sig])[0])
+
+
+# Array form of the same index, used for signatures stored on disk: one
+# row per table with the permuted fingerprints sorted, so every row can be
+# memory-mapped and queried in batches. Hamming distance does not change
+# under a bit permutation, so the permuted values are verified directly.
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount64(x):
+    """Vectorized popcount of a uint64 array."""
+    x = np.ascontiguousarray(x, dtype=np.uint64)
+    return _POPCOUNT8[x.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def build_permuted_tables(sigs, tables):
+    """(n_tables, n) uint64 array: the permuted fingerprints of each table, sorted."""
+    sigs = np.asarray(sigs, dtype=np.uint64)
+    out = np.empty((len(tables), len(sigs)), dtype=np.uint64)
+    for row, (moves, _) in zip(out, tables):
+        row[:] = np.sort(permute_array(sigs, moves))
+    return out
+
+
+def query_permuted_tables(rows, tables, sigs, hamming_threshold):
+    """
+    Boolean array: which query signatures have a stored signature within
+    hamming_threshold bits. `rows` come from build_permuted_tables() and
+    may be memory-mapped.
+    """
+    sigs = np.asarray(sigs, dtype=np.uint64)
+    hit = np.zeros(len(sigs), dtype=bool)
+
+    for (moves, key_shift), stored in zip(tables, rows):
+        if len(stored) == 0:
+            continue
+        # queries in key order, so the binary searches walk the table forwards
+        q = permute_array(sigs, moves)
+        order = np.argsort(q)
+        q = q[order]
+        low = np.uint64((1 << key_shift) - 1)
+        lo = np.searchsorted(stored, q & ~low, side="left")
+        counts = np.searchsorted(stored, q | low, side="right") - lo
+        total = int(counts.sum())
+        if total == 0:
+            continue
+
+        # expand every [lo, lo + count) range into candidate positions
+        owner = np.repeat(np.arange(len(sigs)), counts)
+        starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        cand = starts + np.arange(total)
+
+        close = popcount64(stored[cand] ^ q[owner]) <= hamming_threshold
+        hit[order[owner[close]]] = True
+
+    return hit
@@ -0,0 +1,45 @@
+import pytest
+from benchmarks.bench_code_detect import synthetic_texts
+from src.detectors.code_strong_detect import (
+    code_fraction_strong, is_code_document_strong, code_fraction_fast, is_code_document_fast,
+)
+
+CODE = "x = compute(y);"
+PROSE = "The committee met on Tuesday to discuss the budget."
+
+# exactly at the threshold: 2 of 5 lines = 0.40, trailing blank lines raise the early-exit bound
+AT_THRESHOLD = "\n".join([CODE, PROSE, CODE, PROSE, PROSE])
+AT_THRESHOLD_TRAILING = "\n".join([PROSE, PROSE, PROSE, CODE, CODE]) + "\n\n\n\n"
+
+EDGE_CASES = [
+    "",
+    "\n",
+    "\n\n   \n\t\n",
+    CODE,
+    PROSE,
+    "\r\n".join([CODE, PROSE, "", PROSE]) + "\r\n",
+    "\u2028".join([CODE, CODE, PROSE]),
+    "\u2029\x0b\x0c\x1c\x85".join([CODE, PROSE, PROSE, CODE, PROSE, PROSE]),
+    AT_THRESHOLD,
+    AT_THRESHOLD_TRAILING,
+    "\r\n".join([CODE, CODE, PROSE, PROSE, PROSE]),
+    # 1 of 4 and 1 of 2 lines
+    "\n".join([CODE, PROSE, PROSE, PROSE]),
+    "\n\n".join([PROSE, CODE]),
+]
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.25, 0.40, 0.5, 1.0])
+def test_fast_detector_matches_strong(threshold):
+    texts = synthetic_texts(300) + EDGE_CASES
+    mismatches = [t for t in texts
+                  if code_fraction_fast(t) != code_fraction_strong(t)
+                  or is_code_document_fast(t, threshold) != is_code_document_strong(t, threshold)]
+    assert mismatches == []
+
+
+def test_edge_cases_at_threshold():
+    assert code_fraction_strong(AT_THRESHOLD) == 0.40
+    assert not is_code_document_fast(AT_THRESHOLD, 0.40)
+    assert not is_code_document_fast(AT_THRESHOLD_TRAILING, 0.40)
+    assert is_code_document_fast(AT_THRESHOLD_TRAILING, 0.39)
@@ -0,0 +1,39 @@
+import random
+import numpy as np
+from src.utils.dedup_store import DedupStore
+from src.utils.digest_index import merge_sorted_into
+from src.utils.simhash_index import build_permuted_tables
+
+
+def test_merge_sorted_into_keeps_equal_keys():
+    rng = np.random.default_rng(0)
+    a = np.sort(rng.integers(0, 50, size=300, dtype=np.uint64))
+    b = np.sort(rng.integers(0, 50, size=200, dtype=np.uint64))
+    out = np.empty(500, dtype=np.uint64)
+    merge_sorted_into(a, b, out, chunk=7)
+    assert np.array_equal(out, np.sort(np.concatenate([a, b])))
+
+
+def test_simhash_compaction(tmp_path):
+    rng = random.Random(0)
+    store = DedupStore(str(tmp_path / "store"), hamming_threshold=3, max_runs=2)
+    stored = []
+    for _ in range(5):
+        sigs = [rng.getrandbits(64) for _ in range(rng.randint(1, 300))]
+        store.add_simhashes(sigs)
+        store.commit()
+        stored += sigs
+
+    runs = store.manifest["simhash_runs"]
+    assert len(runs) == 1       # 5 commits with max_runs=2: compacted on the 3rd and 5th
+    assert sum(r["count"] for r in runs) == len(stored)
+
+    # the merged run holds the same tables as building them from scratch
+    reopened = DedupStore(str(tmp_path / "store"))
+    merged = reopened._load(runs[0]["file"])
+    assert np.array_equal(merged, build_permuted_tables(stored, reopened.tables))
+
+    queries = [s ^ (1 << rng.randrange(64)) for s in rng.sample(stored, 50)]
+    queries += [rng.getrandbits(64) for _ in range(50)]
+    hit = reopened.contains_simhashes(queries, 3)
+    assert hit.tolist() == [any((q ^ s).bit_count() <= 3 for s in stored) for q in queries]
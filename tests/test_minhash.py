@@ -0,0 +1,26 @@
+import json
+from src.cleaning.deduplication_pipe import dedup_minhash
+
+
+def write_jsonl(path, texts):
+    with open(path, "w", encoding="utf-8") as f:
+        for text in texts:
+            f.write(json.dumps({"text": text}) + "\n")
+
+
+def test_docs_without_shingles_are_not_merged(tmp_path):
+    texts = ["Это русский текст номер один",
+             "Это русский текст номер два",
+             "Это русский текст номер три",
+             "Αυτό είναι ένα ελληνικό κείμενο"]
+    write_jsonl(tmp_path / "in.jsonl", texts)
+    counters = dedup_minhash(str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"))
+    assert counters == {"kept": 4, "dropped": 0}
+
+
+def test_near_duplicates_are_still_merged(tmp_path):
+    words = " ".join(f"word{i}" for i in range(200))
+    texts = [words, words + " extra", "Это русский текст", "something else entirely " * 10]
+    write_jsonl(tmp_path / "in.jsonl", texts)
+    counters = dedup_minhash(str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"))
+    assert counters == {"kept": 3, "dropped": 1}
@@ -0,0 +1,55 @@
+import glob
+import os
+import resource
+import numpy as np
+import pytest
+from src.tokenization.packing_stats import doc_starts_prefix
+from src.tokenization.sharders import shard_packed_dataset, iter_shuffled_blocks
+from src.tokenization.token_bin import TokenBinReader, TokenBinWriter
+
+BLOCK_SIZE = 64
+
+
+def write_concat_blocks(prefix, n_blocks):
+    """Block i is all token i; its doc starts are [0, i % 63 + 1]."""
+    with TokenBinWriter(prefix, vocab_size=50257) as w, \
+         TokenBinWriter(doc_starts_prefix(prefix), vocab_size=BLOCK_SIZE) as starts:
+        for i in range(n_blocks):
+            w.add(np.full(BLOCK_SIZE, i))
+            starts.add([0, i % 63 + 1])
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_binary_shards_keep_doc_starts(tmp_path, shuffle):
+    packed = str(tmp_path / "packed_blocks")
+    write_concat_blocks(packed, 1000)
+    out_dir = str(tmp_path / "shards")
+    shard_packed_dataset(packed, out_dir, train_ratio=0.8, val_ratio=0.1, test_ratio=0.1,
+                         shard_size=300, shuffle=shuffle, seed=1, shuffle_bucket_mb=0.01)
+
+    seen = []
+    for split in ("train", "val", "test"):
+        for path in sorted(glob.glob(os.path.join(out_dir, split, "shard_?????.idx"))):
+            blocks = TokenBinReader(path)
+            starts = TokenBinReader(doc_starts_prefix(path))
+            assert len(starts) == len(blocks)
+            for i in range(len(blocks)):
+                block_id = int(blocks[i][0])
+                assert starts[i].tolist() == [0, block_id % 63 + 1]
+                seen.append(block_id)
+
+    assert sorted(seen) == list(range(1000))
+    assert (seen != sorted(seen)) == shuffle
+
+
+def test_shuffle_keeps_few_files_open(tmp_path):
+    packed = str(tmp_path / "packed_blocks")
+    write_concat_blocks(packed, 2000)      # 256 KB -> 1,000 buckets of 256 bytes
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(64, hard), hard))
+    try:
+        blocks = [int(tokens[0]) for tokens, _ in
+                  iter_shuffled_blocks(packed, seed=0, bucket_mb=2**-12, tmp_dir=str(tmp_path))]
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+    assert sorted(blocks) == list(range(2000))
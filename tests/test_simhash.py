@@ -0,0 +1,28 @@
+import numpy as np
+from benchmarks.bench_simhash import synthetic_texts
+from src.utils.hash_utils import simhash_text, simhash_batch
+
+EDGE_CASES = [
+    "",
+    "   \n\t ",
+    "!!! ... ???",
+    "one",
+    "exactly eight tokens in this one short line here",
+    " ".join(f"w{i}" for i in range(16)),       # two chunks: ties give 0
+    "Это русский текст",
+    "MiXeD CaSe, punctuation; and_underscores 123",
+]
+
+
+def test_batch_matches_single():
+    texts = synthetic_texts(500) + EDGE_CASES
+    expected = np.array([simhash_text(t) for t in texts], dtype=np.uint64)
+    for batch_size in (1, 7, len(texts)):
+        got = np.concatenate([simhash_batch(texts[i:i + batch_size])
+                              for i in range(0, len(texts), batch_size)])
+        assert np.array_equal(got, expected)
+
+
+def test_batch_without_features():
+    assert simhash_batch([]).tolist() == []
+    assert simhash_batch(["", "!!!"]).tolist() == [simhash_text(""), simhash_text("!!!")]
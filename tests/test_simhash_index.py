@@ -0,0 +1,52 @@
+import random
+import numpy as np
+import pytest
+from src.utils.simhash_index import (
+    SimhashLSHIndex, permuted_tables, build_permuted_tables, query_permuted_tables,
+)
+
+
+def near_copies(rng, n, hamming_threshold):
+    """Random fingerprints and copies of them with a few flipped bits."""
+    base = [rng.getrandbits(64) for _ in range(n // 4)]
+    sigs = []
+    for _ in range(n):
+        sig = rng.choice(base)
+        for _ in range(rng.randint(0, hamming_threshold + 2)):
+            sig ^= 1 << rng.randrange(64)
+        sigs.append(sig)
+    return sigs
+
+
+@pytest.mark.parametrize("hamming_threshold", [0, 1, 3, 5])
+@pytest.mark.parametrize("key_blocks", [1, 2, 3])
+def test_index_matches_brute_force(hamming_threshold, key_blocks):
+    rng = random.Random(hamming_threshold * 10 + key_blocks)
+    sigs = near_copies(rng, 600, hamming_threshold)
+
+    kept, expected = [], []
+    for sig in sigs:
+        new = all((sig ^ k).bit_count() > hamming_threshold for k in kept)
+        expected.append(new)
+        if new:
+            kept.append(sig)
+
+    index = SimhashLSHIndex(hamming_threshold, key_blocks=key_blocks)
+    got = []
+    for i in range(0, len(sigs), 50):
+        got.extend(index.add_batch(sigs[i:i + 50]).tolist())
+    assert got == expected
+    assert len(index) == len(kept)
+
+    tables = permuted_tables(64, hamming_threshold, key_blocks)
+    rows = build_permuted_tables(kept, tables)
+    queries = [rng.choice(sigs) ^ (1 << rng.randrange(64)) for _ in range(200)]
+    hit = query_permuted_tables(rows, tables, np.array(queries, dtype=np.uint64), hamming_threshold)
+    assert hit.tolist() == [any((q ^ k).bit_count() <= hamming_threshold for k in kept)
+                            for q in queries]
+
+
+def test_default_tables_have_about_32_bit_keys():
+    tables = permuted_tables(64, hamming_threshold=3)
+    assert len(tables) == 20
+    assert all(30 <= 64 - key_shift <= 33 for _, key_shift in tables)
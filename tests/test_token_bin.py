@@ -0,0 +1,17 @@
+import pytest
+from src.tokenization.token_bin import TokenBinReader, TokenBinWriter
+
+
+def test_reader_indexing(tmp_path):
+    docs = [[1, 2, 3], [4], [5, 6]]
+    with TokenBinWriter(str(tmp_path / "tokens"), vocab_size=50257) as w:
+        for ids in docs:
+            w.add(ids)
+
+    reader = TokenBinReader(str(tmp_path / "tokens"))
+    assert [reader[i].tolist() for i in range(len(reader))] == docs
+    assert reader[-1].tolist() == [5, 6]
+    assert reader[-3].tolist() == [1, 2, 3]
+    for i in (3, -4):
+        with pytest.raises(IndexError):
+            reader[i]